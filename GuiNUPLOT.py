@@ -1,21 +1,2249 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # 起動時間の計測の基準（このモジュールの読み込み開始）
 import sys
 import os
+import re
+import math
+import glob
+import ast
+import hashlib
+import importlib.util
+import itertools
+import mmap
+import shutil
 import subprocess
+import tempfile
+import threading
+import queue
+import warnings
 import json
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+# NumPyは起動を速くするため load_numpy() で後から読み込む．読み込むまで（無い場合も）Noneのままで，
+# 間引きなどのデータ前処理はNumPyがある場合のみ行う
+np = None
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QCheckBox, QFileDialog, QSlider,
     QGridLayout, QTextEdit, QComboBox, QMessageBox, QDoubleSpinBox,
-    QTabWidget, QGroupBox, QScrollArea, QSizePolicy, QSpinBox, QInputDialog
+    QTabWidget, QGroupBox, QScrollArea, QSizePolicy, QSpinBox, QInputDialog,
+    QProgressDialog, QListWidget, QAbstractItemView
 )
-from PySide6.QtGui import QFont, QPixmap, QAction
-from PySide6.QtCore import Qt, QTimer, Signal
+from PySide6.QtGui import QFont, QPixmap, QImage, QPainter, QAction
+from PySide6.QtCore import Qt, QTimer, QThread, Signal, QEvent, QRectF, QByteArray
+# QtSvgはSVGのプレビューを初めて使うときに svg_renderer_class() で読み込む
+QSvgRenderer = None
+
+_numpy_lock = threading.Lock()
+
+
+def load_numpy():
+    """NumPyを読み込んでモジュールの np に設定する（何度呼んでもよい）．無ければNoneを返す"""
+    global np
+    with _numpy_lock:
+        if np is None:
+            try:
+                import numpy
+            except ImportError:
+                return None
+            np = numpy
+    return np
+
+
+def svg_renderer_class():
+    """QtSvgを読み込んでQSvgRendererを返す．無ければNoneを返す"""
+    global QSvgRenderer
+    if QSvgRenderer is None:
+        try:
+            from PySide6.QtSvg import QSvgRenderer as renderer
+        except ImportError:
+            return None
+        QSvgRenderer = renderer
+    return QSvgRenderer
+
 
 # Windowsで実行する際にコンソールウィンドウを非表示にするためのフラグです
 CREATE_NO_WINDOW = 0
 if os.name == 'nt':
     CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW
 
+# 前処理したデータ（間引きデータなど）を置くフォルダです
+CACHE_DIR = os.environ.get("GUINUPLOT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "guinuplot")
+# キャッシュのフォルダの合計サイズの上限（バイト）です．超えたら最も長く使われていないファイルから消します
+# 1億行のbinaryサイドカーだけでも数GBになるため，大きなデータを扱う場合は GUINUPLOT_CACHE_MAX_BYTES で指定します
+try:
+    CACHE_DIR_MAX_BYTES = int(float(os.environ.get("GUINUPLOT_CACHE_MAX_BYTES") or 20 * 1024 ** 3))
+except ValueError:
+    CACHE_DIR_MAX_BYTES = 20 * 1024 ** 3
+# データファイルを読むときに一度に処理する行数です
+DATA_CHUNK_ROWS = 1_000_000
+# これより小さいファイルはプレビューでも間引かずにそのまま描画します
+LOD_MIN_FILE_BYTES = 4 * 1024 * 1024
+# SVGのプレビューで描く要素（点・線分・面）の数の上限です．これを超えるとPNGのプレビューに戻します
+SVG_PREVIEW_MAX_ELEMENTS = 50_000
+# 3Dの視点のスライダーをドラッグしている間の簡易プレビューの設定です．
+# これより大きいファイルは行数がINTERACTIVE_MAX_ROWS程度になるよう間引き，INTERACTIVE_WIREFRAME_ROWSを超える
+# pm3dの曲面は線（ワイヤーフレーム）で描きます．画像はINTERACTIVE_PREVIEW_SCALE倍の解像度で描いて拡大表示します
+INTERACTIVE_MIN_FILE_BYTES = 1024 * 1024
+INTERACTIVE_MAX_ROWS = 20_000
+INTERACTIVE_WIREFRAME_ROWS = 1_000_000
+INTERACTIVE_PREVIEW_SCALE = 0.5
+INTERACTIVE_REDRAW_MS = 30
+# 設定を変えてからプレビューを描き直すまでの待ち時間です．最初はREDRAW_DEBOUNCE_MSで，その後は直近の描画時間の
+# 中央値のREDRAW_DEBOUNCE_FACTOR倍をREDRAW_DEBOUNCE_MIN_MSからREDRAW_DEBOUNCE_MAX_MSに収めた値を使います
+REDRAW_DEBOUNCE_MS = 250
+REDRAW_DEBOUNCE_MIN_MS = 30
+REDRAW_DEBOUNCE_MAX_MS = 2000
+REDRAW_DEBOUNCE_FACTOR = 0.5
+# 3DのプロットのGrid Dataで，散らばった点を分けるセルの数（x, yそれぞれ）の既定値です
+GRID_DEFAULT_RESOLUTION = 200
+# ヒストグラムの設定の既定値です．bin_widthが0ならbinsの数で範囲を等分し，range_min, range_maxが空ならデータの最小・最大を使います
+HISTOGRAM_DEFAULTS = {"bins": 50, "bin_width": 0.0, "range_min": "", "range_max": "", "normalize": "count"}
+HISTOGRAM_NORMALIZATIONS = ["count", "probability", "density"]
+# この個数までの値は並べ替えて保存し，ビンを変えてもファイルを読み直さずに数え直します（それより多い値はビンを変えるたびに読み直します）
+HISTOGRAM_SORT_MAX_ROWS = 10_000_000
+HISTOGRAM_MAX_BINS = 1_000_000
+# 軸の範囲の候補に使う列の統計で，近似の分位点を求める要約の大きさ（チャンクごとに残す値の数）です
+STATS_SKETCH_SIZE = 1024
+# ファイル選択時に列数などを推定するために読む先頭のバイト数です
+SNIFF_BYTES = 64 * 1024
+
+class GnuplotError(Exception):
+    """gnuplotがエラーを報告した，またはプロセスが異常終了したことを表す例外"""
+
+
+class RenderCancelled(GnuplotError):
+    """描画中のフレームが新しい依頼によって中断されたことを表す例外"""
+
+
+class _PipeReader(threading.Thread):
+    """パイプを別スレッドで読み続け，区切り文字列までの内容を取り出せるようにするヘルパー"""
+
+    def __init__(self, stream):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.buffer = bytearray()
+        self.eof = False
+        self.cond = threading.Condition()
+        self.start()
+
+    def run(self):
+        fd = self.stream.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                chunk = b""
+            with self.cond:
+                if chunk:
+                    self.buffer.extend(chunk)
+                else:
+                    self.eof = True
+                self.cond.notify_all()
+            if not chunk:
+                return
+
+    def read_until(self, marker: bytes) -> bytes:
+        """markerが現れるまで待ち，それより前の内容を返す（marker自体は読み捨てる）"""
+        with self.cond:
+            while True:
+                idx = self.buffer.find(marker)
+                if idx >= 0:
+                    data = bytes(self.buffer[:idx])
+                    del self.buffer[:idx + len(marker)]
+                    return data
+                if self.eof:
+                    data = bytes(self.buffer)
+                    self.buffer.clear()
+                    raise GnuplotError(f"Gnuplot process terminated unexpectedly.\n{data.decode('utf-8', 'ignore')}")
+                self.cond.wait()
+
+
+class GnuplotScript:
+    """名前付きのセクションに分けたgnuplotスクリプト
+
+    str() でスクリプト全体になります．GnuplotWorker.render() に渡すと，同じプロセスで前回描画した
+    スクリプトから変わったセクションだけを送ります．
+    """
+    # セクションを送り直す前に，前回の内容が残らないよう既定値に戻すコマンド
+    SECTION_RESETS = {
+        "title": "unset title\n",
+        "labels": "unset xlabel\nunset ylabel\n",
+        "ranges": "set xrange [*:*]\nset yrange [*:*]\n",
+        "colorbox": "set colorbox default\nunset cblabel\nset cbrange [*:*]\nunset format cb\n",
+        "grid": "unset grid\n",
+        "key": "set key default\n",
+        "tics": "set xtics offset 0,0\nset ytics offset 0,0\n",
+        "axes": "unset y2label\nset y2range [*:*]\nset ytics mirror\nset y2tics offset 0,0\nunset y2tics\n"
+                "unset zlabel\nset zrange [*:*]\nset ztics offset 0,0\n",
+        "view": "set view 60,30\n",
+        "pm3d": "unset pm3d\nset xyplane relative 0.5\n",
+        "logscale": "unset logscale\n",
+    }
+
+    def __init__(self, sections):
+        self.sections = list(sections)
+
+    def __str__(self):
+        return "".join(text for _, text in self.sections)
+
+    def delta_from(self, previous):
+        """previous（前回描画したGnuplotScript）の状態からこのスクリプトの状態にするコマンドを返す
+
+        terminalやセクションの構成が変わった場合，plotコマンド以外を含むセクション（multiplotなど）がある場合は
+        差分では表せないためNoneを返します．
+        """
+        if previous is None: return None
+        old, new = dict(previous.sections), dict(self.sections)
+        if old.keys() != new.keys() or "plot" not in new or old["terminal"] != new["terminal"]:
+            return None
+        delta = ""
+        for name, text in self.sections:
+            if name in ("terminal", "plot") or old[name] == text: continue
+            delta += self.SECTION_RESETS.get(name, "") + text
+        # plotコマンドが同じならreplotで済ませる（データファイルはreplotでも読み直される）
+        return delta + (new["plot"] if old["plot"] != new["plot"] else "replot\n")
+
+
+class GnuplotWorker:
+    """常駐させたgnuplotプロセスにスクリプトを標準入力から流し込むワーカー
+
+    描画のたびにgnuplotを起動するとcairoのフォント読み込みなどに時間がかかるため，
+    一つのプロセスを使い回します．1回の描画を1フレームとして扱い，フレームの最後に
+    標準エラーへ区切り文字列を出力させて，そこまでのメッセージをそのフレームの診断結果とします．
+    プロセスが落ちていた場合は次の呼び出しで自動的に起動し直します．
+    """
+    FRAME_MARKER = "__GUINUPLOT_FRAME_END__"
+    ERROR_PATTERN = re.compile(r'line \d+: (?!warning)')
+
+    def __init__(self, executable="gnuplot"):
+        self.executable = executable
+        self.restart_count = 0
+        self._process = None
+        self._stderr_reader = None
+        self._tmp_dir = None
+        self._frame_id = 0
+        self._kill_requested = False
+        self._frame_running = False
+        self._kill_lock = threading.Lock()  # kill()は描画中の_lockを待たずに呼ばれるため，中断の要求は別のロックで守る
+        self._session = None  # このプロセスで最後に描画したGnuplotScript（差分を送るため）
+        self._spawn_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._ensure_started()
+
+    def _ensure_started(self, force_restart=False):
+        if self._process is not None:
+            if self._process.poll() is None and not force_restart:
+                return
+            self.restart_count += 1
+            self._close_process()
+        if self._tmp_dir is None:
+            self._tmp_dir = tempfile.mkdtemp(prefix="guinuplot_")
+        start = time.perf_counter()
+        self._process = subprocess.Popen([self.executable], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, creationflags=CREATE_NO_WINDOW)
+        self._stderr_reader = _PipeReader(self._process.stderr)
+        self._session = None
+        # 起動の時間を描画の時間と分けて測れるよう，コマンドを受け付けるようになるまで待つ
+        self._frame_id += 1
+        marker = f"{self.FRAME_MARKER} {self._frame_id}"
+        try:
+            self._process.stdin.write(f'print "{marker}"\n'.encode('utf-8'))
+            self._process.stdin.flush()
+            self._stderr_reader.read_until(f"{marker}\n".encode('utf-8'))
+        except (OSError, GnuplotError):
+            pass  # 起動に失敗した場合は，続くフレームの送信でエラーにする
+        self._spawn_seconds += time.perf_counter() - start
+
+    def _close_process(self):
+        process, self._process = self._process, None
+        if process is None: return
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def warm_up(self, font_setting=""):
+        """起動直後にフォントの読み込みまで済ませておく"""
+        try:
+            self.render(f'set terminal pngcairo size 64,64 enhanced {font_setting}\nplot x notitle\n')
+        except Exception:
+            pass
+
+    def render(self, script, timings=None) -> bytes:
+        """出力先を指定していないスクリプト（文字列またはGnuplotScript）を描画し，出力された画像のバイト列を返す
+
+        GnuplotScriptの場合は，前回のフレームから変わったセクションだけを送ってreplotします．
+        timingsに辞書を渡すと，段階ごとの秒数（spawn, send, gnuplot, read）を書き込みます．
+        """
+        with self._lock:
+            self._spawn_seconds = 0.0
+            self._ensure_started()
+            frame_path = os.path.join(self._tmp_dir, "frame.out").replace('\\', '/')
+            if os.path.exists(frame_path): os.remove(frame_path)
+            delta = script.delta_from(self._session) if isinstance(script, GnuplotScript) else None
+            self._session = None
+            if delta is not None:
+                self._run_frame(f'set output "{frame_path}"\n{delta}', reset=False, timings=timings)
+            else:
+                lines = str(script).splitlines()
+                insert_at = 1 if lines and lines[0].strip().startswith("set terminal") else 0
+                lines.insert(insert_at, f'set output "{frame_path}"')
+                self._run_frame("\n".join(lines), timings=timings)
+            if isinstance(script, GnuplotScript): self._session = script
+            start = time.perf_counter()
+            try:
+                with open(frame_path, 'rb') as f: data = f.read()
+            except OSError:
+                data = b""
+            if timings is not None:
+                timings["read"] = time.perf_counter() - start
+                if self._spawn_seconds: timings["spawn"] = self._spawn_seconds
+            if not data:
+                raise GnuplotError("Gnuplot produced no output.")
+            return data
+
+    def run(self, script: str, timings=None):
+        """`set output` を自分で指定しているスクリプト（画像の保存など）を実行する"""
+        with self._lock:
+            self._spawn_seconds = 0.0
+            self._ensure_started()
+            self._session = None
+            self._run_frame(script, timings=timings)
+            if timings is not None and self._spawn_seconds: timings["spawn"] = self._spawn_seconds
+
+    def _run_frame(self, script, reset=True, timings=None):
+        self._frame_id += 1
+        marker = f"{self.FRAME_MARKER} {self._frame_id}"
+        payload = f'{"reset" if reset else ""}\n{script}\nunset multiplot\nunset output\nprint "{marker}"\n'.encode('utf-8')
+        start = time.perf_counter()
+        with self._kill_lock:
+            self._frame_running = True
+        try:
+            for attempt in range(2):
+                try:
+                    self._process.stdin.write(payload)
+                    self._process.stdin.flush()
+                    break
+                except OSError:
+                    # 前のフレームでプロセスが落ちていた場合は一度だけ起動し直して再送する
+                    if attempt or self._kill_requested: raise GnuplotError("Failed to send the script to gnuplot.")
+                    self._ensure_started(force_restart=True)
+            sent = time.perf_counter()
+            diagnostics = self._stderr_reader.read_until(f"{marker}\n".encode('utf-8')).decode('utf-8', 'ignore')
+        except GnuplotError:
+            # 描画中にプロセスが落ちた場合は，次のフレームに備えてすぐに起動し直しておく
+            cancelled = self._end_frame()
+            self._ensure_started(force_restart=True)
+            if cancelled: raise RenderCancelled("Rendering was cancelled.")
+            raise
+        except Exception:
+            self._end_frame()
+            raise
+        self._end_frame()
+        if timings is not None:
+            # gnuplotの中でのデータの読み込み・描画・PNGのエンコードは分けられないため，まとめて "gnuplot" とする
+            timings["send"] = sent - start
+            timings["gnuplot"] = time.perf_counter() - sent
+        if self.ERROR_PATTERN.search(diagnostics):
+            raise GnuplotError(diagnostics.strip())
+        return diagnostics
+
+    def _end_frame(self):
+        """フレームの描画が終わったことを記録し，その間に中断が要求されたかを返す"""
+        with self._kill_lock:
+            cancelled, self._kill_requested, self._frame_running = self._kill_requested, False, False
+        return cancelled
+
+    def kill(self):
+        """描画中のフレームを中断する．プロセスは次の呼び出しで起動し直される．描画中でなければ何もしない"""
+        with self._kill_lock:
+            if not self._frame_running: return
+            self._kill_requested = True
+            process = self._process
+            if process is not None and process.poll() is None:
+                process.kill()
+
+    def stop(self):
+        with self._lock:
+            self._close_process()
+            if self._tmp_dir:
+                shutil.rmtree(self._tmp_dir, ignore_errors=True)
+                self._tmp_dir = None
+
+class GnuplotWorkerPool:
+    """複数のGnuplotWorkerに `set output` 付きのスクリプトを振り分けて並列に実行するプール
+
+    ワーカーの数は既定でCPUのコア数です．submit() は実行にかかった秒数を結果とするFutureを返します．
+    """
+
+    def __init__(self, size=None, executable="gnuplot"):
+        self.size = size or os.cpu_count() or 1
+        self._idle = queue.Queue()
+        self._workers = [GnuplotWorker(executable) for _ in range(self.size)]
+        for worker in self._workers: self._idle.put(worker)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="guinuplot-pool")
+
+    def submit(self, script, timings=None):
+        """timingsに辞書を渡すと，空いているワーカーを待った時間（queue）と描画の段階ごとの秒数を書き込みます"""
+        return self._executor.submit(self._run, script, timings, time.perf_counter())
+
+    def _run(self, script, timings, submitted):
+        worker = self._idle.get()
+        try:
+            start = time.perf_counter()
+            if timings is not None: timings["queue"] = start - submitted
+            worker.run(script, timings)
+            return time.perf_counter() - start
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        for worker in self._workers: worker.stop()
+
+
+class RenderTrace:
+    """1回の描画（プレビュー，画像の保存，エクスポート）を段階ごとに計った時間
+
+    mark() で区切った処理，stage() で囲んだ処理，別のスレッドで計った秒数（add_all()）を段階ごとに足していき，
+    finish() で全体の時間を確定します．
+    """
+
+    def __init__(self, kind, started=None, **info):
+        self.kind = kind
+        self.info = info
+        self.stages = {}
+        self.started = self._last = time.perf_counter() if started is None else started
+        self.elapsed = None
+
+    def mark(self, name):
+        """前回のmark()（または開始）からの時間をnameの段階に足す"""
+        now = time.perf_counter()
+        self.add(name, now - self._last)
+        self._last = now
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_all(self, timings):
+        for name, seconds in timings.items(): self.add(name, seconds)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def finish(self, **info):
+        self.info.update(info)
+        self.elapsed = time.perf_counter() - self.started
+
+    def status_text(self):
+        stages = ", ".join(f"{name} {seconds * 1000:.1f}" for name, seconds in self.stages.items())
+        error = "  (failed)" if self.info.get("error") else ""
+        tags = ([self.info["format"].upper()] if self.info.get("format") else []) + (["interactive"] if self.info.get("interactive") else [])
+        kind = self.kind.capitalize() + (f" ({', '.join(tags)})" if tags else "")
+        return f"{kind}: {self.elapsed * 1000:.1f} ms  [{stages} ms]{error}"
+
+    def record(self):
+        return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "kind": self.kind, "total_ms": round(self.elapsed * 1000, 3),
+                "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}, **self.info}
+
+
+class TraceLog:
+    """RenderTraceを1行1件のJSON（JSON Lines）でファイルに追記する．開いていない間は何もしない"""
+
+    def __init__(self):
+        self.path = None
+        self._file = None
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    def open(self, path):
+        self.close()
+        self._file = open(path, 'a', encoding='utf-8')
+        self.path = path
+
+    def close(self):
+        if self._file is not None: self._file.close()
+        self._file, self.path = None, None
+
+    def write(self, trace):
+        if self._file is None: return
+        self._file.write(json.dumps(trace.record(), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+
+class PreviewImageCache:
+    """描画済みのプレビュー画像を保持するLRUキャッシュ
+
+    キーはgnuplotスクリプトと，プロットしている各データファイルのパス・サイズ・更新時刻から作ります．
+    保持する画像の合計サイズが上限を超えたら，最も長く使われていないものから捨てます．
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(script, paths):
+        digest = hashlib.sha1(script.encode('utf-8'))
+        for path in paths:
+            try:
+                st = os.stat(path)
+                signature = f"{path}\0{st.st_size}\0{st.st_mtime_ns}"
+            except OSError:
+                signature = f"{path}\0missing"
+            digest.update(b"\0" + signature.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        image = self._entries.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return image
+
+    @staticmethod
+    def _size(image):
+        return len(image) if isinstance(image, bytes) else image.sizeInBytes()
+
+    def put(self, key, image):
+        """imageはQImage，またはSVGのプレビューならSVGのバイト列"""
+        size = self._size(image)
+        if size > self.max_bytes: return
+        old = self._entries.pop(key, None)
+        if old is not None: self.total_bytes -= self._size(old)
+        self._entries[key] = image
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= self._size(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def summary(self):
+        return f"Preview cache: {self.hits} hits / {self.misses} misses, {len(self._entries)} images ({self.total_bytes / (1024 * 1024):.1f} MB)"
+
+
+def composite_images(images):
+    """透明な背景で描いた層の画像を，先頭の画像の上に順に重ねる"""
+    result = images[0].convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(result)
+    for image in images[1:]:
+        painter.drawImage(0, 0, image)
+    painter.end()
+    return result
+
+
+class AdaptiveDebounce:
+    """最近の描画時間から，設定が変わってからプレビューを描き直すまでの待ち時間を決める
+
+    小さなプロットはすぐに描き直し，描画に時間のかかるプロジェクトでは続けて来る変更をまとめてから描きます．
+    待ち時間は直近window回の描画時間の中央値のfactor倍を，min_msからmax_msに収めた値です．
+    """
+
+    def __init__(self, initial_ms=REDRAW_DEBOUNCE_MS, min_ms=REDRAW_DEBOUNCE_MIN_MS, max_ms=REDRAW_DEBOUNCE_MAX_MS, factor=REDRAW_DEBOUNCE_FACTOR, window=8):
+        self.initial_ms, self.min_ms, self.max_ms, self.factor = initial_ms, min_ms, max_ms, factor
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def reset(self):
+        self.samples.clear()
+
+    def delay_ms(self):
+        if not self.samples: return self.initial_ms
+        ordered = sorted(self.samples)
+        median = ordered[len(ordered) // 2]
+        return round(min(self.max_ms, max(self.min_ms, median * 1000 * self.factor)))
+
+
+class PreviewRenderThread(QThread):
+    """プレビュー画像をGUIスレッドの外で描画するスレッド
+
+    依頼はプレビューのキャッシュのキーで区別し，描画中の一つと待ち行列の一つ（最新の依頼）だけを持ちます．
+    描画中の依頼は古くなっても中断せずに終わらせ（結果はキャッシュに入ります），描画中と同じキーの依頼は二度描きません．
+    PNGのデコードもこのスレッドで行い，結果はキーと段階ごとの秒数の辞書と一緒にシグナルでGUIスレッドへ渡します．
+    SVGで描画した場合は，デコードせずにバイト列のまま渡します．
+    """
+    rendered = Signal(str, object, object)
+    failed = Signal(str, str)
+
+    def __init__(self, worker: GnuplotWorker, parent=None):
+        super().__init__(parent)
+        self.worker = worker
+        self._cond = threading.Condition()
+        self._pending = None
+        self._running_key = None
+        self._stopping = False
+
+    def submit(self, key, script):
+        with self._cond:
+            if key == self._running_key:
+                # 描画中の結果がそのまま使えるため，待ち行列の古い依頼も要らない
+                self._pending = None
+                return
+            self._pending = (key, script)
+            self._cond.notify()
+
+    def busy(self):
+        """描画中または待ち行列に依頼があるか"""
+        with self._cond:
+            return self._pending is not None or self._running_key is not None
+
+    def discard(self, cancel_running=False):
+        """待ち行列の依頼を捨てる．cancel_runningなら描画中の依頼もgnuplotごと中断する"""
+        with self._cond:
+            self._pending = None
+            if cancel_running and self._running_key is not None:
+                self.worker.kill()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._pending = None
+            if self._running_key is not None:
+                self.worker.kill()
+            self._cond.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                key, script = self._pending
+                self._pending = None
+                self._running_key = key
+            timings = {}
+            try:
+                data = self.worker.render(script, timings)
+                if data.lstrip().startswith((b"<?xml", b"<svg")):
+                    image, error = data, None
+                else:
+                    start = time.perf_counter()
+                    image = QImage.fromData(data)
+                    timings["decode"] = time.perf_counter() - start
+                    error = None if not image.isNull() else "Failed to load image from Gnuplot."
+            except RenderCancelled:
+                image, error = None, None
+            except GnuplotError as e:
+                image, error = None, f"Gnuplot Error:\n{e}"
+            except Exception as e:
+                image, error = None, f"Runtime Error:\n{e}"
+            with self._cond:
+                self._running_key = None
+            # 新しい依頼が待っていても結果は渡す（キャッシュに入れ，今の表示に使えるかはGUIスレッドがキーで判断する）
+            if image is not None and error is None:
+                self.rendered.emit(key, image, timings)
+            elif error is not None:
+                self.failed.emit(key, error)
+
+
+def file_fingerprint(path):
+    """ファイルの同一性を判定するための (絶対パス, サイズ, 更新時刻) を返す"""
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+# このプロセスで使ったキャッシュファイルの名前（最初の "." まで）．sweep_cache_dir() はこれらを消さない
+_cache_names_in_use = set()
+_cache_sweep_lock = threading.Lock()
+
+
+def _cache_group_name(path):
+    return os.path.basename(path).split('.', 1)[0]
+
+
+def cache_file_path(prefix, key, ext):
+    """前処理の結果を保存するキャッシュファイルのパスを返す（このプロセスが終わるまで sweep_cache_dir() で消されなくなる）"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    path = os.path.join(CACHE_DIR, f"{prefix}_{digest}.{ext}")
+    with _cache_sweep_lock:
+        _cache_names_in_use.add(_cache_group_name(path))
+    return path
+
+
+def sweep_cache_dir(max_bytes=None, keep=()):
+    """キャッシュのフォルダの合計サイズがmax_bytes（省略時はCACHE_DIR_MAX_BYTES）以下になるまで，最も長く使われていないものから消す
+
+    同じ前処理のファイル（grid_….bin と grid_….bin.json など）は名前の最初の "." までが同じなので，まとめて扱います．
+    最後に使った時刻はアクセス時刻と更新時刻の新しい方です．最も新しく使ったもの，このプロセスで cache_file_path() を
+    通して使ったもの，keepに渡したパスのもの，書き込み中（1時間以内の .tmp がある）のものは，上限を超えていても消しません．
+    戻り値は (消したファイル数, 空けたバイト数) です．
+    """
+    if max_bytes is None: max_bytes = CACHE_DIR_MAX_BYTES
+    keep = {_cache_group_name(path) for path in keep}
+    groups = {}
+    try:
+        entries = list(os.scandir(CACHE_DIR))
+    except OSError:
+        return 0, 0
+    now = time.time()
+    for entry in entries:
+        try:
+            if not entry.is_file(): continue
+            st = entry.stat()
+        except OSError:
+            continue
+        group = groups.setdefault(_cache_group_name(entry.name), {"name": _cache_group_name(entry.name), "paths": [], "bytes": 0, "used": 0.0, "writing": False})
+        group["paths"].append(entry.path)
+        group["bytes"] += st.st_size
+        group["used"] = max(group["used"], st.st_atime, st.st_mtime)
+        if entry.name.endswith(".tmp") and now - st.st_mtime < 3600: group["writing"] = True
+    total = sum(group["bytes"] for group in groups.values())
+    removed = freed = 0
+    # 最も新しく使ったものは，上限より大きくても残す（作ったばかりのものを次の実行でまた作らないように）
+    for group in sorted(groups.values(), key=lambda g: g["used"])[:-1]:
+        if total <= max_bytes: break
+        if group["writing"] or group["name"] in keep: continue
+        # 使用中かどうかは消す直前に確かめる．消した後に使い始めたものは，ファイルが無いので作り直される
+        with _cache_sweep_lock:
+            if group["name"] in _cache_names_in_use: continue
+            for path in group["paths"]:
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    continue  # 他のプロセスが使っている（Windowsでメモリマップ中など）
+                removed += 1
+                freed += size
+                total -= size
+    return removed, freed
+
+
+def parse_using_columns(using):
+    """using指定（"1:2:3" など）を列番号のリストにする．列番号以外を含む場合はNoneを返す"""
+    try:
+        columns = [int(c) for c in using.split(':')]
+    except ValueError:
+        return None
+    return columns if columns and all(c >= 1 for c in columns) else None
+
+
+def parse_data_lines(lines):
+    """テキストの行のリストを数値の2次元配列にする（コメント行と空行は読み飛ばす）"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # データの無いチャンクで出る警告は不要
+        return np.loadtxt(lines, comments='#', ndmin=2)
+
+
+def _is_number(token):
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+def sniff_data_file(path, max_bytes=SNIFF_BYTES):
+    """ファイルの先頭数KBだけをメモリマップで読み，列数・区切り文字・ヘッダー名・コメント行数を推定する
+
+    読む量はファイルの大きさによらず一定なので，巨大なファイルでもすぐに終わります．推定できない場合はNoneを返します．
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0: return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            head = mm[:min(size, max_bytes)]
+    lines = head.decode('utf-8', 'ignore').splitlines()
+    if len(head) < size and lines: lines.pop()  # 途中で切れた最後の行は使わない
+
+    comment_lines, last_comment, body = 0, None, []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped: continue
+        if stripped.startswith('#'):
+            comment_lines += 1
+            if not body: last_comment = stripped.lstrip('#').strip()
+            continue
+        body.append(stripped)
+        if len(body) >= 50: break
+    if not body: return None
+
+    # 数値として読める行が最も多く，列数がそろう区切り文字を選ぶ
+    best = None
+    for delimiter in [None, ',', '\t', ';']:
+        rows = [[t.strip() for t in row.split(delimiter)] for row in body]
+        numeric = [r for r in rows if all(_is_number(t) for t in r)]
+        if not numeric: continue
+        counts = [len(r) for r in numeric]
+        ncols = max(set(counts), key=counts.count)
+        score = (counts.count(ncols), ncols)
+        if best is None or score > best[0]:
+            best = (score, delimiter, ncols, rows)
+    if best is None: return None
+    _, delimiter, ncols, rows = best
+
+    # 先頭行が数値でなければヘッダー行，そうでなければ直前のコメント行を列名として使う
+    header = None
+    if not all(_is_number(t) for t in rows[0]) and len(rows[0]) == ncols:
+        header = rows[0]
+    elif last_comment:
+        names = [t.strip() for t in last_comment.split(delimiter)]
+        if len(names) == ncols and not all(_is_number(t) for t in names): header = names
+    return {"columns": ncols, "delimiter": delimiter, "header": header, "comment_lines": comment_lines}
+
+
+def describe_sniff_result(info):
+    delimiter_names = {None: "whitespace", ',': "comma", '\t': "tab", ';': "semicolon"}
+    text = f"{info['columns']} columns, {delimiter_names[info['delimiter']]}-separated"
+    if info["comment_lines"]: text += f", {info['comment_lines']} comment lines"
+    if info["header"]: text += f"\nHeader: {', '.join(info['header'])}"
+    return text
+
+
+def iter_data_chunks(path, chunk_rows=DATA_CHUNK_ROWS):
+    """テキストのデータファイルを，一定行数ずつ数値の2次元配列として読み出す"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                return
+            block = parse_data_lines(lines)
+            if block.size:
+                yield block
+
+
+# データ行の間に空行（gnuplotのブロック区切り）があるかを調べるためのパターンです
+_BLOCK_SEPARATOR = re.compile(r'\n[ \t\r]*\n[ \t\r]*\S')
+_TRAILING_BLANK = re.compile(r'\n[ \t\r]*\n\s*$')
+_sidecar_locks = {}
+_sidecar_locks_guard = threading.Lock()
+
+
+def _sidecar_lock(path):
+    with _sidecar_locks_guard:
+        return _sidecar_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def load_sidecar(path):
+    """変換済みのbinaryサイドカーがあり，元のファイルから変わっていなければその情報を返す"""
+    try:
+        fingerprint = file_fingerprint(path)
+        with open(cache_file_path("sidecar", fingerprint[0], "json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta["size"], meta["mtime_ns"]) != fingerprint[1:]: return None
+        if os.path.getsize(meta["bin_path"]) != meta["rows"] * meta["ncols"] * 8: return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return meta
+
+
+def build_sidecar(path):
+    """テキストのデータファイルを一度だけ読み，全列をfloat64のbinaryサイドカーに変換する
+
+    gnuplotはbinaryの方がテキストよりずっと速く読めます．
+    データの途中に空行（ブロック区切り）がある場合は，その構造がbinaryでは失われるため has_blocks を記録します．
+    """
+    fingerprint = file_fingerprint(path)
+    bin_path = cache_file_path("sidecar", fingerprint[0], "bin")
+    tmp_path = bin_path + ".tmp"
+    rows, ncols, has_blocks, pending_blank = 0, None, False, False
+    try:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as src, open(tmp_path, 'wb') as dst:
+            for chunk_index in itertools.count():
+                lines = list(itertools.islice(src, DATA_CHUNK_ROWS))
+                if not lines: break
+                text = ("\n" if chunk_index else "") + "".join(lines)
+                if not has_blocks:
+                    has_blocks = (pending_blank and bool(text.strip())) or _BLOCK_SEPARATOR.search(text) is not None
+                    pending_blank = _TRAILING_BLANK.search(text) is not None
+                block = parse_data_lines(lines)
+                if not block.size: continue
+                if ncols is None: ncols = block.shape[1]
+                if block.shape[1] != ncols: raise ValueError("Inconsistent number of columns.")
+                np.ascontiguousarray(block, dtype=np.float64).tofile(dst)
+                rows += len(block)
+        os.replace(tmp_path, bin_path)
+    except Exception:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    meta = {"source": fingerprint[0], "size": fingerprint[1], "mtime_ns": fingerprint[2],
+            "rows": rows, "ncols": ncols or 0, "has_blocks": has_blocks, "bin_path": bin_path}
+    with open(cache_file_path("sidecar", fingerprint[0], "json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def get_sidecar(path):
+    """binaryサイドカーを返す．まだ無いか古くなっていれば変換する（同じファイルの変換は同時に一つだけ）"""
+    with _sidecar_lock(path):
+        meta = load_sidecar(path)
+        return meta if meta is not None else build_sidecar(path)
+
+
+def sidecar_array(meta):
+    return np.memmap(meta["bin_path"], dtype=np.float64, mode='r', shape=(meta["rows"], meta["ncols"]))
+
+
+def data_chunks(path, chunk_rows=DATA_CHUNK_ROWS):
+    """データファイルを一定行数ずつ読み出す．binaryサイドカーがあればテキストを解析せずにメモリマップで読む"""
+    meta = load_sidecar(path)
+    if meta is None:
+        yield from iter_data_chunks(path, chunk_rows)
+        return
+    array = sidecar_array(meta)
+    for start in range(0, meta["rows"], chunk_rows):
+        yield np.asarray(array[start:start + chunk_rows])
+
+
+_EXPR_COLUMN = re.compile(r'\$(\d+)')
+# using式で使える関数（名前 -> NumPyの関数名）．floorとceilはgnuplotでは整数を返します
+_NUMPY_FUNCTIONS = {
+    "sqrt": "sqrt", "abs": "abs", "exp": "exp", "log": "log", "log10": "log10",
+    "sin": "sin", "cos": "cos", "tan": "tan", "asin": "arcsin", "acos": "arccos",
+    "atan": "arctan", "atan2": "arctan2", "sinh": "sinh", "cosh": "cosh", "tanh": "tanh",
+    "floor": "floor", "ceil": "ceil",
+}
+_INTEGER_FUNCTIONS = {"floor", "ceil"}
+_EXPR_BINARY_OPS = {ast.Add: "add", ast.Sub: "subtract", ast.Mult: "multiply"}
+
+
+def _divide(a, b):
+    # 0で割った点はgnuplotでは未定義（描かれない）
+    return np.where(b == 0, np.nan, a / b)
+
+
+def _integer_divide(a, b):
+    # 整数どうしの割り算は，gnuplot（C言語）と同じく0の方向に切り捨てる
+    return np.where(b == 0, np.nan, np.trunc(a / b))
+
+
+def _compile_expr_node(node):
+    """using式の構文木の一つのノードを (配列を返す関数, gnuplotで整数になるか) にする．扱えないノードはNone"""
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)): return None
+        return (lambda c: np.float64(value)), isinstance(value, int)
+    if isinstance(node, ast.Name):
+        if node.id != "pi": return None
+        return (lambda c: np.pi), False
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        operand = _compile_expr_node(node.operand)
+        if operand is None: return None
+        f, is_int = operand
+        return ((lambda c: -f(c)) if isinstance(node.op, ast.USub) else f), is_int
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow)):
+        left, right = _compile_expr_node(node.left), _compile_expr_node(node.right)
+        if left is None or right is None: return None
+        (f, f_int), (g, g_int) = left, right
+        if isinstance(node.op, ast.Div):
+            divide = _integer_divide if f_int and g_int else _divide
+            return (lambda c: divide(f(c), g(c))), f_int and g_int
+        if isinstance(node.op, ast.Pow):
+            if f_int and g_int:
+                # 整数の負のべき乗はgnuplotと結果が変わりうるため，指数が0以上の数値のときだけ扱う
+                exponent = node.right
+                if not (isinstance(exponent, ast.Constant) and exponent.value >= 0): return None
+            return (lambda c: np.power(f(c), g(c))), f_int and g_int
+        op = _EXPR_BINARY_OPS[type(node.op)]
+        return (lambda c: getattr(np, op)(f(c), g(c))), f_int and g_int
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        name = node.func.id
+        if name == "column":
+            if len(node.args) != 1: return None
+            index = node.args[0]
+            if not (isinstance(index, ast.Constant) and type(index.value) is int and index.value >= 1): return None
+            return (lambda c: c[:, index.value - 1]), False
+        if name not in _NUMPY_FUNCTIONS or len(node.args) != (2 if name == "atan2" else 1): return None
+        args = [_compile_expr_node(arg) for arg in node.args]
+        if any(arg is None for arg in args): return None
+        funcs = [f for f, _ in args]
+        is_int = name in _INTEGER_FUNCTIONS or (name == "abs" and args[0][1])
+        return (lambda c: getattr(np, _NUMPY_FUNCTIONS[name])(*[f(c) for f in funcs])), is_int
+    return None
+
+
+def compile_gnuplot_expression(expr):
+    """gnuplotのusing式（sqrt($4**2+$5**2) など）を，データの2次元配列から値を計算する関数に変換する
+
+    式はPythonの構文木にして，四則演算・べき乗・列の値（$n, column(n)）・よく使う数学関数だけを許します．
+    それ以外（三項演算子，比較，文字列関数など）を含む式はNoneを返します．
+    gnuplotと同じく，整数どうしの割り算は切り捨てになり，0で割った値はNaN（描かれない点）になります．
+    """
+    try:
+        tree = ast.parse(_EXPR_COLUMN.sub(r'column(\1)', expr.strip()), mode="eval")
+    except (SyntaxError, ValueError):
+        return None
+    compiled = _compile_expr_node(tree.body)
+    if compiled is None: return None
+    func = compiled[0]
+
+    def evaluate(block):
+        with np.errstate(all='ignore'):
+            return np.asarray(func(block), dtype=np.float64) * np.ones(len(block))
+    return evaluate
+
+
+def build_vector_file(path, columns, dims, magnitude_expr, scale, color_expr, out_path):
+    """ベクトルの正規化・長さの倍率・色の値を前もって計算し，gnuplotがそのまま読める列だけをbinaryで保存する
+
+    列は 位置(dims列), 成分(dims列), [色] の順です．大きさが0のベクトルは，gnuplotの式と同じく1で割ります．
+    """
+    magnitude = compile_gnuplot_expression(magnitude_expr) if magnitude_expr else None
+    color = compile_gnuplot_expression(color_expr) if color_expr else None
+    if (magnitude_expr and magnitude is None) or (color_expr and color is None):
+        raise ValueError("Unsupported expression.")
+    try:
+        get_sidecar(path)
+    except Exception:
+        pass  # 変換できないファイルはテキストのまま読む
+    position_idx = np.array(columns[:dims]) - 1
+    component_idx = np.array(columns[dims:2 * dims]) - 1
+    tmp_path = out_path + ".tmp"
+    rows = 0
+    with open(tmp_path, 'wb') as dst:
+        for block in data_chunks(path):
+            components = block[:, component_idx]
+            with np.errstate(all='ignore'):
+                if magnitude is not None:
+                    mag = magnitude(block)
+                    components = components / np.where(mag == 0, 1.0, mag)[:, None]
+                if scale != 1.0:
+                    components = components * scale
+            parts = [block[:, position_idx], components]
+            if color is not None: parts.append(color(block)[:, None])
+            np.ascontiguousarray(np.hstack(parts), dtype=np.float64).tofile(dst)
+            rows += len(block)
+    os.replace(tmp_path, out_path)
+    return {"path": out_path, "ncols": 2 * dims + (1 if color is not None else 0), "rows": rows}
+
+
+def _pixel_index(values, vmin, vmax, count):
+    span = vmax - vmin
+    if span <= 0:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.clip(((values - vmin) / span * count).astype(np.int64), 0, count - 1)
+
+
+def compute_lod_rows(chunks, x_col, y_col, mode, nx, ny=1, log_x=False, log_y=False, x_range=None, y_range=None):
+    """x列とy列をピクセルの格子に割り当て，表示上区別できない行を間引く
+
+    mode="envelope" では各ピクセル列でyが最小・最大になる行を，mode="points" では各ピクセルで最初に現れた行だけを残します．
+    行はすべての列を保ったまま元の順序で返すので，using指定や色の式はそのまま使えます．
+    chunksは同じデータを先頭から読み出すイテレータを返す関数で，範囲を求めるために2回呼びます．
+    x_range（mode="points" ではy_rangeも）に固定した表示範囲 (最小, 最大)（片方はNoneでも可）を渡すと，格子はその範囲だけに
+    割り当て，範囲外の行は捨てます．mode="envelope" では範囲の端をまたぐ線が切れないよう，両端のすぐ外側の行を1行ずつ残します．
+    戻り値は (残した行の2次元配列, 全行数) です．
+    """
+    def axis_bound(bound, log):
+        if bound is None or not log: return bound
+        return math.log10(bound) if bound > 0 else None
+
+    x_lo, x_hi = (axis_bound(b, log_x) for b in (x_range or (None, None)))
+    y_lo, y_hi = (axis_bound(b, log_y) for b in (y_range or (None, None))) if mode == "points" else (None, None)
+
+    def axis_values(block):
+        x, y = block[:, x_col - 1], block[:, y_col - 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if log_x: x = np.where(x > 0, np.log10(x), np.nan)
+            if log_y: y = np.where(y > 0, np.log10(y), np.nan)
+        return x, y, np.isfinite(x) & np.isfinite(y)
+
+    def in_range(x, y):
+        inside = np.ones(len(x), dtype=bool)
+        for values, lo, hi in ((x, x_lo, x_hi), (y, y_lo, y_hi)):
+            if lo is not None: inside &= values >= lo
+            if hi is not None: inside &= values <= hi
+        return inside
+
+    total, ncols = 0, None
+    xmin = ymin = np.inf
+    xmax = ymax = -np.inf
+    for block in chunks():
+        if ncols is None: ncols = block.shape[1]
+        if block.shape[1] != ncols: raise ValueError("Inconsistent number of columns.")
+        if max(x_col, y_col) > ncols: raise ValueError("Column index out of range.")
+        x, y, valid = axis_values(block)
+        valid &= in_range(x, y)
+        if valid.any():
+            xmin, xmax = min(xmin, x[valid].min()), max(xmax, x[valid].max())
+            ymin, ymax = min(ymin, y[valid].min()), max(ymax, y[valid].max())
+        total += len(block)
+    # 固定した範囲の端は，データがそこまで無くても格子の端にする
+    if x_lo is not None: xmin = x_lo
+    if x_hi is not None: xmax = x_hi
+    if y_lo is not None: ymin = y_lo
+    if y_hi is not None: ymax = y_hi
+    if not (np.isfinite(xmin) and np.isfinite(xmax)) or (mode == "points" and not (np.isfinite(ymin) and np.isfinite(ymax))):
+        raise ValueError("No valid data points.")
+
+    kept_rows, kept_data = [], []
+    offset = 0
+    if mode == "envelope":
+        lo_val, hi_val = np.full(nx, np.inf), np.full(nx, -np.inf)
+        lo_row, hi_row = np.full(nx, -1, dtype=np.int64), np.full(nx, -1, dtype=np.int64)
+        lo_data, hi_data = np.zeros((nx, ncols)), np.zeros((nx, ncols))
+        # 範囲の左のすぐ外（xが最大）と右のすぐ外（xが最小）の行の [x, 行番号, 行の値]
+        left, right = [-np.inf, -1, None], [np.inf, -1, None]
+        for block in chunks():
+            x, y, valid = axis_values(block)
+            if x_lo is not None:
+                outside = np.nonzero(valid & (x < x_lo))[0]
+                if len(outside):
+                    row = outside[np.argmax(x[outside])]
+                    if x[row] > left[0]: left[:] = x[row], offset + row, block[row].copy()
+            if x_hi is not None:
+                outside = np.nonzero(valid & (x > x_hi))[0]
+                if len(outside):
+                    row = outside[np.argmin(x[outside])]
+                    if x[row] < right[0]: right[:] = x[row], offset + row, block[row].copy()
+            idx = np.nonzero(valid & in_range(x, y))[0]
+            if len(idx):
+                bins, yv = _pixel_index(x[idx], xmin, xmax, nx), y[idx]
+                order = np.lexsort((yv, bins))
+                sorted_bins = bins[order]
+                boundary = sorted_bins[1:] != sorted_bins[:-1]
+                for pick, best_val, best_row, best_data, better in (
+                        (np.r_[True, boundary], lo_val, lo_row, lo_data, np.less),
+                        (np.r_[boundary, True], hi_val, hi_row, hi_data, np.greater)):
+                    rows, b = idx[order[pick]], sorted_bins[pick]
+                    update = better(y[rows], best_val[b])
+                    rows, b = rows[update], b[update]
+                    best_val[b] = y[rows]
+                    best_row[b] = offset + rows
+                    best_data[b] = block[rows]
+            offset += len(block)
+        for best_row, best_data in ((lo_row, lo_data), (hi_row, hi_data)):
+            found = best_row >= 0
+            kept_rows.append(best_row[found]); kept_data.append(best_data[found])
+        for _, row, data in (left, right):
+            if row >= 0: kept_rows.append(np.array([row])); kept_data.append(data[None, :])
+    else:
+        seen = np.zeros(nx * ny, dtype=bool)
+        for block in chunks():
+            x, y, valid = axis_values(block)
+            idx = np.nonzero(valid & in_range(x, y))[0]
+            if len(idx):
+                cells = _pixel_index(x[idx], xmin, xmax, nx) * ny + _pixel_index(y[idx], ymin, ymax, ny)
+                cells, first = np.unique(cells, return_index=True)
+                new = ~seen[cells]
+                seen[cells[new]] = True
+                rows = idx[first[new]]
+                kept_rows.append(offset + rows); kept_data.append(block[rows])
+            offset += len(block)
+
+    rows = np.concatenate(kept_rows) if kept_rows else np.zeros(0, dtype=np.int64)
+    data = np.concatenate(kept_data) if kept_data else np.zeros((0, ncols))
+    rows, unique_idx = np.unique(rows, return_index=True)
+    return data[unique_idx], total
+
+
+def build_lod_file(path, x_col, y_col, mode, nx, ny, log_x, log_y, out_path, x_range=None, y_range=None):
+    """間引いたデータをgnuplotのbinary形式（float64）で保存し，その情報を返す
+
+    空行（ブロック区切り）のあるファイルは，行を間引くと別のブロックの点どうしが線でつながってしまうため，
+    間引かずに has_blocks だけを返します．
+    """
+    meta = get_sidecar(path)
+    if meta["has_blocks"]:
+        return {"has_blocks": True}
+    data, total = compute_lod_rows(lambda: data_chunks(path), x_col, y_col, mode, nx, ny, log_x, log_y, x_range, y_range)
+    np.ascontiguousarray(data, dtype=np.float64).tofile(out_path)
+    return {"path": out_path, "ncols": data.shape[1], "rows": len(data), "total_rows": total, "has_blocks": False}
+
+
+def build_subsampled_file(path, target_rows, out_path):
+    """3Dのデータを行数がtarget_rows程度になるよう間引いたテキストファイルを作り，その情報を返す
+
+    空行で区切られた格子（走査線）のデータは，走査線とその中の点を同じ間隔で間引いて格子のまま残し，
+    区切りの無いデータは行を間引きます．端の走査線と各走査線の端の点は残すため，データの範囲は変わりません．
+    """
+    blocks = []  # 走査線ごとの行数
+    count = 0
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            text = line.strip()
+            if not text:
+                if count: blocks.append(count)
+                count = 0
+            elif not text.startswith('#'):
+                count += 1
+    if count: blocks.append(count)
+    total = sum(blocks)
+    if total <= target_rows:
+        return {"path": out_path, "rows": total, "total_rows": total}
+    step = math.ceil(math.sqrt(total / target_rows)) if len(blocks) > 1 else math.ceil(total / target_rows)
+    kept_blocks = set(range(0, len(blocks), step)) | {len(blocks) - 1}
+    rows = block = index = 0
+    tmp_path = out_path + ".tmp"
+    with open(path, 'r', encoding='utf-8', errors='replace') as f, open(tmp_path, 'w', encoding='utf-8') as out:
+        for line in f:
+            text = line.strip()
+            if not text:
+                if index:
+                    if block in kept_blocks: out.write("\n")
+                    block, index = block + 1, 0
+                continue
+            if text.startswith('#'): continue
+            if block in kept_blocks and (index % step == 0 or index == blocks[block] - 1):
+                out.write(text + "\n")
+                rows += 1
+            index += 1
+    os.replace(tmp_path, out_path)
+    return {"path": out_path, "rows": rows, "total_rows": total}
+
+
+class _ScanLineGrid:
+    """一定行数ずつ渡される (x, y) が，走査線ごとに並んだ格子（splotのデータと同じ並び）かを調べる
+
+    最初の走査線の間は片方の座標（外側）が一定で，もう片方（内側）だけが変わります．以降の走査線も
+    内側の値が最初の走査線と同じ順に並び，外側の値は走査線の中では一定，走査線どうしでは異なる必要があります．
+    メモリは最初の走査線と，走査線ごとの外側の値の分しか使いません．
+    """
+
+    def __init__(self, max_line=DATA_CHUNK_ROWS):
+        self.max_line = max_line
+        self.regular = True
+        self.inner = None  # 内側の座標（0: x, 1: y）
+        self.line = None  # 最初の走査線の内側の値
+        self.head = np.zeros((0, 2))  # 最初の走査線の長さが分かるまでの行
+        self.outer = []  # 走査線ごとの外側の値
+        self.rows = 0
+
+    def feed(self, xy):
+        if not self.regular or not len(xy): return
+        if self.line is None:
+            self.head = np.concatenate([self.head, xy])
+            if len(self.head) < 2: return
+            if self.inner is None:
+                changed = self.head[1] != self.head[0]
+                if changed[0] == changed[1]:
+                    self.regular = False
+                    return
+                self.inner = 0 if changed[0] else 1
+            ends = np.nonzero(self.head[:, 1 - self.inner] != self.head[0, 1 - self.inner])[0]
+            if not len(ends):
+                if len(self.head) > self.max_line: self.regular = False
+                return
+            self.line = self.head[:ends[0], self.inner].copy()
+            if np.unique(self.line).size != len(self.line):
+                self.regular = False
+                return
+            xy, self.head = self.head, None
+        index = self.rows + np.arange(len(xy))
+        pos, line = index % len(self.line), index // len(self.line)
+        if not np.array_equal(xy[:, self.inner], self.line[pos]):
+            self.regular = False
+            return
+        self.outer.extend(xy[pos == 0, 1 - self.inner])
+        if not np.array_equal(xy[:, 1 - self.inner], np.asarray(self.outer[line[0]:])[line - line[0]]):
+            self.regular = False
+            return
+        self.rows += len(xy)
+
+    def axes(self):
+        """格子なら (xの値, yの値) を小さい順に返す．格子でなければNone"""
+        if not self.regular or self.line is None or self.rows % len(self.line): return None
+        outer = np.unique(self.outer)
+        if len(outer) != len(self.outer) or len(outer) < 2: return None
+        line = np.sort(self.line)
+        return (line, outer) if self.inner == 0 else (outer, line)
+
+
+def build_grid_file(path, columns, resolution, out_path):
+    """3Dのデータを格子にしてgnuplotの binary matrix 形式（float32）で保存し，その情報を返す
+
+    x, y の値がそろった格子（走査線を区切る空行が無いものも含む）はそのままの点で，散らばった点は
+    resolution×resolution のセルに分けてセルごとのzの平均をとります（点の無いセルはNaNで，描かれません）．
+    ファイルは一定行数ずつ2回読み，1回目で範囲と格子かどうかを，2回目でセルの値を求めます．
+    同じファイル・同じ列・同じ解像度の結果は，次回以降もそのまま使います．
+    """
+    meta_path = out_path + ".json"
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    def xyz_chunks():
+        for chunk in data_chunks(path):
+            if chunk.shape[1] < max(columns): raise ValueError(f"The file has only {chunk.shape[1]} columns.")
+            xyz = chunk[:, [c - 1 for c in columns]]
+            yield xyz[np.isfinite(xyz).all(axis=1)]
+
+    points, scan = 0, _ScanLineGrid()
+    lo, hi = np.full(2, np.inf), np.full(2, -np.inf)
+    for xyz in xyz_chunks():
+        if not len(xyz): continue
+        points += len(xyz)
+        lo, hi = np.minimum(lo, xyz[:, :2].min(axis=0)), np.maximum(hi, xyz[:, :2].max(axis=0))
+        scan.feed(xyz[:, :2])
+    if not points: raise ValueError("The file has no data points.")
+    axes = scan.axes()
+    regular = axes is not None
+    if regular:
+        gx, gy = axes
+        grid = np.full((len(gy), len(gx)), np.nan)
+        for xyz in xyz_chunks():
+            grid[np.searchsorted(gy, xyz[:, 1]), np.searchsorted(gx, xyz[:, 0])] = xyz[:, 2]
+    else:
+        # 各セルに入った点のzの平均（セルの位置は中心）
+        (xmin, ymin), (xmax, ymax) = lo, hi
+        counts = np.zeros(resolution * resolution)
+        sums = np.zeros(resolution * resolution)
+        for xyz in xyz_chunks():
+            x, y, z = xyz.T
+            cells = _pixel_index(y, ymin, ymax, resolution) * resolution + _pixel_index(x, xmin, xmax, resolution)
+            counts += np.bincount(cells, minlength=resolution * resolution)
+            sums += np.bincount(cells, weights=z, minlength=resolution * resolution)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            grid = (sums / counts).reshape(resolution, resolution)
+        gx = xmin + (np.arange(resolution) + 0.5) * (xmax - xmin) / resolution
+        gy = ymin + (np.arange(resolution) + 0.5) * (ymax - ymin) / resolution
+    # binary matrix: 1行目は [列数, x0, x1, ...]，以降の行は [y, z(x0), z(x1), ...]
+    matrix = np.empty((len(gy) + 1, len(gx) + 1), dtype=np.float32)
+    matrix[0, 0] = len(gx)
+    matrix[0, 1:], matrix[1:, 0], matrix[1:, 1:] = gx, gy, grid
+    tmp_path = out_path + ".tmp"
+    matrix.tofile(tmp_path)
+    os.replace(tmp_path, out_path)
+    meta = {"path": out_path, "regular": bool(regular), "nx": len(gx), "ny": len(gy), "points": points}
+    with open(meta_path, 'w', encoding='utf-8') as f: json.dump(meta, f)
+    return meta
+
+
+def gridding_options(plot_info, mode):
+    """Grid Dataを使うプロットなら (x, y, zの列番号, 解像度) を返す．使わない・使えない場合はNone"""
+    gridding = plot_info.get("gridding", {})
+    if mode != '3d' or not gridding.get("enabled", False) or plot_info.get("is_vector", False): return None
+    columns = parse_using_columns(plot_info.get("using", ""))
+    if not columns or len(columns) < 3: return None
+    return columns[:3], gridding.get("resolution", GRID_DEFAULT_RESOLUTION)
+
+
+def grid_cache_key(path, columns, resolution):
+    return ("grid", file_fingerprint(path), tuple(columns), resolution)
+
+
+def grid_data_source(meta):
+    shape = f"{meta['nx']}×{meta['ny']}"
+    note = f"Regular grid {shape} sent as binary matrix" if meta["regular"] else f"Gridded: {meta['points']:,} points → {shape} cells"
+    return DataSource(meta["path"], binary="matrix", using=["1", "2", "3"], note=note, rows=meta["nx"] * meta["ny"])
+
+
+def histogram_options(plot_info, mode):
+    """ヒストグラムのプロットなら (値の列番号, ビンの設定) を返す．ヒストグラムでない・列番号で数えられない場合はNone"""
+    if mode != '2d' or not plot_info.get("is_histogram", False): return None
+    columns = parse_using_columns(plot_info.get("using", ""))
+    if not columns: return None
+    histogram = plot_info.get("histogram", {})
+    return columns[0], {key: histogram.get(key, default) for key, default in HISTOGRAM_DEFAULTS.items()}
+
+
+def _parse_bound(text):
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def histogram_edges(options, vmin, vmax):
+    """ビンの設定とデータの最小・最大から，ビンの境界の配列を作る"""
+    lo, hi = _parse_bound(options["range_min"]), _parse_bound(options["range_max"])
+    lo = vmin if lo is None else lo
+    hi = vmax if hi is None else hi
+    if hi == lo: lo, hi = lo - 0.5, hi + 0.5
+    if not hi > lo: raise ValueError("Invalid histogram range.")
+    width = options["bin_width"]
+    if width > 0:
+        count = max(1, math.ceil((hi - lo) / width))
+        if count > HISTOGRAM_MAX_BINS: raise ValueError("Too many histogram bins.")
+        return lo + width * np.arange(count + 1)
+    return np.linspace(lo, hi, max(1, int(options["bins"])) + 1)
+
+
+def histogram_values_key(path, column):
+    return ("values", file_fingerprint(path), column)
+
+
+def histogram_cache_key(path, column, options):
+    return ("histogram", file_fingerprint(path), column, tuple(sorted(options.items())))
+
+
+def build_sorted_values(path, column, out_path):
+    """ヒストグラムにする列について，有限な値の個数・最小・最大を求める
+
+    値がHISTOGRAM_SORT_MAX_ROWS個以下なら並べ替えてfloat64で保存し，その path を返します．
+    並べ替えた値があれば，ビンの幅や範囲を変えてもファイルを読まずに二分探索だけで数え直せます．
+    同じファイル・同じ列の結果は，次回以降もそのまま使います．
+    """
+    meta_path = out_path + ".json"
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        pass
+    parts, count, vmin, vmax = [], 0, math.inf, -math.inf
+    for chunk in data_chunks(path):
+        if chunk.shape[1] < column: raise ValueError(f"The file has only {chunk.shape[1]} columns.")
+        values = chunk[:, column - 1]
+        values = values[np.isfinite(values)]
+        if not len(values): continue
+        count += len(values)
+        vmin, vmax = min(vmin, float(values.min())), max(vmax, float(values.max()))
+        if parts is not None:
+            parts.append(values)
+            if count > HISTOGRAM_SORT_MAX_ROWS: parts = None
+    if not count: raise ValueError("The file has no data points.")
+    sorted_path = None
+    if parts is not None:
+        tmp_path = out_path + ".tmp"
+        np.sort(np.concatenate(parts)).tofile(tmp_path)
+        os.replace(tmp_path, out_path)
+        sorted_path = out_path
+    meta = {"path": sorted_path, "count": count, "min": vmin, "max": vmax}
+    with open(meta_path, 'w', encoding='utf-8') as f: json.dump(meta, f)
+    return meta
+
+
+def build_histogram_file(path, column, options, values_meta, out_path):
+    """ビンごとの [中心, 高さ, 幅] の表をfloat64のbinaryで保存し，その情報を返す
+
+    values_metaはbuild_sorted_values()の結果です．並べ替えた値があればそこから数え，無ければ
+    ファイルを一定行数ずつ読みながら数えます（テキストはbinaryサイドカーに変換して，次からの読み直しを速くします）．
+    高さは normalize に応じて個数（count），全体に対する割合（probability），確率密度（density）です．
+    """
+    meta_path = out_path + ".json"
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        pass
+    edges = histogram_edges(options, values_meta["min"], values_meta["max"])
+    if values_meta["path"] is not None:
+        values = np.memmap(values_meta["path"], dtype=np.float64, mode='r')
+        index = np.searchsorted(values, edges)
+        index[-1] = np.searchsorted(values, edges[-1], side='right')  # np.histogramと同じく最後のビンは右端を含む
+        counts = np.diff(index)
+    else:
+        try:
+            get_sidecar(path)
+        except ValueError:
+            pass
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        for chunk in data_chunks(path):
+            values = chunk[:, column - 1]
+            counts += np.histogram(values[np.isfinite(values)], edges)[0]
+    widths = np.diff(edges)
+    heights = counts.astype(np.float64)
+    if options["normalize"] == "probability": heights /= values_meta["count"]
+    elif options["normalize"] == "density": heights /= values_meta["count"] * widths
+    tmp_path = out_path + ".tmp"
+    np.column_stack([edges[:-1] + widths / 2, heights, widths]).tofile(tmp_path)
+    os.replace(tmp_path, out_path)
+    meta = {"path": out_path, "bins": len(widths), "values": values_meta["count"]}
+    with open(meta_path, 'w', encoding='utf-8') as f: json.dump(meta, f)
+    return meta
+
+
+def histogram_data_source(meta, style_info):
+    # boxesだけは3列目をビンの幅として使う
+    using = ["1", "2", "3"] if style_info.get("style") == "boxes" else ["1", "2"]
+    note = f"Histogram: {meta['values']:,} values → {meta['bins']:,} bins"
+    return DataSource(meta["path"], binary='format="%3float64"', using=using, note=note, rows=meta["bins"])
+
+
+def uses_row_number(style_info):
+    """色の式が行番号（$0）を使うか．行を間引くと結果が変わるため，間引きの対象外にする"""
+    return bool(style_info.get("color_from_value")) and re.search(r'\$0(?!\d)|column\(\s*0\s*\)', style_info.get("color_expression", "")) is not None
+
+
+def binary_file_chunks(path, ncols, chunk_rows=DATA_CHUNK_ROWS):
+    """build_vector_file などで保存したfloat64のbinaryファイルを一定行数ずつ読み出す"""
+    array = np.memmap(path, dtype=np.float64, mode='r').reshape(-1, ncols)
+    for start in range(0, len(array), chunk_rows):
+        yield np.asarray(array[start:start + chunk_rows])
+
+
+def compute_plot_extents(chunks, axis_exprs, log_axes=()):
+    """プロットの各軸に使われるusing式の値の最小・最大を求める
+
+    axis_exprsは {軸名: [式, ...]} です．gnuplotの自動スケールと同じく，どれかの座標が無効な行
+    （NaNや，対数軸での0以下の値）は数えません．戻り値は {"rows": 有効な行数, "ranges": {軸名: [最小, 最大]}} です．
+    """
+    funcs = {axis: [compile_gnuplot_expression(e) for e in exprs] for axis, exprs in axis_exprs.items()}
+    if any(f is None for fs in funcs.values() for f in fs):
+        raise ValueError("Unsupported expression.")
+    lo = {axis: np.inf for axis in funcs}
+    hi = {axis: -np.inf for axis in funcs}
+    count = 0
+    for block in chunks:
+        values = {axis: [f(block) for f in fs] for axis, fs in funcs.items()}
+        valid = np.ones(len(block), dtype=bool)
+        for axis, vs in values.items():
+            for v in vs:
+                valid &= np.isfinite(v)
+                if axis in log_axes: valid &= v > 0
+        if not valid.any(): continue
+        count += int(valid.sum())
+        for axis, vs in values.items():
+            for v in vs:
+                lo[axis], hi[axis] = min(lo[axis], float(v[valid].min())), max(hi[axis], float(v[valid].max()))
+    return {"rows": count, "ranges": {axis: [lo[axis], hi[axis]] for axis in funcs} if count else {}}
+
+
+class QuantileSketch:
+    """値を一定行数ずつ受け取りながら，近似の分位点を求めるための要約
+
+    受け取った値は並べ替えて等間隔の順位のsize個に間引き，残した値ごとに代表する個数を重みとして持ちます．
+    要約が溜まったら同じ方法で一つにまとめ直すため，行数によらず使うメモリは一定です．
+    順位の誤差は，まとめ直した回数 / size 程度です．
+    """
+
+    def __init__(self, size=STATS_SKETCH_SIZE):
+        self.size = size
+        self.values = []
+        self.weights = []
+
+    def add(self, values, weights=None):
+        values = np.asarray(values, dtype=np.float64)
+        order = np.argsort(values, kind='stable')
+        values = values[order]
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)[order]
+        if len(values) > self.size: values, weights = self._condense(values, weights)
+        self.values.append(values)
+        self.weights.append(weights)
+        if len(self.values) > 64:
+            values, weights = self._condense(*self._merged())
+            self.values, self.weights = [values], [weights]
+
+    def _condense(self, values, weights):
+        """並べ替え済みの重み付きの値を，累積の重みが等間隔になるsize個の値にまとめる"""
+        cumulative = np.cumsum(weights)
+        total = cumulative[-1]
+        index = np.searchsorted(cumulative, (np.arange(self.size) + 0.5) * total / self.size)
+        return values[np.minimum(index, len(values) - 1)], np.full(self.size, total / self.size)
+
+    def _merged(self):
+        values, weights = np.concatenate(self.values), np.concatenate(self.weights)
+        order = np.argsort(values, kind='stable')
+        return values[order], weights[order]
+
+    def quantiles(self, qs):
+        """分位点（qsは0から1の値のリスト）を返す．値を一つも受け取っていなければNone"""
+        if not self.values: return None
+        values, weights = self._merged()
+        cumulative = np.cumsum(weights)
+        index = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1])
+        return values[np.minimum(index, len(values) - 1)].tolist()
+
+
+def compute_column_stats(chunks, exprs):
+    """using式ごとに，有限な値の個数・最小・最大・平均・正の最小値と，1%刻みの近似の分位点を一回の読み込みで求める
+
+    戻り値は {式: 統計} で，統計は {"count", "min", "max", "mean", "min_positive", "quantiles"} の辞書
+    （値が無い式はNone）です．quantilesは0%から100%までの101個の値です．
+    """
+    funcs = {expr: compile_gnuplot_expression(expr) for expr in exprs}
+    if any(f is None for f in funcs.values()): raise ValueError("Unsupported expression.")
+    acc = {expr: {"count": 0, "sum": 0.0, "min": math.inf, "max": -math.inf, "min_positive": math.inf, "sketch": QuantileSketch()} for expr in exprs}
+    for block in chunks:
+        for expr, func in funcs.items():
+            values = np.broadcast_to(func(block), (len(block),))
+            values = values[np.isfinite(values)]
+            if not len(values): continue
+            a = acc[expr]
+            a["count"] += len(values)
+            a["sum"] += float(values.sum())
+            a["min"], a["max"] = min(a["min"], float(values.min())), max(a["max"], float(values.max()))
+            positive = values[values > 0]
+            if len(positive): a["min_positive"] = min(a["min_positive"], float(positive.min()))
+            a["sketch"].add(values)
+    result = {}
+    for expr, a in acc.items():
+        if not a["count"]:
+            result[expr] = None
+            continue
+        quantiles = a["sketch"].quantiles(np.linspace(0.0, 1.0, 101))
+        quantiles[0], quantiles[-1] = a["min"], a["max"]
+        result[expr] = {"count": a["count"], "min": a["min"], "max": a["max"], "mean": a["sum"] / a["count"],
+                        "min_positive": a["min_positive"] if math.isfinite(a["min_positive"]) else None, "quantiles": quantiles}
+    return result
+
+
+def build_column_stats(path, exprs, out_path):
+    """データファイルの列の統計（compute_column_stats()）を求め，ファイルが変わらない限り次回以降もそのまま使う"""
+    try:
+        with open(out_path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        pass
+    result = compute_column_stats(data_chunks(path), exprs)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(result, f)
+    os.replace(tmp_path, out_path)
+    return result
+
+
+def stats_axis_exprs(plot_info, mode):
+    """軸の範囲の候補を求めるため，プロットの各軸（色はcb）に使われるusing式を返す（{軸名: [式, ...]}）
+
+    列番号と括弧でくくった式だけを扱い，NumPyで計算できない式の軸は含めません．
+    """
+    exprs = []
+    for item in plot_info.get("using", "").split(':'):
+        item = item.strip()
+        exprs.append(f"${item}" if item.isdigit() else item if item.startswith('(') else None)
+    if mode == '2d' and plot_info.get("is_histogram", False):
+        axes = ["x"]
+    else:
+        axes = ["x", "y", "z"] if mode == '3d' else ["x", "y2" if plot_info.get("axis") == "y2" else "y"]
+    result = {axis: [expr] for axis, expr in zip(axes, exprs) if expr is not None}
+    style_info = plot_info["style"]
+    if not plot_info.get("is_model_mode", False) and not plot_info.get("is_histogram", False):
+        if style_info.get("color_from_value", False) and style_info.get("color_expression", ""):
+            result["cb"] = [style_info["color_expression"]]
+        elif mode == '3d' and style_info.get("style") == "pm3d" and "z" in result:
+            result["cb"] = result["z"]  # pm3dは色をzの値で決める
+    return {axis: exprs for axis, exprs in result.items() if compile_gnuplot_expression(exprs[0]) is not None}
+
+
+def merge_column_stats(stats_list):
+    """複数のプロット（式）の統計を一つにまとめる．分位点は各統計の分位点を個数で重み付けしてまとめた近似値です"""
+    stats_list = [s for s in stats_list if s]
+    if not stats_list: return None
+    count = sum(s["count"] for s in stats_list)
+    positives = [s["min_positive"] for s in stats_list if s["min_positive"] is not None]
+    sketch = QuantileSketch()
+    for s in stats_list:
+        sketch.add(s["quantiles"], np.full(len(s["quantiles"]), s["count"] / len(s["quantiles"])))
+    quantiles = sketch.quantiles(np.linspace(0.0, 1.0, 101))
+    vmin, vmax = min(s["min"] for s in stats_list), max(s["max"] for s in stats_list)
+    quantiles[0], quantiles[-1] = vmin, vmax
+    return {"count": count, "min": vmin, "max": vmax, "mean": sum(s["mean"] * s["count"] for s in stats_list) / count,
+            "min_positive": min(positives) if positives else None, "quantiles": quantiles}
+
+
+def format_range_bound(value, upper):
+    """範囲の端の値を短い文字列にする．端のデータが範囲から外れないよう，丸めた値が内側に入る場合は桁を増やす"""
+    for digits in (6, 10, 17):
+        text = f"{value:.{digits}g}"
+        if (float(text) >= value) if upper else (float(text) <= value): return text
+    return text
+
+
+def quantize_normal_tics(span, guide=20.0):
+    """gnuplotが自動で決める目盛りの間隔（gnuplotのquantize_normal_tics()と同じ計算）"""
+    power = 10.0 ** math.floor(math.log10(span))
+    xnorm = span / power
+    posns = guide / xnorm
+    if posns > 40: tics = 0.05
+    elif posns > 20: tics = 0.1
+    elif posns > 10: tics = 0.2
+    elif posns > 4: tics = 0.5
+    elif posns > 2: tics = 1
+    elif posns > 0.5: tics = 2
+    else: tics = math.ceil(xnorm)
+    return tics * power
+
+
+def extend_autoscale_range(vmin, vmax, log=False):
+    """データの最小・最大から，gnuplotの自動スケールと同じく目盛りの位置まで外側に広げた範囲を返す"""
+    if vmin == vmax:
+        # gnuplotは幅のない範囲を，0なら±1，それ以外は±1%広げる
+        widen = 1.0 if vmax == 0 else 0.01 * abs(vmax)
+        vmin, vmax = vmin - widen, vmax + widen
+        if log and vmin <= 0: vmin = vmax / 100.0
+    if log:
+        lo, hi = math.log10(vmin), math.log10(vmax)
+        step = max(1.0, quantize_normal_tics(hi - lo)) if hi > lo else 1.0
+        return 10.0 ** (step * math.floor(lo / step)), 10.0 ** (step * math.ceil(hi / step))
+    step = quantize_normal_tics(vmax - vmin)
+    return step * math.floor(vmin / step), step * math.ceil(vmax / step)
+
+
+class TailBuffer:
+    """追記されていくデータファイルを，前回読んだ位置から先のバイトだけ解析して保持する
+
+    window_rowsが正なら最後のwindow_rows行だけをリングバッファに残し（0ならすべての行），
+    gnuplotにはbinary（float64）のファイルとして渡します．ファイルが短くなった・置き換えられた場合は先頭から読み直します．
+    空行（ブロックの区切り）とコメント行，数値でない行は読み飛ばします．
+    poll()はワーカースレッドで呼ぶため，GUIのスレッドからは snapshot() で読み込み結果を受け取ります．
+    """
+    READ_BYTES = 16 * 1024 * 1024
+    RING_MIN_ROWS = 4096
+
+    def __init__(self, path, window_rows=0):
+        self.path = path
+        self.window_rows = window_rows
+        self.out_path = cache_file_path("tail", (os.path.abspath(path), window_rows), "bin")
+        self._lock = threading.Lock()
+        self._snapshot = (False, None, 0, None)
+        self.reset()
+
+    def snapshot(self):
+        """最後に読み込み終えた時点の (読み込んだか, エラー, 出力ファイルの行数, 列数) を返す"""
+        with self._lock:
+            return self._snapshot
+
+    def publish(self, error=None):
+        """読み込みの結果をsnapshot()に反映する．エラーの有無が変わった・初めての読み込みならTrueを返す"""
+        with self._lock:
+            polled, previous_error = self._snapshot[:2]
+            self._snapshot = (True, error, self.output_rows, self.ncols)
+        return not polled or error != previous_error
+
+    def reset(self):
+        self.offset = 0
+        self.inode = None
+        self.remainder = b""
+        self.ncols = None
+        self.rows = 0
+        self.output_rows = 0
+        self.ring = None
+        self.ring_start = 0
+        self.output_stale = False
+        with open(self.out_path, 'wb'):
+            pass
+
+    def poll(self):
+        """追記された分を読み込んで出力を更新する．出力が変わったかどうかを返す"""
+        st = os.stat(self.path)
+        if st.st_size < self.offset or (self.inode is not None and st.st_ino != self.inode):
+            self.reset()
+        self.inode = st.st_ino
+        changed = False
+        if st.st_size > self.offset:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                while True:
+                    chunk = f.read(self.READ_BYTES)
+                    if not chunk: break
+                    self.offset += len(chunk)
+                    data = self.remainder + chunk
+                    cut = data.rfind(b"\n") + 1
+                    # 書き込み途中の最後の行は，次に読むときまで持ち越す
+                    self.remainder = data[cut:]
+                    block = self._parse(data[:cut].decode('utf-8', 'ignore').splitlines())
+                    if len(block):
+                        self._append(block)
+                        changed = True
+        if (changed or self.output_stale) and self.window_rows > 0:
+            self._write_window()
+            changed = True
+        return changed
+
+    def _parse(self, lines):
+        try:
+            block = parse_data_lines(lines)
+        except ValueError:
+            # 見出しなど数値でない行や列数の違う行が混ざっている場合は，一行ずつ読んで使える行だけを残す
+            rows = []
+            for line in lines:
+                try:
+                    values = [float(v) for v in line.split('#', 1)[0].split()]
+                except ValueError:
+                    continue
+                if values and len(values) == (self.ncols or len(values)):
+                    rows.append(values)
+                    if self.ncols is None: self.ncols = len(values)
+            block = np.array(rows, dtype=np.float64).reshape(-1, self.ncols or 0)
+        if len(block) and self.ncols is None: self.ncols = block.shape[1]
+        if len(block) and block.shape[1] != self.ncols:
+            raise ValueError("Inconsistent number of columns.")
+        return block
+
+    def _append(self, block):
+        if self.window_rows <= 0:
+            with open(self.out_path, 'ab') as f:
+                np.ascontiguousarray(block, dtype=np.float64).tofile(f)
+            self.rows += len(block)
+            self.output_rows = self.rows
+            return
+        size = self.window_rows
+        block = block[-size:]
+        needed = min(size, self.rows + len(block))
+        if self.ring is None or len(self.ring) < needed:
+            # 行が届くまで窓の大きさ分を確保しないよう，倍々に広げる（一周するのは窓の大きさになってから）
+            capacity = min(size, max(needed, 2 * len(self.ring) if self.ring is not None else 0, self.RING_MIN_ROWS))
+            ring = np.empty((capacity, self.ncols))
+            if self.ring is not None: ring[:self.rows] = self.ring[:self.rows]
+            self.ring = ring
+        capacity = len(self.ring)
+        self.ring[(self.ring_start + self.rows + np.arange(len(block))) % capacity] = block
+        overflow = self.rows + len(block) - capacity
+        if overflow > 0: self.ring_start = (self.ring_start + overflow) % capacity
+        self.rows = min(capacity, self.rows + len(block))
+        self.output_stale = True
+
+    def _write_window(self):
+        ordered = self.ring[(self.ring_start + np.arange(self.rows)) % len(self.ring)]
+        tmp_path = self.out_path + ".tmp"
+        ordered.tofile(tmp_path)
+        try:
+            os.replace(tmp_path, self.out_path)
+            self.output_rows = self.rows
+            self.output_stale = False
+        except OSError:
+            pass  # gnuplotが読み込み中で置き換えられない場合（Windows）は次の回に書き直す
+
+
+def poll_tail_buffers(buffers):
+    """各TailBufferの追記を読み込み，表示を更新する必要があるかを返す（読み込めないファイルはerrorに記録する）"""
+    changed = False
+    for buffer in buffers:
+        try:
+            changed = buffer.poll() or changed
+            error = None
+        except (OSError, ValueError) as e:
+            error = str(e)
+        changed = buffer.publish(error) or changed
+    return changed
+
+
+class DataSource:
+    """プレビュー用のスクリプトで，元のデータファイルの代わりにgnuplotへ読ませるデータ"""
+
+    def __init__(self, path, binary=None, using=None, note="", rows=None, total_rows=None):
+        self.path = path.replace('\\', '/')
+        self.binary = binary  # 例: 'format="%3float64"'（テキストならNone）
+        self.using = using  # using列をまるごと置き換える場合の式のリスト
+        self.note = note  # UIに表示する説明（間引き後の行数など）
+        self.rows = rows  # 行数（分からなければNone）
+        self.total_rows = total_rows  # 間引く前の行数（間引いていなければNone）
+
+
+class DataPrepCache:
+    """データファイルの前処理結果をバックグラウンドで作り，キーごとに保持するキャッシュ
+
+    lookup() は結果ができていればそれを返し，まだなら作成を始めて ("pending", None) を返します．
+    waitをTrueにすると，作成が終わるまで待って ("ready", 結果) か ("failed", 例外) を返します．
+    notifyがTrueの前処理は，作成が終わるとワーカースレッドからon_readyが呼ばれます．
+    失敗した前処理は同じキーでは再実行しません．
+    """
+
+    def __init__(self, on_ready=None, max_workers=2):
+        self.on_ready = on_ready
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="guinuplot-prep")
+        self._lock = threading.Lock()
+        self._results = {}
+        self._futures = {}
+
+    def lookup(self, key, builder, notify=True, wait=False):
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+            future = self._futures.get(key)
+            if future is None:
+                future = self._executor.submit(builder)
+                self._futures[key] = future
+                future.add_done_callback(lambda f, key=key: self._finish(key, f, notify))
+        if not wait: return ("pending", None)
+        # _finish()が呼ばれる前に戻ることがあるため，結果はfutureから直接取り出す
+        try:
+            return ("ready", future.result())
+        except Exception as e:
+            return ("failed", e)
+
+    def _finish(self, key, future, notify):
+        try:
+            result = ("ready", future.result())
+        except Exception as e:
+            result = ("failed", e)
+        with self._lock:
+            self._futures.pop(key, None)
+            self._results[key] = result
+        if notify and self.on_ready is not None:
+            self.on_ready()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# collect_settings() で保存される設定の既定値（apply_settings() で項目が無い場合に使う値と同じ）
+SETTINGS_DEFAULTS = {
+    'version': 3.1, 'plot_mode': 0, 'plots': [],
+    'legend': {'key_check': True, 'key_pos': 'default', 'key_maxrows': 0, 'key_maxcols': 0},
+    'general': {'title_check': False, 'title_input': ''},
+    'xaxis': {'label': 'X-Axis', 'range_check': False, 'range_min': '', 'range_max': '', 'tics_check': False, 'tics_xoffset': '0', 'tics_yoffset': '-1', 'log_check': False, 'grid_check': False},
+    'yaxis': {'label': 'Y-Axis', 'range_check': False, 'range_min': '', 'range_max': '', 'tics_check': False, 'tics_xoffset': '-1', 'tics_yoffset': '0', 'log_check': False},
+    'y2axis': {'label': 'Y2-Axis', 'range_check': False, 'range_min': '', 'range_max': '', 'tics_check': False, 'tics_xoffset': '1', 'tics_yoffset': '0', 'log_check': False},
+    'zaxis': {'label': 'Z-Axis', 'range_check': False, 'range_min': '', 'range_max': '', 'tics_check': False, 'tics_xoffset': '0', 'tics_yoffset': '0', 'log_check': False},
+    'view3d': {'rot_x': 60, 'rot_z': 30, 'pm3d_check': True, 'xyplane_check': False, 'xyplane_value': '0'},
+    'output': {'width': '800', 'height': '600', 'font_name': 'Times New Roman', 'font_size': 14, 'tail_fps': 5, 'export_scales': '', 'svg_preview': False},
+    'colorbar': {'check': True, 'label': 'Magnitude', 'format_10_power': False, 'range_check': False, 'range_min': '', 'range_max': '', 'size_check': False, 'origin_x': 0.92, 'origin_y': 0.1, 'size_w': 0.04, 'size_h': 0.8},
+}
+DASHTYPE_MAP = {"Solid": 1, "Dashed": 2, "Dotted": 3, "Dash-Dot": 4}
+
+
+def normalize_settings(settings):
+    """設定ファイルの内容に，足りない項目を既定値で補ったものを返す"""
+    result = {}
+    for key, default in SETTINGS_DEFAULTS.items():
+        value = settings.get(key, default)
+        result[key] = {**default, **value} if isinstance(default, dict) else value
+    return result
+
+
+def settings_mode(settings):
+    return '3d' if settings.get('plot_mode', 0) == 1 else '2d'
+
+
+def export_terminal_cmd(fmt, width, height, font, scale=1.0):
+    """画像を保存するときのterminal設定（fmtは "png", "svg", "pdf"）
+
+    scaleを指定すると，PNGを同じ見た目のまま高解像度で描きます（SVG, PDFでは無視します）．
+    """
+    if fmt == "svg":
+        return f'set terminal svg size {width},{height} {font}'
+    if fmt == "pdf":
+        return f'set terminal pdfcairo size {width/100.0:.2f},{height/100.0:.2f} {font}'
+    if scale != 1.0:
+        return f'set terminal pngcairo size {round(width * scale)},{round(height * scale)} enhanced {font} fontscale {scale:g} linewidth {scale:g}'
+    return f'set terminal pngcairo size {width},{height} enhanced {font}'
+
+
+def parse_export_scales(text):
+    """"2, 3" のようなカンマ区切りの倍率を読み取る（1倍と不正な値は除きます）"""
+    scales = []
+    for item in text.replace(';', ',').split(','):
+        try: value = float(item.strip().rstrip('xX'))
+        except ValueError: continue
+        if value > 0 and value != 1.0 and value not in scales: scales.append(value)
+    return scales
+
+
+def fixed_margin_commands(mode):
+    # --- 余白調整（Fix for margins sticking out）---
+    # 2D/3Dモードに応じて適切な余白を設定します。
+    # 目盛りやラベルの大きさを考慮し、以前よりも余裕を持たせた値を設定しました。
+    if mode == '2d':
+        # 2Dの場合、左側にY軸ラベル、下側にX軸ラベルのスペースを確保
+        return "set lmargin screen 0.20\nset rmargin screen 0.85\nset bmargin screen 0.20\nset tmargin screen 0.90\n"
+    # 3Dの場合、回転によって軸が大きくはみ出す可能性があるため、さらに余裕を確保
+    return "set lmargin screen 0.20\nset rmargin screen 0.80\nset bmargin screen 0.30\nset tmargin screen 0.90\n"
+
+
+def _section_title(s, mode, decor, has_y2):
+    g = s['general']
+    if decor and g['title_check'] and g['title_input']: return f'set title "{g["title_input"]}"\n'
+    return ""
+
+
+def _section_labels(s, mode, decor, has_y2):
+    script = ""
+    if decor and s['xaxis']['label']: script += f'set xlabel "{s["xaxis"]["label"]}"\n'
+    if decor and s['yaxis']['label']: script += f'set ylabel "{s["yaxis"]["label"]}"\n'
+    return script
+
+
+def _range_command(axis, a):
+    if a['range_check'] and a['range_min'] and a['range_max']: return f'set {axis}range [{a["range_min"]}:{a["range_max"]}]\n'
+    return ""
+
+
+def _section_ranges(s, mode, decor, has_y2):
+    return _range_command("x", s['xaxis']) + _range_command("y", s['yaxis'])
+
+
+def _section_colorbox(s, mode, decor, has_y2):
+    cb = s['colorbar']
+    script = ""
+    if decor and cb['check']:
+        if cb['size_check']:
+            script += f'set colorbox user origin {cb["origin_x"]:.2f},{cb["origin_y"]:.2f} size {cb["size_w"]:.2f},{cb["size_h"]:.2f}\n'
+        else: script += 'set colorbox default\n'
+        if cb['label']: script += f'set cblabel "{cb["label"]}"\n'
+        script += _range_command("cb", cb)
+        
+        if cb['format_10_power']:
+            script += 'set format cb "%.1tx10^{%T}"\n'
+        else:
+            script += 'unset format cb\n'
+    else: script += 'unset colorbox\n'
+    return script
+
+
+def _section_grid(s, mode, decor, has_y2):
+    return 'set grid\n' if decor and s['xaxis']['grid_check'] else ""
+
+
+def _section_key(s, mode, decor, has_y2):
+    k = s['legend']
+    if decor and k['key_check']:
+        key_options = [k['key_pos']]
+        if k['key_maxrows'] > 0: key_options.append(f"maxrows {k['key_maxrows']}")
+        if k['key_maxcols'] > 0: key_options.append(f"maxcols {k['key_maxcols']}")
+        return f'set key {" ".join(key_options)}\n'
+    return 'set key off\n'
+
+
+def _tics_command(axis, a):
+    return f'set {axis}tics offset {a["tics_xoffset"] or "0"},{a["tics_yoffset"] or "0"}\n' if a['tics_check'] else ""
+
+
+def _section_tics(s, mode, decor, has_y2):
+    if not decor: return ""
+    return _tics_command("x", s['xaxis']) + _tics_command("y", s['yaxis'])
+
+
+def _section_axes(s, mode, decor, has_y2):
+    script = ""
+    if mode == '2d':
+        y2 = s['y2axis']
+        if decor and has_y2 and y2['label']: script += f'set y2label "{y2["label"]}"\n'
+        if has_y2: script += _range_command("y2", y2)
+        if decor and has_y2:
+            script += 'set ytics nomirror\nset y2tics\n'
+            script += _tics_command("y2", y2)
+    else: # 3d
+        z = s['zaxis']
+        if decor and z['label']: script += f'set zlabel "{z["label"]}" rotate by 90\n'
+        script += _range_command("z", z)
+        if decor: script += _tics_command("z", z)
+    return script
+
+
+def _section_view(s, mode, decor, has_y2):
+    if mode != '3d': return ""
+    return f'set view {s["view3d"]["rot_x"]},{s["view3d"]["rot_z"]}\n'
+
+
+def _section_pm3d(s, mode, decor, has_y2):
+    if mode != '3d': return ""
+    v = s['view3d']
+    script = 'set pm3d explicit\n' if v['pm3d_check'] else 'unset pm3d\n'
+    # --- xyplane setting ---
+    if v['xyplane_check']:
+        script += f'set xyplane at {v["xyplane_value"]}\n'
+    # -----------------------
+    return script
+
+
+def _section_logscale(s, mode, decor, has_y2):
+    log_axes = ""
+    if s['xaxis']['log_check']: log_axes += "x"
+    if s['yaxis']['log_check']: log_axes += "y"
+    if mode == '2d':
+        if has_y2 and s['y2axis']['log_check']: log_axes += "y2"
+    elif s['zaxis']['log_check']: log_axes += "z"
+    return f'set logscale {log_axes}\n' if log_axes else 'unset logscale\n'
+
+
+# スクリプトのセクション（terminal, style, plot 以外）．GUIでは設定が変わったセクションだけを作り直す
+SCRIPT_SECTIONS = {
+    "title": _section_title, "labels": _section_labels, "ranges": _section_ranges, "colorbox": _section_colorbox,
+    "grid": _section_grid, "key": _section_key, "tics": _section_tics, "axes": _section_axes,
+    "view": _section_view, "pm3d": _section_pm3d, "logscale": _section_logscale,
+}
+
+
+def histogram_using(plot_info, plot_index, file_str):
+    """ヒストグラムをgnuplotのbinsで数えるusing指定と，それに必要なstatsコマンドを返す"""
+    hist = {**HISTOGRAM_DEFAULTS, **plot_info.get("histogram", {})}
+    column = plot_info["using"].split(':')[0]
+    lo, hi = _parse_bound(hist["range_min"]), _parse_bound(hist["range_max"])
+    normalize = hist["normalize"]
+    name = f"HIST{plot_index}"
+    stats = ""
+    if normalize != "count" or (lo is None) != (hi is None):
+        stats = f'stats {file_str} using (${column}) name "{name}" nooutput\n'
+    lo_expr = f"{lo:.17g}" if lo is not None else f"{name}_min"
+    hi_expr = f"{hi:.17g}" if hi is not None else f"{name}_max"
+    width = hist["bin_width"]
+    bins_str = f"bins={max(1, int(hist['bins']))}"
+    if lo is not None or hi is not None: bins_str += f" binrange [{lo_expr}:{hi_expr}]"
+    if width > 0: bins_str += f" binwidth={width:.17g}"
+    weight = "(1)"
+    if normalize == "probability": weight = f"(1.0/{name}_records)"
+    elif normalize == "density":
+        width_expr = f"{width:.17g}" if width > 0 else f"(({hi_expr})-({lo_expr}))/{max(1, int(hist['bins']))}"
+        weight = f"(1.0/({name}_records*{width_expr}))"
+    return f"using (${column}):{weight} {bins_str}", stats
+
+
+def script_from_settings(settings, output_path=None, terminal_cmd=None, data_sources=None, overlay_ranges=None, layer=None, section_cache=None):
+    """collect_settings() の形式の設定からgnuplotのスクリプトをセクションに分けて作り，GnuplotScriptとして返す
+
+    overlay_rangesに自動スケールの軸の範囲を渡すと，モデルを含む場合も範囲を固定した一回のplotで描きます．
+    Noneなら，範囲をgnuplotに求めさせるmultiplotの2回描画にします．
+    layerに "data" か "model" を指定すると（overlay_rangesが必要），余白を固定してその層のプロットだけを描きます．
+    "model" の層は題名・軸ラベル・目盛り・枠・凡例を含まず，重ねて表示するための画像になります．
+    section_cacheを渡すと，作ったセクションをそこに保存して次回も使います（設定が変わったら呼び出し側で消します）．
+    """
+    plots = settings['plots']
+    if not plots: return None
+    mode = settings_mode(settings)
+    decor = layer != "model"
+    if terminal_cmd: terminal = f"{terminal_cmd}\n"
+    else:
+        out = settings['output']
+        font_setting = f'font "{out["font_name"]},{out["font_size"]}"'
+        width = int(out['width'] or "800")
+        height = int(out['height'] or "600")
+        terminal = f'set terminal pngcairo size {width},{height} enhanced {font_setting}\n'
+    if output_path: terminal += f'set output "{output_path}"\n'
+    sections = [("terminal", terminal), ("style", 'set encoding utf8\nset palette rgbformulae 22,13,-31\n')]
+    has_y2 = mode == '2d' and any(p.get('axis') == 'y2' for p in plots)
+    for name, builder in SCRIPT_SECTIONS.items():
+        key = (name, decor, mode, has_y2)
+        text = section_cache.get(key) if section_cache is not None else None
+        if text is None:
+            text = builder(settings, mode, decor, has_y2)
+            if section_cache is not None: section_cache[key] = text
+        sections.append((name, text))
+    plot_command = "plot" if mode == '2d' else "splot"
+    script = ""
+    stats_commands = ""
+    normal_parts = []
+    model_parts = []
+
+    for plot_index, plot_info in enumerate(plots):
+        style_info = plot_info["style"]
+        is_vector = plot_info.get("is_vector", False)
+        is_model = plot_info.get("is_model_mode", False)
+        is_histogram = mode == '2d' and plot_info.get("is_histogram", False)
+
+        if is_model:
+            orig_cols = plot_info['using'].split(':')
+            limit = 3 if mode == '3d' else 2
+            using_cols = [f"(${c})" for c in orig_cols[:limit]]
+        else:
+            cols = plot_info['using'].split(':')
+            using_cols = [f"(${c})" for c in cols]
+
+        if is_vector and not is_model:
+            vec_opts = style_info.get("vector_options", {})
+            if vec_opts.get("normalize", False):
+                magnitude_expr = style_info.get("color_expression")
+                if magnitude_expr:
+                    magnitude_safe = f"(({magnitude_expr}) == 0 ? 1 : ({magnitude_expr}))"
+                    if mode == '2d' and len(using_cols) >= 4: using_cols[2] = f"({using_cols[2]} / {magnitude_safe})"; using_cols[3] = f"({using_cols[3]} / {magnitude_safe})"
+                    elif mode == '3d' and len(using_cols) >= 6: using_cols[3] = f"({using_cols[3]} / {magnitude_safe})"; using_cols[4] = f"({using_cols[4]} / {magnitude_safe})"; using_cols[5] = f"({using_cols[5]} / {magnitude_safe})"
+            scale = vec_opts.get('length_scale', 1.0)
+            if scale != 1.0:
+                if mode == '2d' and len(using_cols) >= 4: using_cols[2] = f"({using_cols[2]} * {scale})"; using_cols[3] = f"({using_cols[3]} * {scale})"
+                elif mode == '3d' and len(using_cols) >= 6: using_cols[3] = f"({using_cols[3]} * {scale})"; using_cols[4] = f"({using_cols[4]} * {scale})"; using_cols[5] = f"({using_cols[5]} * {scale})"
+
+        if style_info.get("color_from_value", False) and style_info.get("color_expression", "") and not is_model and not is_histogram:
+            using_cols.append(f'({style_info["color_expression"]})')
+
+        using_str = "using " + ":".join(using_cols)
+        style_details = ""
+
+        if is_vector and not is_model:
+            style_details = "with vectors"
+            vec_opts = style_info.get("vector_options", {})
+            if vec_opts.get("nohead"): style_details += " nohead"
+            else:
+                if vec_opts.get("head_style", "Default") != "Default": style_details += f' head {vec_opts["head_style"].lower()}'
+                if vec_opts.get("head_size", "").strip(): style_details += f' size {vec_opts["head_size"]}'
+            dt_val = DASHTYPE_MAP.get(style_info['linestyle'], 1)
+            style_details += f" dashtype {dt_val} linewidth {style_info['linewidth']}"
+        else:
+            style = style_info["style"]
+            style_details = "with pm3d" if style == 'pm3d' else f"with {style}"
+            if "lines" in style or style in ["impulses", "steps"]:
+                dt_val = DASHTYPE_MAP.get(style_info['linestyle'], 1); style_details += f" dashtype {dt_val} linewidth {style_info['linewidth']}"
+            if "points" in style or style in ["dots"]: style_details += f" pointtype {style_info['pointtype']} pointsize {style_info['pointsize']}"
+            if style == "boxes": style_details += " fillstyle solid 0.5"
+
+        if style_info.get("color_from_value") and not is_model and not is_histogram:
+            style_details += " lc palette"
+        else:
+            style_details += f' linecolor rgb "{style_info["color"]}"'
+
+        source = data_sources[plot_index] if data_sources else None
+        if source is None:
+            file_str = f'"{plot_info["path"]}"'
+        else:
+            if source.using is not None: using_str = "using " + ":".join(source.using)
+            binary_str = f" binary {source.binary}" if source.binary else ""
+            file_str = f'"{source.path}"{binary_str}'
+        if is_histogram and (source is None or source.using is None):
+            # ビンの表が無ければ，gnuplotのbinsで数えさせる（正規化に使う個数と範囲はstatsで求める）
+            using_str, stats = histogram_using(plot_info, plot_index, file_str)
+            stats_commands += stats
+        path_str = f'{file_str} {using_str}'
+        # 一回のplotで重ねるモデルは，multiplotの2回目と同じく凡例に出さない
+        title_str = 'notitle' if is_model and overlay_ranges is not None else f'title "{plot_info["title"]}"'
+
+        part_str = ""
+        if mode == '2d':
+            axis_cmd = "x1y1" if plot_info.get("axis") == "y1" else "x1y2"
+            part_str = f'{path_str} axes {axis_cmd} {style_details} {title_str}'
+        else:
+            part_str = f'{path_str} {style_details} {title_str}'
+
+        if is_model:
+            model_parts.append(part_str)
+        else:
+            normal_parts.append(part_str)
+
+    if model_parts and layer is not None:
+        # 層ごとに描いた画像がぴったり重なるよう，余白と範囲をどちらの層でも同じ値に固定する
+        script += fixed_margin_commands(mode)
+        for axis, (vmin, vmax) in overlay_ranges.items():
+            script += f"set {axis}range [{vmin:.17g}:{vmax:.17g}]\n"
+        if layer == "model":
+            script += "unset colorbox\nunset border\nunset tics\nunset key\n"
+        parts = model_parts if layer == "model" else normal_parts
+        script += f"{plot_command} " + ", \\\n    ".join(parts) + "\n"
+    elif model_parts and overlay_ranges is not None:
+        # モデル以外のデータから求めた範囲で固定し，モデルは固定色で同じplotに重ねる
+        for axis, (vmin, vmax) in overlay_ranges.items():
+            script += f"set {axis}range [{vmin:.17g}:{vmax:.17g}]\n"
+        if not normal_parts: script += "unset colorbox\n"
+        script += f"{plot_command} " + ", \\\n    ".join(normal_parts + model_parts) + "\n"
+    elif model_parts:
+        script += "set multiplot\n"
+        script += fixed_margin_commands(mode)
+
+        if normal_parts:
+            script += f"{plot_command} " + ", \\\n    ".join(normal_parts) + "\n"
+
+            # --- 範囲の完全固定処理 ---
+            script += "# Fix ranges and disable autoscale for the second plot\n"
+            script += "set xrange [GPVAL_X_MIN:GPVAL_X_MAX]\n"
+            script += "set yrange [GPVAL_Y_MIN:GPVAL_Y_MAX]\n"
+            if mode == '3d':
+                script += "set zrange [GPVAL_Z_MIN:GPVAL_Z_MAX]\n"
+            if mode == '2d' and any(p.get('axis') == 'y2' for p in plots):
+                 script += "set y2range [GPVAL_Y2_MIN:GPVAL_Y2_MAX]\n"
+
+            script += "unset autoscale\n" 
+            # -------------------------
+
+        script += "unset colorbox\n"
+        script += "unset border\nunset key\n"
+
+        script += f"{plot_command} " + ", \\\n    ".join(model_parts) + "\n"
+
+        script += "unset multiplot\n"
+        script += "set autoscale\n" 
+    else:
+        if normal_parts:
+            script += f"{plot_command} " + ", \\\n    ".join(normal_parts) + "\n"
+
+    # plotコマンドだけのセクションは，前回のフレームと同じならgnuplot側でreplotするだけで済む
+    sections.append(("overlay" if model_parts else "plot", stats_commands + script))
+    return GnuplotScript(sections)
+
+
 class DropLabel(QLabel):
     """ファイルがドロップされたことを通知するカスタムラベルウィジェット"""
     fileDropped = Signal(str)
@@ -62,8 +2290,19 @@ class DropLabel(QLabel):
                 self.fileDropped.emit(file_path)
                 event.acceptProposedAction()
 
+
+@contextmanager
+def blocked_signals(widgets):
+    """withの間だけwidgetsのシグナルを止め，抜けるときに元の状態へ戻す"""
+    previous = [(widget, widget.blockSignals(True)) for widget in widgets]
+    try:
+        yield
+    finally:
+        for widget, was_blocked in previous: widget.blockSignals(was_blocked)
+
+
 class PlotEditorWidget(QWidget):
-    """各プロットの設定を管理するためのタブ内ウィジェット"""
+    """各プロットの設定を管理するための編集画面（Current Plotsの一覧で選んだプロットのもの）"""
     plotChanged = Signal()
     titleChanged = Signal(str)
 
@@ -100,6 +2339,24 @@ class PlotEditorWidget(QWidget):
         self.is_model_check.setToolTip("チェックを入れると、このプロットを「物体モデル」として扱います。\nカラーバーの範囲計算から除外され、単色で表示されます。")
         details_layout.addWidget(self.is_model_check, 3, 0, 1, 2)
 
+        # ライブ表示（追記されるファイルを監視して描き直す）の設定
+        self.tail_check = QCheckBox("Watch File (Live Tail)")
+        self.tail_check.setToolTip("チェックを入れると、ファイルへの追記を監視して自動で描き直します。\n追記された部分だけを読み込みます。")
+        self.tail_window_spinbox = QSpinBox()
+        self.tail_window_spinbox.setRange(0, 100000000); self.tail_window_spinbox.setSingleStep(1000)
+        self.tail_window_spinbox.setPrefix("Last "); self.tail_window_spinbox.setSuffix(" rows")
+        self.tail_window_spinbox.setSpecialValueText("All rows")
+        self.tail_window_spinbox.setToolTip("表示する最新の行数（0ですべての行）")
+        details_layout.addWidget(self.tail_check, 4, 0)
+        details_layout.addWidget(self.tail_window_spinbox, 4, 1)
+
+        # プレビューで間引きなどの前処理をしている場合の表示
+        self.preview_note_label = QLabel()
+        self.preview_note_label.setStyleSheet("color: #005a9e;")
+        self.preview_note_label.setWordWrap(True)
+        self.preview_note_label.setVisible(False)
+        details_layout.addWidget(self.preview_note_label, 5, 0, 1, 2)
+
         self.normal_style_group = QGroupBox("Plot Style")
         self.normal_style_group.setCheckable(False)
         grid_layout = QGridLayout(self.normal_style_group)
@@ -114,6 +2371,40 @@ class PlotEditorWidget(QWidget):
         self.pointsize_spinbox = QDoubleSpinBox()
         self.pointsize_spinbox.setRange(0.1, 20.0); self.pointsize_spinbox.setValue(1.0); self.pointsize_spinbox.setSingleStep(0.1)
         grid_layout.addWidget(self.pointsize_spinbox, 2, 1)
+        # 3Dのみ: 格子（pm3dで描ける形）にしてからgnuplotに渡す
+        self.gridding_check = QCheckBox("Grid Data")
+        self.gridding_check.setToolTip("チェックを入れると、x, yがそろった格子はそのまま、散らばった点はセルごとのzの平均をとって格子にし、\nbinary matrixとしてgnuplotに渡します。pm3dで曲面を描くときに使います。")
+        self.gridding_resolution_spinbox = QSpinBox()
+        self.gridding_resolution_spinbox.setRange(2, 5000); self.gridding_resolution_spinbox.setValue(GRID_DEFAULT_RESOLUTION)
+        self.gridding_resolution_spinbox.setSuffix(" cells")
+        self.gridding_resolution_spinbox.setToolTip("散らばった点を分けるセルの数（x, yそれぞれ）")
+        grid_layout.addWidget(self.gridding_check, 3, 0)
+        grid_layout.addWidget(self.gridding_resolution_spinbox, 3, 1)
+
+        # ヒストグラムのビンの設定（ビンを変えたときだけ数え直し，スタイルの変更では数え直さない）
+        self.histogram_group = QGroupBox("Histogram Options")
+        hist_layout = QGridLayout(self.histogram_group)
+        hist_layout.addWidget(QLabel("Bins:"), 0, 0)
+        self.histogram_bins_spinbox = QSpinBox()
+        self.histogram_bins_spinbox.setRange(1, HISTOGRAM_MAX_BINS); self.histogram_bins_spinbox.setValue(HISTOGRAM_DEFAULTS["bins"])
+        hist_layout.addWidget(self.histogram_bins_spinbox, 0, 1)
+        hist_layout.addWidget(QLabel("Bin Width:"), 1, 0)
+        self.histogram_width_spinbox = QDoubleSpinBox()
+        self.histogram_width_spinbox.setRange(0.0, 1e12); self.histogram_width_spinbox.setDecimals(6)
+        self.histogram_width_spinbox.setSpecialValueText("Auto (from Bins)")
+        self.histogram_width_spinbox.setToolTip("0より大きい値を入れると、Binsの代わりにこの幅でビンを作ります")
+        hist_layout.addWidget(self.histogram_width_spinbox, 1, 1)
+        hist_layout.addWidget(QLabel("Range:"), 2, 0)
+        range_layout = QHBoxLayout()
+        self.histogram_min_input = QLineEdit(); self.histogram_min_input.setPlaceholderText("min (auto)")
+        self.histogram_max_input = QLineEdit(); self.histogram_max_input.setPlaceholderText("max (auto)")
+        range_layout.addWidget(self.histogram_min_input); range_layout.addWidget(QLabel("to")); range_layout.addWidget(self.histogram_max_input)
+        hist_layout.addLayout(range_layout, 2, 1)
+        hist_layout.addWidget(QLabel("Normalize:"), 3, 0)
+        self.histogram_normalize_combo = QComboBox()
+        self.histogram_normalize_combo.addItems(HISTOGRAM_NORMALIZATIONS)
+        self.histogram_normalize_combo.setToolTip("count: 個数、probability: 全体に対する割合、density: 確率密度（割合÷ビンの幅）")
+        hist_layout.addWidget(self.histogram_normalize_combo, 3, 1)
         
         self.line_style_group = QGroupBox("Line/Vector/Color Properties")
         line_style_layout = QGridLayout(self.line_style_group)
@@ -155,52 +2446,72 @@ class PlotEditorWidget(QWidget):
         
         layout.addWidget(details_group)
         layout.addWidget(self.normal_style_group)
+        layout.addWidget(self.histogram_group)
         layout.addWidget(self.vector_style_group)
         layout.addWidget(self.line_style_group)
         layout.addStretch(1)
 
     def load_info_to_ui(self):
         is_vector = self.plot_info.get("is_vector", False)
+        is_histogram = self.plot_info.get("is_histogram", False)
         plot_style = self.plot_info.get("style", {})
         vec_opts = plot_style.get("vector_options", {})
         
-        for widget in self.findChildren(QWidget): widget.blockSignals(True)
+        with blocked_signals(self.findChildren(QWidget)):
+            self.title_input.setText(self.plot_info.get("title", ""))
+            self.using_input.setText(self.plot_info.get("using", ""))
+            self.file_label.setText(os.path.basename(self.plot_info.get("path", "")))
 
-        self.title_input.setText(self.plot_info.get("title", ""))
-        self.using_input.setText(self.plot_info.get("using", ""))
-        self.file_label.setText(os.path.basename(self.plot_info.get("path", "")))
-        
-        self.is_model_check.setChecked(self.plot_info.get("is_model_mode", False))
-
-        self.style_combo.clear()
-        is_3d = self.plot_info.get("is_3d_mode", False)
-        base_styles = ["lines", "points", "linespoints", "dots", "impulses"]
-        if is_3d: self.style_combo.addItems(base_styles + ["pm3d"])
-        else: self.style_combo.addItems(base_styles + ["steps"])
-
-        self.normal_style_group.setVisible(not is_vector)
-        self.vector_style_group.setVisible(is_vector)
-
-        self.style_combo.setCurrentText(plot_style.get("style", "lines"))
-        self.pointtype_combo.setCurrentIndex(plot_style.get("pointtype", 1) - 1)
-        self.pointsize_spinbox.setValue(plot_style.get("pointsize", 1.0))
-
-        self.color_from_value_check.setChecked(plot_style.get("color_from_value", False))
-        self.color_value_input.setText(plot_style.get("color_expression", ""))
-        self.color_combo.setCurrentText(plot_style.get("color", "black"))
-        self.linestyle_combo.setCurrentText(plot_style.get("linestyle", "Solid"))
-        self.linewidth_spinbox.setValue(plot_style.get("linewidth", 1.0))
-        
-        self.vector_nohead_check.setChecked(vec_opts.get("nohead", False))
-        self.vector_headstyle_combo.setCurrentText(vec_opts.get("head_style", "Default"))
-        self.vector_headsize_input.setText(vec_opts.get("head_size", "0.1,15,60"))
-        self.vector_length_scale_spinbox.setValue(vec_opts.get("length_scale", 1.0))
-        self.vector_normalize_check.setChecked(vec_opts.get("normalize", False))
+            self.is_model_check.setChecked(self.plot_info.get("is_model_mode", False))
+            self.is_model_check.setVisible(not is_histogram)
+            tail = self.plot_info.get("tail", {})
+            self.tail_check.setChecked(tail.get("enabled", False))
+            self.tail_window_spinbox.setValue(tail.get("window_rows", 0))
+            self.tail_window_spinbox.setEnabled(self.tail_check.isChecked())
 
-        self.toggle_color_controls()
-        self.toggle_model_mode_ui()
+            self.style_combo.clear()
+            is_3d = self.plot_info.get("is_3d_mode", False)
+            base_styles = ["lines", "points", "linespoints", "dots", "impulses"]
+            if is_3d: self.style_combo.addItems(base_styles + ["pm3d"])
+            elif is_histogram: self.style_combo.addItems(["boxes", "histeps", "impulses", "lines", "linespoints", "points"])
+            else: self.style_combo.addItems(base_styles + ["steps"])
+
+            self.normal_style_group.setVisible(not is_vector)
+            self.vector_style_group.setVisible(is_vector)
+            self.histogram_group.setVisible(is_histogram)
+
+            self.style_combo.setCurrentText(plot_style.get("style", "lines"))
+            self.pointtype_combo.setCurrentIndex(plot_style.get("pointtype", 1) - 1)
+            self.pointsize_spinbox.setValue(plot_style.get("pointsize", 1.0))
+
+            gridding = self.plot_info.get("gridding", {})
+            self.gridding_check.setVisible(is_3d); self.gridding_resolution_spinbox.setVisible(is_3d)
+            self.gridding_check.setChecked(gridding.get("enabled", False))
+            self.gridding_resolution_spinbox.setValue(gridding.get("resolution", GRID_DEFAULT_RESOLUTION))
+            self.gridding_resolution_spinbox.setEnabled(self.gridding_check.isChecked())
+
+            histogram = {**HISTOGRAM_DEFAULTS, **self.plot_info.get("histogram", {})}
+            self.histogram_bins_spinbox.setValue(histogram["bins"])
+            self.histogram_width_spinbox.setValue(histogram["bin_width"])
+            self.histogram_min_input.setText(histogram["range_min"])
+            self.histogram_max_input.setText(histogram["range_max"])
+            self.histogram_normalize_combo.setCurrentText(histogram["normalize"])
+            self.histogram_bins_spinbox.setEnabled(histogram["bin_width"] <= 0)
+
+            self.color_from_value_check.setChecked(plot_style.get("color_from_value", False))
+            self.color_value_input.setText(plot_style.get("color_expression", ""))
+            self.color_combo.setCurrentText(plot_style.get("color", "black"))
+            self.linestyle_combo.setCurrentText(plot_style.get("linestyle", "Solid"))
+            self.linewidth_spinbox.setValue(plot_style.get("linewidth", 1.0))
 
-        for widget in self.findChildren(QWidget): widget.blockSignals(False)
+            self.vector_nohead_check.setChecked(vec_opts.get("nohead", False))
+            self.vector_headstyle_combo.setCurrentText(vec_opts.get("head_style", "Default"))
+            self.vector_headsize_input.setText(vec_opts.get("head_size", "0.1,15,60"))
+            self.vector_length_scale_spinbox.setValue(vec_opts.get("length_scale", 1.0))
+            self.vector_normalize_check.setChecked(vec_opts.get("normalize", False))
+
+            self.toggle_color_controls()
+            self.toggle_model_mode_ui()
 
     def connect_signals(self):
         self.title_input.textChanged.connect(self.update_plot_info)
@@ -222,6 +2533,18 @@ class PlotEditorWidget(QWidget):
         self.vector_headsize_input.textChanged.connect(self.update_plot_info)
         self.vector_length_scale_spinbox.valueChanged.connect(self.update_plot_info)
         self.vector_normalize_check.stateChanged.connect(self.update_plot_info)
+        self.tail_check.stateChanged.connect(lambda: self.tail_window_spinbox.setEnabled(self.tail_check.isChecked()))
+        self.tail_check.stateChanged.connect(self.update_plot_info)
+        self.tail_window_spinbox.valueChanged.connect(self.update_plot_info)
+        self.gridding_check.stateChanged.connect(lambda: self.gridding_resolution_spinbox.setEnabled(self.gridding_check.isChecked()))
+        self.gridding_check.stateChanged.connect(self.update_plot_info)
+        self.gridding_resolution_spinbox.valueChanged.connect(self.update_plot_info)
+        self.histogram_width_spinbox.valueChanged.connect(lambda v: self.histogram_bins_spinbox.setEnabled(v <= 0))
+        for widget in (self.histogram_bins_spinbox, self.histogram_width_spinbox):
+            widget.valueChanged.connect(self.update_plot_info)
+        self.histogram_min_input.editingFinished.connect(self.update_plot_info)
+        self.histogram_max_input.editingFinished.connect(self.update_plot_info)
+        self.histogram_normalize_combo.currentIndexChanged.connect(self.update_plot_info)
 
     def update_plot_info(self):
         style_dict = self.plot_info["style"]
@@ -230,6 +2553,7 @@ class PlotEditorWidget(QWidget):
         self.plot_info["title"] = self.title_input.text()
         self.plot_info["using"] = self.using_input.text()
         self.plot_info["is_model_mode"] = self.is_model_check.isChecked()
+        self.plot_info["tail"] = {"enabled": self.tail_check.isChecked(), "window_rows": self.tail_window_spinbox.value()}
 
         if is_vector:
             style_dict["vector_options"] = {
@@ -241,6 +2565,13 @@ class PlotEditorWidget(QWidget):
             style_dict["style"] = self.style_combo.currentText()
             style_dict["pointtype"] = self.pointtype_combo.currentIndex() + 1
             style_dict["pointsize"] = self.pointsize_spinbox.value()
+            self.plot_info["gridding"] = {"enabled": self.gridding_check.isChecked(), "resolution": self.gridding_resolution_spinbox.value()}
+            if self.plot_info.get("is_histogram", False):
+                self.plot_info["histogram"] = {
+                    "bins": self.histogram_bins_spinbox.value(), "bin_width": self.histogram_width_spinbox.value(),
+                    "range_min": self.histogram_min_input.text().strip(), "range_max": self.histogram_max_input.text().strip(),
+                    "normalize": self.histogram_normalize_combo.currentText()
+                }
         
         style_dict["color"] = self.color_combo.currentText()
         style_dict["linestyle"] = self.linestyle_combo.currentText()
@@ -250,9 +2581,14 @@ class PlotEditorWidget(QWidget):
         
         self.plotChanged.emit()
 
+    def set_preview_note(self, text):
+        self.preview_note_label.setText(text)
+        self.preview_note_label.setVisible(bool(text))
+
     def toggle_color_controls(self):
         use_palette = self.color_from_value_check.isChecked()
-        if self.is_model_check.isChecked():
+        # ヒストグラムはビンの表を描くため，データの値による色分けは使えない（モデルと同じく単色）
+        if self.is_model_check.isChecked() or self.plot_info.get("is_histogram", False):
             self.color_combo.setEnabled(True)
             self.color_value_input.setEnabled(False)
             self.color_from_value_check.setEnabled(False)
@@ -273,19 +2609,81 @@ class PlotEditorWidget(QWidget):
 
 
 class GnuplotGUIY2Axis(QMainWindow):
+    dataPrepared = Signal()
+    tailUpdated = Signal()
+    statsReady = Signal()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.setWindowTitle("GUInuplot (Integrated)")
         self.setGeometry(100, 100, 1600, 950)
         self.plots = []
         self.current_selected_file_path = None
+        self.current_file_info = None
         self.current_mode = "2d"
         self.column_spinboxes = []
-        self.dashtype_map = {"Solid": 1, "Dashed": 2, "Dotted": 3, "Dash-Dot": 4}
+        self.dashtype_map = DASHTYPE_MAP
         self.update_timer = QTimer(self)
         self.update_timer.setSingleShot(True)
         self.update_timer.timeout.connect(self.redraw_plot)
+        self.redraw_debounce = AdaptiveDebounce()
+        self.gnuplot = GnuplotWorker()
+        self.render_cache_key = None  # 今の表示に必要で，描画を依頼している画像のキー
+        self.pending_layers = []
+        self.section_cache = {}
+        self.settings_snapshot = None
+        # Z軸と3Dの表示設定はウィジェットを作るまでここに値を持つ（作った後はNone）
+        self.pending_3d_settings = {key: dict(SETTINGS_DEFAULTS[key]) for key in ('zaxis', 'view3d')}
+        self.last_preview_image = None  # 表示中のプレビュー（QImage，SVGならQSvgRenderer）
+        self.preview_zoom = 1.0
+        self.preview_center = (0.5, 0.5)
+        self.view_dragging = False  # 3Dの視点のスライダーをドラッグ中か（その間は簡易プレビューで描く）
+        self.preview_cache = PreviewImageCache()
+        self.data_prep = DataPrepCache(on_ready=self.dataPrepared.emit)
+        self.dataPrepared.connect(self.request_redraw)
+        # 軸の範囲の候補に使う列の統計．描き直しは不要なため，プレビュー用の前処理とは別に一つずつ求める
+        self.column_stats = DataPrepCache(on_ready=self.statsReady.emit, max_workers=1)
+        # 統計が続けてできたときは，まとめて一度だけ表示を更新する
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setSingleShot(True)
+        self.stats_timer.setInterval(100)
+        self.stats_timer.timeout.connect(self.invalidate_axis_stats)
+        self.statsReady.connect(self.stats_timer.start)
+        # 軸ごとにまとめた統計 (統計, 集計中か)．プロットが変わるか新しい統計ができたらNoneに戻す
+        self.axis_stats = None
+        self.range_suggestions = {}  # 軸名 -> (範囲のチェックボックス, 最小, 最大, 統計の表示)
+        self.pending_range_fits = {}  # 統計ができたら範囲に入れる軸 -> robustか
+        # ライブ表示で監視しているファイル．追記の読み込みはワーカースレッドで行い，終わったらすぐに描き直す
+        self.tail_buffers = {}
+        self.tail_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="guinuplot-tail")
+        self.tail_future = None
+        self.tail_timer = QTimer(self)
+        self.tail_timer.timeout.connect(self.poll_tail_files)
+        self.tailUpdated.connect(self.redraw_plot)
+        # Export Projectの画像は，初めて使うときに作るgnuplotのプールで並列に描画する
+        self.export_pool = None
+        self.export_state = None
+        self.export_timer = QTimer(self)
+        self.export_timer.setInterval(50)
+        self.export_timer.timeout.connect(self.poll_export)
+        # 描画ごとの段階別の時間はステータスバーに表示し，トレースを有効にしたときだけファイルへ書き出す
+        self.redraw_trace = None
+        self.trace_log = TraceLog()
+        self.render_thread = PreviewRenderThread(self.gnuplot, self)
+        self.render_thread.rendered.connect(self.on_preview_rendered)
+        self.render_thread.failed.connect(self.on_preview_failed)
+        self.render_thread.start()
         self.init_ui()
+        # 最初の描画を待たせないよう，起動時にgnuplotを立ち上げてフォントを読み込ませておく
+        font_setting = f'font "{self.font_combo.currentText()},{self.font_slider.value()}"'
+        threading.Thread(target=self.gnuplot.warm_up, args=(font_setting,), daemon=True).start()
+        # NumPyは画面を出した後に裏で読み込む．その間に追加したプロットは読み込み後に間引いて描き直す
+        threading.Thread(target=self.preload_numpy, daemon=True).start()
+        # 前のセッションまでに溜まった前処理のキャッシュを上限まで減らす
+        threading.Thread(target=sweep_cache_dir, daemon=True).start()
+
+    def preload_numpy(self):
+        if np is None and load_numpy() is not None and self.plots: self.dataPrepared.emit()
 
     def init_ui(self):
         self.create_menu_bar()
@@ -299,7 +2697,7 @@ class GnuplotGUIY2Axis(QMainWindow):
         self.control_layout = QVBoxLayout(control_panel)
         self.control_layout.addWidget(self.create_mode_selection_panel())
         self.control_layout.addWidget(self.create_plot_management_panel())
-        self.control_layout.addWidget(self.create_plot_tabs_panel())
+        self.control_layout.addWidget(self.create_plot_list_panel())
         self.control_layout.addWidget(self.create_general_settings_panel())
         self.control_layout.addWidget(self.create_axis_settings_panel())
         self.view_settings_panel = self.create_view_settings_panel()
@@ -315,6 +2713,9 @@ class GnuplotGUIY2Axis(QMainWindow):
         self.plot_label = QLabel("Please add a plot to begin.")
         self.plot_label.setAlignment(Qt.AlignCenter)
         self.plot_label.setStyleSheet("background-color: #ffffff;")
+        # 画像の大きさでラベルが広がらないよう，サイズはレイアウトに任せる
+        self.plot_label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        self.plot_label.installEventFilter(self)
         main_layout.addWidget(scroll_area)
         main_layout.addWidget(self.plot_label, 1)
         self.connect_signals()
@@ -358,6 +2759,16 @@ class GnuplotGUIY2Axis(QMainWindow):
         load_settings_action.triggered.connect(self.load_settings)
         file_menu.addAction(load_settings_action)
 
+        view_menu = menu_bar.addMenu("&View")
+        self.trace_action = QAction("Trace Render Timings...", self)
+        self.trace_action.setToolTip("Append the per-stage timings of every render to a JSON Lines file.")
+        self.trace_action.setCheckable(True)
+        self.trace_action.toggled.connect(self.toggle_trace)
+        view_menu.addAction(self.trace_action)
+        # 環境変数 GUINUPLOT_TRACE にファイル名を指定すると，起動時からトレースを書き出す
+        if os.environ.get("GUINUPLOT_TRACE"):
+            self.start_trace(os.environ["GUINUPLOT_TRACE"])
+
     def create_mode_selection_panel(self, *args, **kwargs):
         panel = QGroupBox("Plot Mode")
         layout = QHBoxLayout(panel)
@@ -380,36 +2791,61 @@ class GnuplotGUIY2Axis(QMainWindow):
         browse_button = QPushButton("Browse...")
         browse_button.clicked.connect(self.select_plot_file)
         add_layout.addWidget(browse_button, 1, 2)
+
+        # 選んだファイルの先頭から推定した列数などの表示
+        self.file_info_label = QLabel()
+        self.file_info_label.setStyleSheet("color: #555555;")
+        self.file_info_label.setWordWrap(True)
+        self.file_info_label.setVisible(False)
+        add_layout.addWidget(self.file_info_label, 2, 1, 1, 2)
         
         self.add_as_vector_check = QCheckBox("Add as Vector Plot")
-        add_layout.addWidget(self.add_as_vector_check, 2, 0, 1, 3)
+        add_layout.addWidget(self.add_as_vector_check, 3, 0, 1, 3)
         
         self.add_as_model_check = QCheckBox("Add as Static Object (Model)")
         self.add_as_model_check.setToolTip("物体モデル（ワイヤーフレーム等）として追加します。\nカラーバーの値に影響を与えず、単色（グレー）で表示されます。")
-        add_layout.addWidget(self.add_as_model_check, 3, 0, 1, 3)
+        add_layout.addWidget(self.add_as_model_check, 4, 0, 1, 3)
+
+        self.add_as_histogram_check = QCheckBox("Add as Histogram")
+        self.add_as_histogram_check.setToolTip("選んだ列の値の分布（ヒストグラム）として追加します（2Dモードのみ）。\nビンごとの個数はNumPyで数え、その表だけをgnuplotに渡します。")
+        add_layout.addWidget(self.add_as_histogram_check, 5, 0, 1, 3)
 
-        add_layout.addWidget(QLabel("Columns (using):"), 4, 0)
+        add_layout.addWidget(QLabel("Columns (using):"), 6, 0)
         self.column_input_layout = QHBoxLayout()
         self.column_input_layout.setSpacing(5)
-        add_layout.addLayout(self.column_input_layout, 4, 1, 1, 2)
+        add_layout.addLayout(self.column_input_layout, 6, 1, 1, 2)
         self.target_axis_label = QLabel("Target Axis:")
-        add_layout.addWidget(self.target_axis_label, 5, 0)
+        add_layout.addWidget(self.target_axis_label, 7, 0)
         self.new_plot_axis_combo = QComboBox()
         self.new_plot_axis_combo.addItems(["Y1-Axis", "Y2-Axis"])
-        add_layout.addWidget(self.new_plot_axis_combo, 5, 1, 1, 2)
-        add_plot_button = QPushButton("Add Plot to Tabs")
+        add_layout.addWidget(self.new_plot_axis_combo, 7, 1, 1, 2)
+        add_plot_button = QPushButton("Add Plot")
         add_plot_button.clicked.connect(self.add_plot)
-        add_layout.addWidget(add_plot_button, 6, 0, 1, 3)
+        add_layout.addWidget(add_plot_button, 8, 0, 1, 3)
         return panel
 
-    def create_plot_tabs_panel(self, *args, **kwargs):
-        panel = QGroupBox("2. Current Plots (Edit in Tabs)")
+    def create_plot_list_panel(self, *args, **kwargs):
+        # 数百のプロットでも重くならないよう，タブではなく絞り込める一覧にし，選んだプロットの編集画面だけを作る
+        panel = QGroupBox("2. Current Plots")
         layout = QVBoxLayout(panel)
-        self.plot_tabs = QTabWidget()
-        self.plot_tabs.setTabsClosable(True)
-        self.plot_tabs.setMovable(True)
-        self.plot_tabs.setMinimumHeight(350)
-        layout.addWidget(self.plot_tabs)
+        self.plot_filter_input = QLineEdit()
+        self.plot_filter_input.setPlaceholderText("Filter plots...")
+        self.plot_filter_input.setClearButtonEnabled(True)
+        layout.addWidget(self.plot_filter_input)
+        self.plot_list = QListWidget()
+        self.plot_list.setUniformItemSizes(True)
+        self.plot_list.setDragDropMode(QAbstractItemView.InternalMove)
+        self.plot_list.setMaximumHeight(130)
+        layout.addWidget(self.plot_list)
+        self.remove_plot_button = QPushButton("Remove Plot")
+        self.remove_plot_button.setEnabled(False)
+        layout.addWidget(self.remove_plot_button)
+        self.plot_editor_area = QWidget()
+        self.plot_editor_area.setMinimumHeight(350)
+        QVBoxLayout(self.plot_editor_area).setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.plot_editor_area)
+        self.plot_editor = None
+        self.preview_notes = {}  # id(plot_info) -> 編集画面に出すプレビューの注記
         return panel
 
     def create_general_settings_panel(self, *args, **kwargs):
@@ -431,9 +2867,13 @@ class GnuplotGUIY2Axis(QMainWindow):
         self.axis_tabs.addTab(self.create_y1axis_tab(), "Y1-Axis")
         self.y2_axis_tab = self.create_y2axis_tab()
         self.axis_tabs.addTab(self.y2_axis_tab, "Y2-Axis")
-        self.z_axis_tab = self.create_zaxis_tab()
+        # Z軸のタブと3Dの表示設定は，初めて3Dモードにしたときに ensure_3d_panels() で中身を作る
+        self.z_axis_tab = QWidget()
+        QVBoxLayout(self.z_axis_tab).setContentsMargins(0, 0, 0, 0)
         self.axis_tabs.addTab(self.z_axis_tab, "Z-Axis")
         panel_layout.addWidget(self.axis_tabs)
+        # 統計は表示しているタブの分だけ求める．開くたびにファイルが変わっていないかも確かめる
+        self.axis_tabs.currentChanged.connect(self.invalidate_axis_stats)
         return panel
 
     def create_xaxis_tab(self, *args, **kwargs):
@@ -461,6 +2901,7 @@ class GnuplotGUIY2Axis(QMainWindow):
         layout.addWidget(self.logscale_x_check, 3, 0, 1, 3)
         self.grid_check = QCheckBox("Show Grid")
         layout.addWidget(self.grid_check, 4, 0, 1, 3)
+        self.add_range_suggestion_row(layout, 5, "x", self.xrange_check, self.xrange_min, self.xrange_max)
         return tab
 
     def create_y1axis_tab(self, *args, **kwargs):
@@ -486,6 +2927,7 @@ class GnuplotGUIY2Axis(QMainWindow):
         layout.addLayout(ytics_layout, 2, 1, 1, 2)
         self.logscale_y_check = QCheckBox("Log Scale (Y-Axis)")
         layout.addWidget(self.logscale_y_check, 3, 0, 1, 3)
+        self.add_range_suggestion_row(layout, 4, "y", self.yrange_check, self.yrange_min, self.yrange_max)
         return tab
 
     def create_y2axis_tab(self, *args, **kwargs):
@@ -511,6 +2953,7 @@ class GnuplotGUIY2Axis(QMainWindow):
         layout.addLayout(y2tics_layout, 2, 1, 1, 2)
         self.logscale_y2_check = QCheckBox("Log Scale (Y2-Axis)")
         layout.addWidget(self.logscale_y2_check, 3, 0, 1, 3)
+        self.add_range_suggestion_row(layout, 4, "y2", self.y2range_check, self.y2range_min, self.y2range_max)
         return tab
 
     def create_zaxis_tab(self, *args, **kwargs):
@@ -536,10 +2979,35 @@ class GnuplotGUIY2Axis(QMainWindow):
         layout.addLayout(ztics_layout, 2, 1, 1, 2)
         self.logscale_z_check = QCheckBox("Log Scale (Z-Axis)")
         layout.addWidget(self.logscale_z_check, 3, 0, 1, 3)
+        self.add_range_suggestion_row(layout, 4, "z", self.zrange_check, self.zrange_min, self.zrange_max)
         return tab
 
+    def add_range_suggestion_row(self, layout, row, axis, check, min_edit, max_edit):
+        """軸のタブに，データの統計の表示と，範囲をデータに合わせる「Fit」「1–99%」のボタンを置く"""
+        label = QLabel()
+        label.setStyleSheet("color: #555555;")
+        label.setWordWrap(True)
+        fit_button = QPushButton("Fit")
+        fit_button.setToolTip("範囲をデータの最小・最大にします")
+        fit_button.clicked.connect(lambda: self.fit_axis_range(axis, robust=False))
+        robust_button = QPushButton("1–99%")
+        robust_button.setToolTip("外れ値を除くため，範囲をデータの1%点から99%点（近似値）にします")
+        robust_button.clicked.connect(lambda: self.fit_axis_range(axis, robust=True))
+        buttons = QHBoxLayout()
+        buttons.addWidget(fit_button)
+        buttons.addWidget(robust_button)
+        layout.addLayout(buttons, row, 0)
+        layout.addWidget(label, row, 1, 1, 2)
+        self.range_suggestions[axis] = (check, min_edit, max_edit, label)
+        self.refresh_axis_stats()
+
     def create_view_settings_panel(self, *args, **kwargs):
         panel = QGroupBox("5. View & Map Settings (3D)")
+        QVBoxLayout(panel).setContentsMargins(0, 0, 0, 0)
+        return panel
+
+    def create_view_settings_widget(self, *args, **kwargs):
+        panel = QWidget()
         layout = QGridLayout(panel)
         layout.addWidget(QLabel("Rotate X:"), 0, 0)
         self.view_rot_x_slider = QSlider(Qt.Horizontal)
@@ -574,6 +3042,32 @@ class GnuplotGUIY2Axis(QMainWindow):
 
         return panel
 
+    def ensure_3d_panels(self):
+        """Z軸のタブと3Dの表示設定の中身を，まだ作っていなければ作って保留中の設定値を入れる"""
+        if self.pending_3d_settings is None: return
+        self.z_axis_tab.layout().addWidget(self.create_zaxis_tab())
+        self.view_settings_panel.layout().addWidget(self.create_view_settings_widget())
+        pending, self.pending_3d_settings = self.pending_3d_settings, None
+        self.apply_3d_settings(pending)
+        self.connect_3d_signals()
+
+    def apply_3d_settings(self, settings):
+        """設定のうちZ軸と3Dの表示の部分をウィジェットに入れる．まだ作っていなければ作るときまで取っておく"""
+        if self.pending_3d_settings is not None:
+            self.pending_3d_settings = {key: {**SETTINGS_DEFAULTS[key], **settings.get(key, {})} for key in ('zaxis', 'view3d')}
+            return
+        s = settings.get('zaxis', {}); self.zlabel_input.setText(s.get('label', 'Z-Axis')); self.zrange_check.setChecked(s.get('range_check', False)); self.zrange_min.setText(s.get('range_min', '')); self.zrange_max.setText(s.get('range_max', '')); self.ztics_check.setChecked(s.get('tics_check', False)); self.ztics_xoffset.setText(s.get('tics_xoffset', '0')); self.ztics_yoffset.setText(s.get('tics_yoffset', '0')); self.logscale_z_check.setChecked(s.get('log_check', False))
+        s = settings.get('view3d', {}); self.view_rot_x_slider.setValue(s.get('rot_x', 60)); self.view_rot_z_slider.setValue(s.get('rot_z', 30)); self.view_rot_x_label.setText(str(self.view_rot_x_slider.value())); self.view_rot_z_label.setText(str(self.view_rot_z_slider.value())); self.pm3d_check.setChecked(s.get('pm3d_check', True)); self.xyplane_check.setChecked(s.get('xyplane_check', False)); self.xyplane_input.setText(s.get('xyplane_value', '0')); self.xyplane_input.setEnabled(self.xyplane_check.isChecked()) # Added xyplane
+
+    def collect_3d_settings(self):
+        """設定のうちZ軸と3Dの表示の部分（まだウィジェットを作っていなければ保留中の値）"""
+        if self.pending_3d_settings is not None:
+            return {key: dict(value) for key, value in self.pending_3d_settings.items()}
+        return {
+            'zaxis': {'label': self.zlabel_input.text(), 'range_check': self.zrange_check.isChecked(), 'range_min': self.zrange_min.text(), 'range_max': self.zrange_max.text(), 'tics_check': self.ztics_check.isChecked(), 'tics_xoffset': self.ztics_xoffset.text(), 'tics_yoffset': self.ztics_yoffset.text(), 'log_check': self.logscale_z_check.isChecked()},
+            'view3d': {'rot_x': self.view_rot_x_slider.value(), 'rot_z': self.view_rot_z_slider.value(), 'pm3d_check': self.pm3d_check.isChecked(), 'xyplane_check': self.xyplane_check.isChecked(), 'xyplane_value': self.xyplane_input.text()}, # Added xyplane
+        }
+
     def create_output_settings_panel(self, *args, **kwargs):
         panel = QGroupBox("6. Output Settings")
         layout = QVBoxLayout(panel)
@@ -600,6 +3094,21 @@ class GnuplotGUIY2Axis(QMainWindow):
         font_layout.addWidget(self.font_slider)
         font_layout.addWidget(self.font_label)
         general_layout.addLayout(font_layout, 2, 1, 1, 2)
+        general_layout.addWidget(QLabel("Live Tail Rate:"), 3, 0)
+        self.tail_fps_spinbox = QSpinBox()
+        self.tail_fps_spinbox.setRange(1, 60); self.tail_fps_spinbox.setValue(5); self.tail_fps_spinbox.setSuffix(" fps")
+        self.tail_fps_spinbox.setToolTip("監視中のファイルへの追記を確認して描き直す頻度")
+        general_layout.addWidget(self.tail_fps_spinbox, 3, 1, 1, 2)
+        general_layout.addWidget(QLabel("Export Scales:"), 4, 0)
+        self.export_scales_input = QLineEdit()
+        self.export_scales_input.setPlaceholderText("e.g. 2, 3")
+        self.export_scales_input.setToolTip("Export Projectで追加で書き出す高解像度PNGの倍率（カンマ区切り）")
+        general_layout.addWidget(self.export_scales_input, 4, 1, 1, 2)
+        self.svg_preview_check = QCheckBox("Vector (SVG) Preview")
+        self.svg_preview_check.setToolTip("プレビューをSVGで描画します。リサイズや拡大（ホイール、ダブルクリックで元に戻す）でgnuplotを呼ばず、常に鮮明に表示します。\n"
+                                          f"描く要素が{SVG_PREVIEW_MAX_ELEMENTS:,}を超える場合は自動的にPNGで描画します。")
+        self.svg_preview_check.setEnabled(importlib.util.find_spec("PySide6.QtSvg") is not None)
+        general_layout.addWidget(self.svg_preview_check, 5, 0, 1, 3)
         key_group = QGroupBox("Legend (Key) Settings")
         key_layout = QGridLayout(key_group)
         self.key_check = QCheckBox("Show Legend (key)")
@@ -638,9 +3147,10 @@ class GnuplotGUIY2Axis(QMainWindow):
         cb_layout.addWidget(self.cbrange_min, 3, 1)
         self.cbrange_max = QLineEdit()
         cb_layout.addWidget(self.cbrange_max, 3, 2)
+        self.add_range_suggestion_row(cb_layout, 4, "cb", self.cbrange_check, self.cbrange_min, self.cbrange_max)
         self.cbsize_check = QCheckBox("Customize Position/Size")
-        cb_layout.addWidget(self.cbsize_check, 4, 0, 1, 3)
-        cb_layout.addWidget(QLabel("Origin (x,y):"), 5, 0)
+        cb_layout.addWidget(self.cbsize_check, 5, 0, 1, 3)
+        cb_layout.addWidget(QLabel("Origin (x,y):"), 6, 0)
         origin_layout = QHBoxLayout()
         self.cb_origin_x_spinbox = QDoubleSpinBox()
         self.cb_origin_x_spinbox.setRange(0, 1)
@@ -654,8 +3164,8 @@ class GnuplotGUIY2Axis(QMainWindow):
         self.cb_origin_y_spinbox.setSingleStep(0.01)
         self.cb_origin_y_spinbox.setDecimals(2)
         origin_layout.addWidget(self.cb_origin_y_spinbox)
-        cb_layout.addLayout(origin_layout, 5, 1, 1, 2)
-        cb_layout.addWidget(QLabel("Size (w,h):"), 6, 0)
+        cb_layout.addLayout(origin_layout, 6, 1, 1, 2)
+        cb_layout.addWidget(QLabel("Size (w,h):"), 7, 0)
         size_layout_cb = QHBoxLayout()
         self.cb_size_w_spinbox = QDoubleSpinBox()
         self.cb_size_w_spinbox.setRange(0.01, 0.5)
@@ -669,7 +3179,7 @@ class GnuplotGUIY2Axis(QMainWindow):
         self.cb_size_h_spinbox.setSingleStep(0.01)
         self.cb_size_h_spinbox.setDecimals(2)
         size_layout_cb.addWidget(self.cb_size_h_spinbox)
-        cb_layout.addLayout(size_layout_cb, 6, 1, 1, 2)
+        cb_layout.addLayout(size_layout_cb, 7, 1, 1, 2)
         layout.addWidget(general_group)
         layout.addWidget(key_group)
         layout.addWidget(cb_group)
@@ -684,27 +3194,27 @@ class GnuplotGUIY2Axis(QMainWindow):
         self.add_as_model_check.stateChanged.connect(lambda state: self.add_as_vector_check.setEnabled(not state))
         self.add_as_model_check.stateChanged.connect(lambda state: self.add_as_vector_check.setChecked(False) if state else None)
         self.add_as_model_check.stateChanged.connect(self.update_column_input_ui)
+        self.add_as_histogram_check.stateChanged.connect(self.on_histogram_check_changed)
         
         self.drop_zone.fileDropped.connect(self.handle_dropped_file)
         self.title_check.stateChanged.connect(lambda: self.title_input.setEnabled(self.title_check.isChecked()))
         self.title_check.stateChanged.connect(self.request_redraw)
         self.title_input.textChanged.connect(self.request_redraw)
-        text_widgets = [self.xlabel_input, self.ylabel_input, self.y2label_input, self.zlabel_input,
+        text_widgets = [self.xlabel_input, self.ylabel_input, self.y2label_input,
                         self.xrange_min, self.xrange_max, self.yrange_min, self.yrange_max,
-                        self.y2range_min, self.y2range_max, self.zrange_min, self.zrange_max,
+                        self.y2range_min, self.y2range_max,
                         self.xtics_xoffset, self.xtics_yoffset, self.ytics_xoffset, self.ytics_yoffset,
-                        self.y2tics_xoffset, self.y2tics_yoffset, self.ztics_xoffset, self.ztics_yoffset,
-                        self.width_input, self.height_input, self.cblabel_input, self.cbrange_min, self.cbrange_max,
-                        self.xyplane_input] # xyplane_input added
+                        self.y2tics_xoffset, self.y2tics_yoffset,
+                        self.width_input, self.height_input, self.cblabel_input, self.cbrange_min, self.cbrange_max]
         for widget in text_widgets:
             widget.textChanged.connect(self.request_redraw)
         combo_widgets = [self.key_pos_combo, self.font_combo]
         for widget in combo_widgets:
             widget.currentIndexChanged.connect(self.request_redraw)
-        check_widgets = [self.xrange_check, self.yrange_check, self.y2range_check, self.zrange_check,
-                         self.xtics_check, self.ytics_check, self.ztics_check, self.y2tics_offset_check,
-                         self.logscale_x_check, self.logscale_y_check, self.logscale_y2_check, self.logscale_z_check,
-                         self.grid_check, self.pm3d_check, self.cb_format_10_power_check]
+        check_widgets = [self.xrange_check, self.yrange_check, self.y2range_check,
+                         self.xtics_check, self.ytics_check, self.y2tics_offset_check,
+                         self.logscale_x_check, self.logscale_y_check, self.logscale_y2_check,
+                         self.grid_check, self.cb_format_10_power_check]
         for widget in check_widgets:
             widget.stateChanged.connect(self.request_redraw)
         self.key_check.stateChanged.connect(self.toggle_key_options)
@@ -719,17 +3229,42 @@ class GnuplotGUIY2Axis(QMainWindow):
         spin_widgets = [self.cb_origin_x_spinbox, self.cb_origin_y_spinbox, self.cb_size_w_spinbox, self.cb_size_h_spinbox]
         for widget in spin_widgets:
             widget.valueChanged.connect(self.request_redraw)
+        self.font_slider.valueChanged.connect(lambda v: self.font_label.setText(str(v)))
+        self.font_slider.valueChanged.connect(self.request_redraw)
+        self.svg_preview_check.stateChanged.connect(self.request_redraw)
+        self.tail_fps_spinbox.valueChanged.connect(lambda v: self.tail_timer.setInterval(round(1000 / v)))
+        self.plot_list.currentRowChanged.connect(self.show_plot_editor)
+        self.plot_list.model().rowsMoved.connect(self.handle_plot_moved)
+        self.remove_plot_button.clicked.connect(lambda: self.remove_plot(self.plot_list.currentRow()))
+        self.plot_filter_input.textChanged.connect(self.filter_plot_list)
+        self.connect_section_signals(self.section_widgets())
+
+    def connect_3d_signals(self):
+        """ensure_3d_panels() で作ったZ軸と3Dの表示設定のウィジェットのシグナルをつなぐ"""
+        for widget in [self.zlabel_input, self.zrange_min, self.zrange_max, self.ztics_xoffset, self.ztics_yoffset, self.xyplane_input]:
+            widget.textChanged.connect(self.request_redraw)
+        for widget in [self.zrange_check, self.ztics_check, self.logscale_z_check, self.pm3d_check]:
+            widget.stateChanged.connect(self.request_redraw)
         for slider, label in [(self.view_rot_x_slider, self.view_rot_x_label), (self.view_rot_z_slider, self.view_rot_z_label)]:
             slider.valueChanged.connect(lambda v, lbl=label: lbl.setText(str(v)))
             slider.valueChanged.connect(self.request_redraw)
-        self.font_slider.valueChanged.connect(lambda v: self.font_label.setText(str(v)))
-        self.font_slider.valueChanged.connect(self.request_redraw)
-        self.plot_tabs.tabCloseRequested.connect(self.remove_plot)
-        self.plot_tabs.tabBar().tabMoved.connect(self.handle_tab_moved)
+            slider.sliderPressed.connect(self.begin_view_drag)
+            slider.sliderReleased.connect(self.end_view_drag)
 
         # xyplane logic
         self.xyplane_check.stateChanged.connect(lambda: self.xyplane_input.setEnabled(self.xyplane_check.isChecked()))
         self.xyplane_check.stateChanged.connect(self.request_redraw)
+        self.connect_section_signals(self.section_widgets_3d())
+
+    def connect_section_signals(self, sections):
+        """値が変わったウィジェットに対応するセクションだけを，次のスクリプト作成時に作り直す"""
+        for section, widgets in sections.items():
+            for widget in widgets:
+                if isinstance(widget, QLineEdit): signal = widget.textChanged
+                elif isinstance(widget, QCheckBox): signal = widget.stateChanged
+                elif isinstance(widget, QComboBox): signal = widget.currentIndexChanged
+                else: signal = widget.valueChanged
+                signal.connect(lambda *_, section=section: self.mark_sections_dirty(section))
 
     def toggle_key_options(self, *args, **kwargs):
         is_enabled = self.key_check.isChecked()
@@ -762,14 +3297,28 @@ class GnuplotGUIY2Axis(QMainWindow):
         self.clear_all_plots()
         is_3d = self.plot_mode_combo.currentIndex() == 1
         self.current_mode = "3d" if is_3d else "2d"
+        self.mark_sections_dirty()
+        if is_3d: self.ensure_3d_panels()
         self.target_axis_label.setVisible(not is_3d)
         self.new_plot_axis_combo.setVisible(not is_3d)
         self.axis_tabs.setTabVisible(self.axis_tabs.indexOf(self.y2_axis_tab), not is_3d)
         self.axis_tabs.setTabVisible(self.axis_tabs.indexOf(self.z_axis_tab), is_3d)
         self.view_settings_panel.setVisible(is_3d)
+        if is_3d: self.add_as_histogram_check.setChecked(False)
+        self.add_as_histogram_check.setVisible(not is_3d)
         self.update_column_input_ui()
         self.request_redraw()
 
+    def on_histogram_check_changed(self, state):
+        """ヒストグラムはベクトル・モデルとは併用できないため，チェック中はそれらを外して選べなくする"""
+        is_histogram = bool(state)
+        if is_histogram:
+            self.add_as_vector_check.setChecked(False)
+            self.add_as_model_check.setChecked(False)
+        self.add_as_model_check.setEnabled(not is_histogram)
+        self.add_as_vector_check.setEnabled(not is_histogram and not self.add_as_model_check.isChecked())
+        self.update_column_input_ui()
+
     def update_column_input_ui(self, *args, **kwargs):
         while self.column_input_layout.count():
             child = self.column_input_layout.takeAt(0)
@@ -781,32 +3330,67 @@ class GnuplotGUIY2Axis(QMainWindow):
         is_model = self.add_as_model_check.isChecked()
         is_3d = (self.current_mode == '3d')
         
-        if is_model:
+        if self.add_as_histogram_check.isChecked() and not is_3d:
+            num_boxes, labels = 1, ["value"]
+        elif is_model:
             num_boxes = 3 if is_3d else 2
             labels = ["x", "y", "z"] if is_3d else ["x", "y"]
         else:
             num_boxes, labels = ((6, ["x", "y", "z", "dx", "dy", "dz"]) if is_vector else (3, ["x", "y", "z"])) if is_3d else ((4, ["x", "y", "dx", "dy"]) if is_vector else (2, ["x", "y"]))
         
+        info = self.current_file_info
         for i in range(num_boxes):
             spinbox = QSpinBox()
             spinbox.setMinimum(1)
-            spinbox.setValue(i + 1)
+            if info:
+                # ファイルの列数に合わせて範囲を制限し，ヘッダーがあれば列名を表示する
+                spinbox.setMaximum(info["columns"])
+                spinbox.setValue(min(i + 1, info["columns"]))
+                header = info["header"]
+                if header:
+                    spinbox.valueChanged.connect(lambda v, sb=spinbox, names=header: sb.setSuffix(f" ({names[v - 1]})"))
+                    spinbox.setSuffix(f" ({header[spinbox.value() - 1]})")
+            else:
+                spinbox.setValue(i + 1)
             spinbox.setToolTip(labels[i])
             self.column_spinboxes.append(spinbox)
             self.column_input_layout.addWidget(spinbox)
 
     def handle_dropped_file(self, file_path):
-        self.current_selected_file_path = file_path
-        self.new_plot_file_input.setText(os.path.basename(file_path))
+        self.set_selected_file(file_path)
 
     def select_plot_file(self, *args, **kwargs):
         file_name, _ = QFileDialog.getOpenFileName(self, "Select Data File", "", "Data Files (*.dat *.txt);;All Files (*)")
         if file_name:
-            self.current_selected_file_path = file_name
-            self.new_plot_file_input.setText(os.path.basename(file_name))
+            self.set_selected_file(file_name)
+
+    def set_selected_file(self, file_path):
+        """追加するファイルを設定し，先頭部分から推定した列数に合わせて列の入力欄を作り直す"""
+        self.current_selected_file_path = file_path
+        self.new_plot_file_input.setText(os.path.basename(file_path))
+        try:
+            self.current_file_info = sniff_data_file(file_path)
+        except (OSError, ValueError):
+            self.current_file_info = None
+        self.file_info_label.setText(describe_sniff_result(self.current_file_info) if self.current_file_info else "")
+        self.file_info_label.setVisible(self.current_file_info is not None)
+        self.update_column_input_ui()
 
     def request_redraw(self, *args, **kwargs):
-        self.update_timer.start(250)
+        if self.view_dragging:
+            # ドラッグ中は動かし続けても描かれるよう，タイマーを延ばさずに短い間隔で描く
+            if not self.update_timer.isActive(): self.update_timer.start(INTERACTIVE_REDRAW_MS)
+            return
+        self.update_timer.start(self.redraw_debounce.delay_ms())
+
+    def begin_view_drag(self, *args, **kwargs):
+        self.view_dragging = True
+
+    def end_view_drag(self, *args, **kwargs):
+        """スライダーを離したら，待たずにいつもの品質で描き直す"""
+        self.view_dragging = False
+        self.update_timer.stop()
+        self.redraw_plot()
 
     def add_plot(self, *args, **kwargs):
         if not self.current_selected_file_path:
@@ -816,6 +3400,7 @@ class GnuplotGUIY2Axis(QMainWindow):
         using = ":".join([str(sb.value()) for sb in self.column_spinboxes])
         is_vector = self.add_as_vector_check.isChecked()
         is_model = self.add_as_model_check.isChecked()
+        is_histogram = self.add_as_histogram_check.isChecked() and self.current_mode == '2d'
 
         plot_info = {
             "path": self.current_selected_file_path, "using": using, "is_vector": is_vector,
@@ -828,7 +3413,11 @@ class GnuplotGUIY2Axis(QMainWindow):
             }
         }
         
-        if is_model:
+        if is_histogram:
+            plot_info["is_histogram"] = True
+            plot_info["histogram"] = dict(HISTOGRAM_DEFAULTS)
+            plot_info["style"]["style"] = "boxes"
+        elif is_model:
             plot_info["style"]["style"] = "lines"
             plot_info["style"]["color"] = "gray"
             plot_info["style"]["color_from_value"] = False
@@ -843,7 +3432,8 @@ class GnuplotGUIY2Axis(QMainWindow):
         
         if self.current_mode == '2d':
             plot_info["axis"] = "y1" if self.new_plot_axis_combo.currentIndex() == 0 else "y2"
-            plot_info["title"] = f"{os.path.basename(self.current_selected_file_path)} u {using} ({plot_info['axis']})"
+            kind = " histogram" if is_histogram else ""
+            plot_info["title"] = f"{os.path.basename(self.current_selected_file_path)} u {using}{kind} ({plot_info['axis']})"
         else:
             plot_info["axis"] = None
             plot_info["title"] = f"{os.path.basename(self.current_selected_file_path)} u {using}"
@@ -851,233 +3441,126 @@ class GnuplotGUIY2Axis(QMainWindow):
                 plot_info["title"] += " (Model)"
         
         self.plots.append(plot_info)
-        editor = PlotEditorWidget(plot_info, self.dashtype_map)
-        editor.plotChanged.connect(self.request_redraw)
-        editor.titleChanged.connect(lambda title, idx=len(self.plots)-1: self.plot_tabs.setTabText(idx, title))
-        tab_index = self.plot_tabs.addTab(editor, plot_info["title"])
-        self.plot_tabs.setCurrentIndex(tab_index)
+        self.start_data_prep(plot_info)
+        self.invalidate_axis_stats()
+        self.plot_filter_input.clear()  # 追加したプロットが絞り込みで隠れないようにする
+        self.plot_list.addItem(plot_info["title"])
+        self.plot_list.setCurrentRow(len(self.plots) - 1)
         self.new_plot_file_input.clear()
         self.current_selected_file_path = None
+        self.current_file_info = None
+        self.file_info_label.setVisible(False)
+        self.update_column_input_ui()
         self.request_redraw()
 
     def remove_plot(self, index):
+        if not 0 <= index < len(self.plots): return
         reply = QMessageBox.question(self, 'Remove Plot', f"Are you sure you want to remove the plot '{self.plots[index]['title']}'?",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
-            self.plot_tabs.removeTab(index)
+            # 選択の移動は一覧から外す途中（行番号がずれる前）に通知されるため，止めておいて外した後に編集画面を作り直す
+            with blocked_signals([self.plot_list]):
+                self.plot_list.takeItem(index)
             self.plots.pop(index)
-            for i in range(self.plot_tabs.count()):
-                editor = self.plot_tabs.widget(i)
-                try:
-                    editor.titleChanged.disconnect()
-                except RuntimeError:
-                    pass
-                editor.titleChanged.connect(lambda title, idx=i: self.plot_tabs.setTabText(idx, title))
+            self.invalidate_axis_stats()
+            self.show_plot_editor(self.plot_list.currentRow())
             self.request_redraw()
 
-    def handle_tab_moved(self, from_index, to_index):
-        moved_plot = self.plots.pop(from_index)
-        self.plots.insert(to_index, moved_plot)
-        for i in range(self.plot_tabs.count()):
-            editor = self.plot_tabs.widget(i)
-            try:
-                editor.titleChanged.disconnect()
-            except RuntimeError:
-                pass
-            editor.titleChanged.connect(lambda title, idx=i: self.plot_tabs.setTabText(idx, title))
+    def handle_plot_moved(self, parent, start, end, destination, row):
+        # 一覧の並べ替え（ドラッグ）に合わせてself.plotsを並べ替える．編集画面は選択中のプロットを指したままでよい
+        moved_plot = self.plots.pop(start)
+        self.plots.insert(row if row < start else row - 1, moved_plot)
         self.request_redraw()
 
-    def generate_gnuplot_script(self, output_path=None, terminal_cmd=None):
-        if not self.plots: return None
-        if terminal_cmd: script = f"{terminal_cmd}\n"
-        else:
-            font_setting = f'font "{self.font_combo.currentText()},{self.font_slider.value()}"'
-            width = int(self.width_input.text() or "800")
-            height = int(self.height_input.text() or "600")
-            script = f'set terminal pngcairo size {width},{height} enhanced {font_setting}\n'
-        if output_path: script += f'set output "{output_path}"\n'
-        script += 'set encoding utf8\n'
-        script += 'set palette rgbformulae 22,13,-31\n'
-        if self.title_check.isChecked() and self.title_input.text(): script += f'set title "{self.title_input.text()}"\n'
-        if self.xlabel_input.text(): script += f'set xlabel "{self.xlabel_input.text()}"\n'
-        if self.ylabel_input.text(): script += f'set ylabel "{self.ylabel_input.text()}"\n'
-        if self.xrange_check.isChecked() and self.xrange_min.text() and self.xrange_max.text(): script += f'set xrange [{self.xrange_min.text()}:{self.xrange_max.text()}]\n'
-        if self.yrange_check.isChecked() and self.yrange_min.text() and self.yrange_max.text(): script += f'set yrange [{self.yrange_min.text()}:{self.yrange_max.text()}]\n'
-        
-        if self.colorbar_check.isChecked():
-            if self.cbsize_check.isChecked():
-                script += f'set colorbox user origin {self.cb_origin_x_spinbox.value():.2f},{self.cb_origin_y_spinbox.value():.2f} size {self.cb_size_w_spinbox.value():.2f},{self.cb_size_h_spinbox.value():.2f}\n'
-            else: script += 'set colorbox default\n'
-            if self.cblabel_input.text(): script += f'set cblabel "{self.cblabel_input.text()}"\n'
-            if self.cbrange_check.isChecked() and self.cbrange_min.text() and self.cbrange_max.text(): script += f'set cbrange [{self.cbrange_min.text()}:{self.cbrange_max.text()}]\n'
-            
-            if self.cb_format_10_power_check.isChecked():
-                script += 'set format cb "%.1tx10^{%T}"\n'
-            else:
-                script += 'unset format cb\n'
-        else: script += 'unset colorbox\n'
-
-        log_axes = ""
-        if self.logscale_x_check.isChecked(): log_axes += "x"
-        if self.logscale_y_check.isChecked(): log_axes += "y"
-        if self.grid_check.isChecked(): script += 'set grid\n'
-        
-        if self.key_check.isChecked():
-            key_options = [self.key_pos_combo.currentText()]
-            maxrows = self.key_maxrows_spinbox.value()
-            if maxrows > 0: key_options.append(f"maxrows {maxrows}")
-            maxcols = self.key_maxcols_spinbox.value()
-            if maxcols > 0: key_options.append(f"maxcols {maxcols}")
-            script += f'set key {" ".join(key_options)}\n'
-        else:
-            script += 'set key off\n'
-
-        if self.xtics_check.isChecked(): script += f'set xtics offset {self.xtics_xoffset.text() or "0"},{self.xtics_yoffset.text() or "0"}\n'
-        if self.ytics_check.isChecked(): script += f'set ytics offset {self.ytics_xoffset.text() or "0"},{self.ytics_yoffset.text() or "0"}\n'
+    def show_plot_editor(self, row):
+        """一覧で選んだプロットの編集画面を作る（前の編集画面は捨てる．設定はplot_infoに入っている）"""
+        if self.plot_editor is not None:
+            self.plot_editor.setParent(None)
+            self.plot_editor.deleteLater()
+            self.plot_editor = None
+        self.remove_plot_button.setEnabled(0 <= row < len(self.plots))
+        if not 0 <= row < len(self.plots): return
+        plot_info = self.plots[row]
+        item = self.plot_list.item(row)
+        editor = PlotEditorWidget(plot_info, self.dashtype_map)
+        editor.set_preview_note(self.preview_notes.get(id(plot_info), ""))
+        editor.plotChanged.connect(self.request_redraw)
+        editor.plotChanged.connect(self.invalidate_axis_stats)
+        editor.titleChanged.connect(item.setText)
+        self.plot_editor_area.layout().addWidget(editor)
+        self.plot_editor = editor
 
-        if self.current_mode == '2d':
-            has_y2 = any(p.get('axis') == 'y2' for p in self.plots)
-            if has_y2 and self.y2label_input.text(): script += f'set y2label "{self.y2label_input.text()}"\n'
-            if has_y2 and self.y2range_check.isChecked() and self.y2range_min.text() and self.y2range_max.text(): script += f'set y2range [{self.y2range_min.text()}:{self.y2range_max.text()}]\n'
-            if has_y2:
-                script += 'set ytics nomirror\nset y2tics\n'
-                if self.y2tics_offset_check.isChecked(): script += f'set y2tics offset {self.y2tics_xoffset.text() or "0"},{self.y2tics_yoffset.text() or "0"}\n'
-            if has_y2 and self.logscale_y2_check.isChecked(): log_axes += "y2"
-            plot_command = "plot"
-        else: # 3d
-            if self.zlabel_input.text(): script += f'set zlabel "{self.zlabel_input.text()}" rotate by 90\n'
-            if self.zrange_check.isChecked() and self.zrange_min.text() and self.zrange_max.text(): script += f'set zrange [{self.zrange_min.text()}:{self.zrange_max.text()}]\n'
-            if self.ztics_check.isChecked(): script += f'set ztics offset {self.ztics_xoffset.text() or "0"},{self.ztics_yoffset.text() or "0"}\n'
-            if self.logscale_z_check.isChecked(): log_axes += "z"
-            script += f'set view {self.view_rot_x_slider.value()},{self.view_rot_z_slider.value()}\n'
-            if self.pm3d_check.isChecked(): script += 'set pm3d explicit\n'
-            else: script += 'unset pm3d\n'
-            
-            # --- xyplane setting ---
-            if self.xyplane_check.isChecked():
-                script += f'set xyplane at {self.xyplane_input.text()}\n'
-            # -----------------------
+    def filter_plot_list(self, *args, **kwargs):
+        text = self.plot_filter_input.text().strip().lower()
+        for i in range(self.plot_list.count()):
+            item = self.plot_list.item(i)
+            item.setHidden(bool(text) and text not in item.text().lower())
 
-            plot_command = "splot"
+    def section_widgets(self):
+        """各セクション（terminalは出力サイズとフォント）の内容を決めるウィジェット"""
+        return {
+            "terminal": [self.width_input, self.height_input, self.font_combo, self.font_slider],
+            "title": [self.title_check, self.title_input],
+            "labels": [self.xlabel_input, self.ylabel_input],
+            "ranges": [self.xrange_check, self.xrange_min, self.xrange_max, self.yrange_check, self.yrange_min, self.yrange_max],
+            "colorbox": [self.colorbar_check, self.cbsize_check, self.cb_origin_x_spinbox, self.cb_origin_y_spinbox,
+                         self.cb_size_w_spinbox, self.cb_size_h_spinbox, self.cblabel_input,
+                         self.cbrange_check, self.cbrange_min, self.cbrange_max, self.cb_format_10_power_check],
+            "grid": [self.grid_check],
+            "key": [self.key_check, self.key_pos_combo, self.key_maxrows_spinbox, self.key_maxcols_spinbox],
+            "tics": [self.xtics_check, self.xtics_xoffset, self.xtics_yoffset, self.ytics_check, self.ytics_xoffset, self.ytics_yoffset],
+            "axes": [self.y2label_input, self.y2range_check, self.y2range_min, self.y2range_max,
+                     self.y2tics_offset_check, self.y2tics_xoffset, self.y2tics_yoffset],
+            "logscale": [self.logscale_x_check, self.logscale_y_check, self.logscale_y2_check],
+        }
 
-        if log_axes: script += f'set logscale {log_axes}\n'
-        else: script += 'unset logscale\n'
+    def section_widgets_3d(self):
+        """section_widgets() のうち，ensure_3d_panels() で作るZ軸と3Dの表示設定のウィジェット"""
+        return {
+            "axes": [self.zlabel_input, self.zrange_check, self.zrange_min, self.zrange_max,
+                     self.ztics_check, self.ztics_xoffset, self.ztics_yoffset],
+            "view": [self.view_rot_x_slider, self.view_rot_z_slider],
+            "pm3d": [self.pm3d_check, self.xyplane_check, self.xyplane_input],
+            "logscale": [self.logscale_z_check],
+        }
 
-        normal_parts = []
-        model_parts = []
-        
-        for plot_info in self.plots:
-            style_info = plot_info["style"]
-            is_vector = plot_info.get("is_vector", False)
-            is_model = plot_info.get("is_model_mode", False)
-            
-            if is_model:
-                orig_cols = plot_info['using'].split(':')
-                limit = 3 if self.current_mode == '3d' else 2
-                using_cols = [f"(${c})" for c in orig_cols[:limit]]
-            else:
-                cols = plot_info['using'].split(':')
-                using_cols = [f"(${c})" for c in cols]
-
-            if is_vector and not is_model:
-                vec_opts = style_info.get("vector_options", {})
-                if vec_opts.get("normalize", False):
-                    magnitude_expr = style_info.get("color_expression")
-                    if magnitude_expr:
-                        magnitude_safe = f"(({magnitude_expr}) == 0 ? 1 : ({magnitude_expr}))"
-                        if self.current_mode == '2d' and len(using_cols) >= 4: using_cols[2] = f"({using_cols[2]} / {magnitude_safe})"; using_cols[3] = f"({using_cols[3]} / {magnitude_safe})"
-                        elif self.current_mode == '3d' and len(using_cols) >= 6: using_cols[3] = f"({using_cols[3]} / {magnitude_safe})"; using_cols[4] = f"({using_cols[4]} / {magnitude_safe})"; using_cols[5] = f"({using_cols[5]} / {magnitude_safe})"
-                scale = vec_opts.get('length_scale', 1.0)
-                if scale != 1.0:
-                    if self.current_mode == '2d' and len(using_cols) >= 4: using_cols[2] = f"({using_cols[2]} * {scale})"; using_cols[3] = f"({using_cols[3]} * {scale})"
-                    elif self.current_mode == '3d' and len(using_cols) >= 6: using_cols[3] = f"({using_cols[3]} * {scale})"; using_cols[4] = f"({using_cols[4]} * {scale})"; using_cols[5] = f"({using_cols[5]} * {scale})"
-            
-            if style_info.get("color_from_value", False) and style_info.get("color_expression", "") and not is_model:
-                using_cols.append(f'({style_info["color_expression"]})')
-            
-            using_str = "using " + ":".join(using_cols)
-            style_details = ""
-            
-            if is_vector and not is_model:
-                style_details = "with vectors"
-                vec_opts = style_info.get("vector_options", {})
-                if vec_opts.get("nohead"): style_details += " nohead"
-                else:
-                    if vec_opts.get("head_style", "Default") != "Default": style_details += f' head {vec_opts["head_style"].lower()}'
-                    if vec_opts.get("head_size", "").strip(): style_details += f' size {vec_opts["head_size"]}'
-                dt_val = self.dashtype_map.get(style_info['linestyle'], 1)
-                style_details += f" dashtype {dt_val} linewidth {style_info['linewidth']}"
-            else:
-                style = style_info["style"]
-                style_details = "with pm3d" if style == 'pm3d' else f"with {style}"
-                if "lines" in style or style in ["impulses", "steps"]:
-                    dt_val = self.dashtype_map.get(style_info['linestyle'], 1); style_details += f" dashtype {dt_val} linewidth {style_info['linewidth']}"
-                if "points" in style or style in ["dots"]: style_details += f" pointtype {style_info['pointtype']} pointsize {style_info['pointsize']}"
-            
-            if style_info.get("color_from_value") and not is_model:
-                style_details += " lc palette"
-            else:
-                style_details += f' linecolor rgb "{style_info["color"]}"'
-            
-            path_str = f'"{plot_info["path"]}" {using_str}'; title_str = f'title "{plot_info["title"]}"'
-            
-            part_str = ""
-            if self.current_mode == '2d':
-                axis_cmd = "x1y1" if plot_info.get("axis") == "y1" else "x1y2"
-                part_str = f'{path_str} axes {axis_cmd} {style_details} {title_str}'
-            else:
-                part_str = f'{path_str} {style_details} {title_str}'
-            
-            if is_model:
-                model_parts.append(part_str)
-            else:
-                normal_parts.append(part_str)
+    def mark_sections_dirty(self, *names):
+        """セクションを作り直す必要があることを記録する（名前を省略するとすべて）"""
+        self.settings_snapshot = None
+        if not names:
+            self.section_cache.clear()
+            return
+        for key in [k for k in self.section_cache if k[0] in names]:
+            del self.section_cache[key]
 
-        if model_parts:
-            script += "set multiplot\n"
-            
-            # --- 余白調整（Fix for margins sticking out）---
-            # 2D/3Dモードに応じて適切な余白を設定します。
-            # 目盛りやラベルの大きさを考慮し、以前よりも余裕を持たせた値を設定しました。
-            if self.current_mode == '2d':
-                # 2Dの場合、左側にY軸ラベル、下側にX軸ラベルのスペースを確保
-                script += "set lmargin screen 0.20\nset rmargin screen 0.85\nset bmargin screen 0.20\nset tmargin screen 0.90\n"
-            else:
-                # 3Dの場合、回転によって軸が大きくはみ出す可能性があるため、さらに余裕を確保
-                script += "set lmargin screen 0.20\nset rmargin screen 0.80\nset bmargin screen 0.30\nset tmargin screen 0.90\n"
-            # -----------------------------------------------
-
-            if normal_parts:
-                script += f"{plot_command} " + ", \\\n    ".join(normal_parts) + "\n"
-                
-                # --- 範囲の完全固定処理 ---
-                script += "# Fix ranges and disable autoscale for the second plot\n"
-                script += "set xrange [GPVAL_X_MIN:GPVAL_X_MAX]\n"
-                script += "set yrange [GPVAL_Y_MIN:GPVAL_Y_MAX]\n"
-                if self.current_mode == '3d':
-                    script += "set zrange [GPVAL_Z_MIN:GPVAL_Z_MAX]\n"
-                if self.current_mode == '2d' and any(p.get('axis') == 'y2' for p in self.plots):
-                     script += "set y2range [GPVAL_Y2_MIN:GPVAL_Y2_MAX]\n"
-                
-                script += "unset autoscale\n" 
-                # -------------------------
-            
-            script += "unset colorbox\n"
-            script += "unset border\nunset key\n"
+    def script_settings(self):
+        """スクリプトを作るための設定（collect_settings()の内容）．ウィジェットの値が変わるまで使い回す"""
+        if self.settings_snapshot is None:
+            self.settings_snapshot = self.collect_settings()
+        return self.settings_snapshot
 
-            script += f"{plot_command} " + ", \\\n    ".join(model_parts) + "\n"
-            
-            script += "unset multiplot\n"
-            script += "set autoscale\n" 
-        else:
-            if normal_parts:
-                script += f"{plot_command} " + ", \\\n    ".join(normal_parts) + "\n"
+    def generate_gnuplot_script(self, *args, **kwargs):
+        """gnuplotのスクリプト全体を文字列で返す（引数はbuild_gnuplot_script()と同じ）"""
+        script = self.build_gnuplot_script(*args, **kwargs)
+        return str(script) if script is not None else None
 
-        return script
+    def build_gnuplot_script(self, output_path=None, terminal_cmd=None, data_sources=None, overlay_ranges=None, layer=None):
+        """現在の設定からスクリプトを作り，GnuplotScriptとして返す（引数はscript_from_settings()を参照）"""
+        if not self.plots: return None
+        return script_from_settings(self.script_settings(), output_path, terminal_cmd, data_sources, overlay_ranges, layer, section_cache=self.section_cache)
 
     def redraw_plot(self, *args, **kwargs):
+        interactive = self.view_dragging and self.current_mode == '3d'
+        if interactive and self.render_thread.busy():
+            # ドラッグ中は描画中の画像を中断せずに表示させ，終わってから最新の角度で描く
+            self.update_timer.start(INTERACTIVE_REDRAW_MS)
+            return
+        self.update_tail_watch()
+        trace = self.redraw_trace = RenderTrace("preview", debounce_ms=self.redraw_debounce.delay_ms())
         script = self.generate_gnuplot_script()
         if not script:
+            self.cancel_preview_render(cancel_running=True)
+            self.last_preview_image = None
             self.plot_label.setText("Please add a plot to begin.")
             self.script_display.clear()
             self.script_display.setFixedHeight(30)
@@ -1085,19 +3568,651 @@ class GnuplotGUIY2Axis(QMainWindow):
         self.script_display.setText(script)
         new_height = int(self.script_display.document().size().height()) + 15
         self.script_display.setFixedHeight(new_height)
+        trace.mark("script")
+        # 大きなファイルはピクセル単位で間引いたデータに差し替える．間引きが終わるまでは前の画像のまま待つ
+        # SVGのプレビューは出力サイズで描いて表示する側で拡大縮小するため，間引きも出力サイズに合わせる
+        use_svg = not interactive and self.svg_preview_check.isChecked() and svg_renderer_class() is not None
+        if use_svg:
+            pixel_w, pixel_h = int(self.width_input.text() or "800"), int(self.height_input.text() or "600")
+        else:
+            pixel_w, pixel_h, _ = self.preview_pixel_size()
+        sources, pending = self.preview_data_sources(pixel_w, pixel_h, interactive)
+        if use_svg and not pending and self.preview_element_count(sources) > SVG_PREVIEW_MAX_ELEMENTS:
+            # 要素が多すぎるとSVGが大きくなり表示も遅くなるため，PNGで描画する
+            use_svg = False
+            pixel_w, pixel_h, _ = self.preview_pixel_size()
+            sources, pending = self.preview_data_sources(pixel_w, pixel_h)
+        trace.mark("data")
+        trace.info["format"] = "svg" if use_svg else "png"
+        if interactive: trace.info["interactive"] = True
+        if pending:
+            self.cancel_preview_render()
+            if self.last_preview_image is None: self.plot_label.setText("Preparing preview data...")
+            return
+        # プレビューは出力サイズではなく，表示するラベルの実ピクセルサイズで描画する
+        ranges = self.overlay_ranges()
+        models = [p["path"] for p in self.plots if p.get("is_model_mode", False)]
+        data = [p["path"] for p in self.plots if not p.get("is_model_mode", False)]
+        if interactive:
+            # ドラッグ中は間引いたデータを低い解像度で描き，大きな曲面はpm3dの代わりに線で描く
+            settings = self.script_settings()
+            plots = [dict(p, style={**p["style"], "style": "lines"})
+                     if p["style"].get("style") == "pm3d" and source is not None and (source.total_rows or 0) > INTERACTIVE_WIREFRAME_ROWS else p
+                     for p, source in zip(settings["plots"], sources)]
+            interactive_script = script_from_settings({**settings, "plots": plots}, terminal_cmd=self.preview_terminal_cmd(resolution=INTERACTIVE_PREVIEW_SCALE),
+                                                      data_sources=sources, section_cache=self.section_cache)
+            layers = [(PreviewImageCache.make_key(str(interactive_script), [p["path"] for p in self.plots]), interactive_script)]
+        elif use_svg:
+            width, height = int(self.width_input.text() or "800"), int(self.height_input.text() or "600")
+            font_setting = f'font "{self.font_combo.currentText()},{self.font_slider.value()}"'
+            svg_script = self.build_gnuplot_script(terminal_cmd=export_terminal_cmd("svg", width, height, font_setting), data_sources=sources, overlay_ranges=ranges)
+            layers = [(PreviewImageCache.make_key(str(svg_script), [p["path"] for p in self.plots]), svg_script)]
+        elif ranges is not None and models and data:
+            # ほとんど変わらないモデルは透明な背景の別の層として描いてキャッシュし，データの層に重ねる
+            data_script = self.build_gnuplot_script(terminal_cmd=self.preview_terminal_cmd(), data_sources=sources, overlay_ranges=ranges, layer="data")
+            model_script = self.build_gnuplot_script(terminal_cmd=self.preview_terminal_cmd(transparent=True), data_sources=sources, overlay_ranges=ranges, layer="model")
+            layers = [(PreviewImageCache.make_key(str(data_script), data), data_script), (PreviewImageCache.make_key(str(model_script), models), model_script)]
+        else:
+            # 前回の描画から変わったセクションだけが常駐しているgnuplotへ送られる
+            preview_script = self.build_gnuplot_script(terminal_cmd=self.preview_terminal_cmd(), data_sources=sources, overlay_ranges=ranges)
+            layers = [(PreviewImageCache.make_key(str(preview_script), [p["path"] for p in self.plots]), preview_script)]
+        trace.mark("script")
+        self.render_layers(layers)
+
+    def render_layers(self, layers):
+        """各層の画像をキャッシュから集め，無い層は一つずつバックグラウンドで描画する．揃ったら重ねて表示する
+
+        layersは (キャッシュのキー, スクリプト) のリストで，先頭が一番下の層です．
+        """
+        self.pending_layers = layers
+        images = []
+        for key, script in layers:
+            # 同じスクリプト・同じデータで描画済みならgnuplotを呼ばずにキャッシュの画像を使う
+            image = self.preview_cache.get(key)
+            if image is None:
+                # 描画はバックグラウンドで行い，新しい画像が届くまでは前の画像を表示したままにする
+                self.render_cache_key = key
+                self.render_thread.submit(key, script)
+                return
+            images.append(image)
+        self.cancel_preview_render()
+        trace = self.redraw_trace
+        if len(images) == 1:
+            image = images[0]
+        else:
+            with trace.stage("composite"): image = composite_images(images)
+        if isinstance(image, bytes):
+            # SVGはGUIスレッドで読み込み，表示する大きさでその都度描く
+            with trace.stage("decode"): image = QSvgRenderer(QByteArray(image))
+        with trace.stage("scale"):
+            self.show_preview_image(image)
+        self.finish_trace(trace, layers=len(layers), rendered_layers=trace.info.get("rendered_layers", 0))
+
+    def cancel_preview_render(self, cancel_running=False):
+        """待ち行列の描画の依頼を捨て，届いた結果を表示に使わないようにする（結果はキャッシュには入る）"""
+        self.render_cache_key = None
+        self.render_thread.discard(cancel_running)
+
+    def finish_trace(self, trace, **info):
+        """描画にかかった時間をステータスバーに表示し，トレースが有効ならファイルに追記する"""
+        trace.finish(**info)
+        self.statusBar().showMessage(trace.status_text())
+        self.trace_log.write(trace)
+
+    def toggle_trace(self, checked):
+        if not checked:
+            self.trace_log.close()
+            self.statusBar().showMessage("Render tracing stopped.", 3000)
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "Trace Render Timings To", "guinuplot-trace.jsonl", "JSON Lines (*.jsonl);;All Files (*)")
+        if not file_name or not self.start_trace(file_name):
+            self.trace_action.blockSignals(True); self.trace_action.setChecked(False); self.trace_action.blockSignals(False)
+
+    def start_trace(self, path):
+        try:
+            self.trace_log.open(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to open the trace file.\n\n{e}")
+            return False
+        self.trace_action.blockSignals(True); self.trace_action.setChecked(True); self.trace_action.blockSignals(False)
+        self.statusBar().showMessage(f"Tracing render timings to {path}", 3000)
+        return True
+
+    def preview_pixel_size(self):
+        """出力画像の縦横比のままラベルに収まるサイズ（デバイスピクセル単位）と，出力サイズに対する倍率を返す"""
+        width = int(self.width_input.text() or "800")
+        height = int(self.height_input.text() or "600")
+        dpr = self.plot_label.devicePixelRatioF()
+        avail_w, avail_h = self.plot_label.width(), self.plot_label.height()
+        scale = min(avail_w / width, avail_h / height) if width > 0 and height > 0 and avail_w > 0 and avail_h > 0 else 1.0
+        pixel_w, pixel_h = max(1, round(width * scale * dpr)), max(1, round(height * scale * dpr))
+        return pixel_w, pixel_h, (pixel_w / width if width > 0 else 1.0)
+
+    def preview_terminal_cmd(self, transparent=False, resolution=1.0):
+        """プレビュー用のterminal設定．フォントと線幅は出力サイズとの比で拡大縮小し，保存される画像と同じ見た目にする
+
+        resolutionを1より小さくすると，その倍率の解像度で描きます（表示するときに拡大します）．
+        """
+        pixel_w, pixel_h, factor = self.preview_pixel_size()
+        if resolution != 1.0:
+            pixel_w, pixel_h, factor = max(1, round(pixel_w * resolution)), max(1, round(pixel_h * resolution)), factor * resolution
+        font_setting = f'font "{self.font_combo.currentText()},{self.font_slider.value()}"'
+        return f'set terminal pngcairo{" transparent" if transparent else ""} size {pixel_w},{pixel_h} enhanced {font_setting} fontscale {factor:.3f} linewidth {factor:.3f}'
+
+    def preview_element_count(self, sources):
+        """プレビューで描く要素（行）の数の見積もり．行数の分からないテキストファイルは1行16バイトとみなす"""
+        total = 0
+        for plot_info, source in zip(self.plots, sources):
+            if source is not None and source.rows is not None:
+                total += source.rows
+                continue
+            try:
+                total += os.path.getsize(plot_info["path"]) // 16
+            except OSError:
+                pass
+        return total
+
+    def preview_data_sources(self, pixel_w, pixel_h, interactive=False):
+        """プレビューで各プロットの代わりに読ませるデータを決める（interactiveなら視点のドラッグ中の間引いたデータ）
+
+        戻り値は (self.plotsと同じ順のDataSourceまたはNoneのリスト, 前処理が終わっていないプロットがあるか) です．
+        """
+        sources, pending = [], False
+        for i, plot_info in enumerate(self.plots):
+            # 監視中のファイルは追記分だけを読み込んだデータを使い，ファイル全体の前処理はしない
+            source, state = self.tail_source(plot_info)
+            watched = state is not None
+            gridded = binned = False
+            if not watched:
+                # Grid Dataの格子とヒストグラムのビンの表は十分に小さいため，ドラッグ中もそのまま使う
+                source, state = self.grid_source(plot_info)
+                gridded = state is not None
+                if not gridded:
+                    source, state = self.histogram_source(plot_info)
+                    binned = state is not None
+                if not gridded and not binned:
+                    source, state = self.interactive_source(plot_info) if interactive else self.lod_source(plot_info, pixel_w, pixel_h)
+            pending = pending or state == "pending"
+            if source: note = source.note
+            elif gridded and state == "pending": note = "Gridding data..."
+            elif gridded and state == "failed": note = "Grid Data failed; plotting the original file."
+            elif binned and state == "pending": note = "Counting histogram bins..."
+            elif binned and state == "failed": note = "Histogram binning failed; gnuplot counts the bins."
+            elif state == "pending": note = "Waiting for live data..." if watched else "Preparing decimated preview..."
+            elif state == "failed" and watched: note = "Live tail failed; plotting the whole file."
+            else: note = ""
+            self.preview_notes[id(plot_info)] = note
+            if self.plot_editor is not None and self.plot_editor.plot_info is plot_info: self.plot_editor.set_preview_note(note)
+            if source is None and not watched:
+                source = self.prepared_source(plot_info)
+            sources.append(source)
+        return sources, pending
+
+    def start_data_prep(self, plot_info):
+        """binaryサイドカーへの変換（ベクトルなら成分の計算）と，3Dなら視点のドラッグ用の間引きをバックグラウンドで始めておく"""
+        self.prepared_source(plot_info)
+        if self.current_mode == '3d': self.interactive_source(plot_info)
+
+    def render_data_sources(self):
+        """画像の保存など，全データを描画するときに使うデータ（前処理済みのbinaryがあればそれ）を返す
+
+        格子とヒストグラムの表は，無いと描かれる絵が変わるため，作成中なら待ちます（コマンドラインでの出力と同じ画像にする）．
+        """
+        return [self.prepared_source(plot_info, wait=True) for plot_info in self.plots]
+
+    def prepared_source(self, plot_info, wait=False):
+        """間引きをしない前処理済みのデータ（Grid Dataの格子，ヒストグラムのビン，ベクトルの計算済み列，binaryサイドカー）を返す"""
+        return (self.grid_source(plot_info, wait)[0] or self.histogram_source(plot_info, wait)[0]
+                or self.vector_source(plot_info) or self.sidecar_source(plot_info))
+
+    def grid_source(self, plot_info, wait=False):
+        """Grid Dataのプロットについて，格子にしたデータ（binary matrix）を返す
+
+        戻り値は (DataSourceまたはNone, 状態) で，Grid Dataを使わないプロットの状態はNoneです．
+        waitがTrueなら，格子を作成中でも終わるまで待ちます．
+        """
+        options = gridding_options(plot_info, self.current_mode)
+        if np is None or options is None: return None, None
+        columns, resolution = options
+        path = plot_info["path"]
+        try:
+            key = grid_cache_key(path, columns, resolution)
+        except OSError:
+            return None, None
+        out_path = cache_file_path("grid", key, "bin")
+        state, result = self.data_prep.lookup(key, lambda: build_grid_file(path, columns, resolution, out_path), wait=wait)
+        if state != "ready": return None, state
+        return grid_data_source(result), state
+
+    def histogram_source(self, plot_info, wait=False):
+        """ヒストグラムのプロットについて，数え終わったビンの表を返す（戻り値はgrid_source()と同じ）
+
+        列の値の並べ替え（または個数・最小・最大）とビンの表は別々にキャッシュするため，スタイルだけの変更では
+        数え直さず，ビンの変更では並べ替えた値から数え直します．
+        """
+        options = histogram_options(plot_info, self.current_mode)
+        if np is None or options is None: return None, None
+        column, hist = options
+        path = plot_info["path"]
+        try:
+            values_key, key = histogram_values_key(path, column), histogram_cache_key(path, column, hist)
+        except OSError:
+            return None, None
+        values_path = cache_file_path("values", values_key, "bin")
+        state, values_meta = self.data_prep.lookup(values_key, lambda: build_sorted_values(path, column, values_path), wait=wait)
+        if state != "ready": return None, state
+        out_path = cache_file_path("histogram", key, "bin")
+        state, result = self.data_prep.lookup(key, lambda: build_histogram_file(path, column, hist, values_meta, out_path), wait=wait)
+        if state != "ready": return None, state
+        return histogram_data_source(result, plot_info["style"]), state
+
+    def vector_source(self, plot_info):
+        """ベクトルのプロットについて，正規化・倍率・色を計算済みの列を返す．計算中・計算できない場合はNone"""
+        if np is None or not plot_info.get("is_vector", False) or plot_info.get("is_model_mode", False): return None
+        dims = 3 if self.current_mode == '3d' else 2
+        columns = parse_using_columns(plot_info.get("using", ""))
+        if not columns or len(columns) != 2 * dims: return None
+        style_info = plot_info["style"]
+        vec_opts = style_info.get("vector_options", {})
+        color_expr = style_info.get("color_expression", "") if style_info.get("color_from_value", False) else ""
+        magnitude_expr = style_info.get("color_expression", "") if vec_opts.get("normalize", False) else ""
+        scale = vec_opts.get('length_scale', 1.0)
+        path = plot_info["path"]
         try:
-            process = subprocess.Popen(['gnuplot'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=CREATE_NO_WINDOW)
-            stdout_data, stderr_data = process.communicate(script.encode('utf-8'))
-            if process.returncode != 0:
-                self.plot_label.setText(f"Gnuplot Error:\n{stderr_data.decode('utf-8', 'ignore')}")
+            fingerprint = file_fingerprint(path)
+        except OSError:
+            return None
+        key = ("vector", fingerprint, tuple(columns), dims, magnitude_expr, scale, color_expr)
+        out_path = cache_file_path("vector", key, "bin")
+        # 計算が終わるまではgnuplotの式で描画し，終わっても見た目は同じなので描き直しは要求しない
+        state, result = self.data_prep.lookup(key, lambda: build_vector_file(path, columns, dims, magnitude_expr, scale, color_expr, out_path), notify=False)
+        if state != "ready": return None
+        return DataSource(result["path"], binary=f'format="%{result["ncols"]}float64"', using=[str(i) for i in range(1, result["ncols"] + 1)], rows=result["rows"])
+
+    def sidecar_source(self, plot_info):
+        """テキストのデータファイルの代わりに読ませるbinaryサイドカーを返す．変換中・変換できない場合はNone"""
+        if np is None: return None
+        path = plot_info["path"]
+        try:
+            fingerprint = file_fingerprint(path)
+        except OSError:
+            return None
+        # 変換が終わっても見た目は変わらないため，描き直しは要求しない
+        state, meta = self.data_prep.lookup(("sidecar", fingerprint), lambda: get_sidecar(path), notify=False)
+        if state != "ready" or meta["has_blocks"] or not meta["rows"]:
+            return None
+        return DataSource(meta["bin_path"], binary=f'format="%{meta["ncols"]}float64"', rows=meta["rows"])
+
+    def plot_column_stats(self, plot_info):
+        """プロットの各軸に使われる値の統計を返す（{軸名: 統計}）．集計中ならNone，求められない軸は含めない
+
+        統計はファイルが変わらない限りディスクに残るため，一度読んだファイルはすぐに表示できます．
+        """
+        if np is None or plot_info.get("tail", {}).get("enabled", False): return {}
+        axis_exprs = stats_axis_exprs(plot_info, self.current_mode)
+        exprs = sorted({expr for exprs in axis_exprs.values() for expr in exprs})
+        if not exprs: return {}
+        path = plot_info["path"]
+        try:
+            key = ("stats", file_fingerprint(path), tuple(exprs))
+        except OSError:
+            return {}
+        out_path = cache_file_path("stats", key, "json")
+        state, result = self.column_stats.lookup(key, lambda: build_column_stats(path, exprs, out_path))
+        if state == "pending": return None
+        if state == "failed": return {}
+        return {axis: merge_column_stats([result[expr] for expr in exprs]) for axis, exprs in axis_exprs.items()}
+
+    def axis_column_stats(self):
+        """軸ごとに，全プロットの値の統計をまとめたものと，集計中のプロットがあるかを返す
+
+        まとめた結果は invalidate_axis_stats() が呼ばれるまで使い回します．
+        """
+        if self.axis_stats is None:
+            per_axis, pending = {}, False
+            for plot_info in self.plots:
+                stats = self.plot_column_stats(plot_info)
+                if stats is None:
+                    pending = True
+                    continue
+                for axis, s in stats.items(): per_axis.setdefault(axis, []).append(s)
+            self.axis_stats = ({axis: merge_column_stats(stats) for axis, stats in per_axis.items()}, pending)
+        return self.axis_stats
+
+    def invalidate_axis_stats(self, *args, **kwargs):
+        """プロットやファイルが変わったとき，新しい統計ができたときに呼び，まとめた統計を求め直す"""
+        self.axis_stats = None
+        self.refresh_axis_stats()
+
+    def refresh_axis_stats(self, *args, **kwargs):
+        """表示中の軸のタブの統計を更新し，統計を待っていた「Fit」「1–99%」の範囲を入れる
+
+        どの統計も見えておらず範囲を待ってもいなければ，ファイルを調べずに戻ります．
+        """
+        visible = {axis: row for axis, row in self.range_suggestions.items() if row[3].isVisible()}
+        if not visible and not self.pending_range_fits: return
+        stats, pending = self.axis_column_stats()
+        for axis, (check, min_edit, max_edit, label) in visible.items():
+            s = stats.get(axis)
+            if s is None:
+                label.setText("Computing statistics..." if pending and self.plots else "")
+                continue
+            text = f"min {s['min']:.6g}, max {s['max']:.6g}, mean {s['mean']:.6g}\n1–99%: {s['quantiles'][1]:.6g} … {s['quantiles'][99]:.6g} ({s['count']:,} values)"
+            label.setText(text + (" ..." if pending else ""))
+        if pending: return
+        fits, self.pending_range_fits = self.pending_range_fits, {}
+        for axis, robust in fits.items(): self.apply_range_fit(axis, stats.get(axis), robust)
+
+    def fit_axis_range(self, axis, robust):
+        """軸の範囲をデータの最小・最大（robustなら1%点から99%点）にする．統計が集計中なら，できたときに入れる"""
+        self.axis_stats = None  # ファイルが書き換わっていれば新しい統計を使う
+        stats, pending = self.axis_column_stats()
+        if pending:
+            self.pending_range_fits[axis] = robust
+            self.statusBar().showMessage("Computing column statistics...", 3000)
+            return
+        self.apply_range_fit(axis, stats.get(axis), robust)
+
+    def apply_range_fit(self, axis, stats, robust):
+        check, min_edit, max_edit, _ = self.range_suggestions[axis]
+        if stats is None:
+            self.statusBar().showMessage(f"No statistics are available for the {axis} axis.", 3000)
+            return
+        lo, hi = (stats["quantiles"][1], stats["quantiles"][99]) if robust else (stats["min"], stats["max"])
+        log_checks = {"x": self.logscale_x_check, "y": self.logscale_y_check, "y2": self.logscale_y2_check}
+        if axis == "z": log_checks["z"] = self.logscale_z_check
+        is_log = axis in log_checks and log_checks[axis].isChecked()
+        if is_log and lo <= 0:
+            # 対数軸には0以下の値を描けないため，正の値の最小から始める
+            if stats["min_positive"] is None:
+                self.statusBar().showMessage(f"The {axis} axis is logarithmic but has no positive values.", 3000)
                 return
-            pixmap = QPixmap()
-            if pixmap.loadFromData(stdout_data):
-                self.plot_label.setPixmap(pixmap.scaled(self.plot_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            lo = max(lo, stats["min_positive"])
+        if hi <= lo:
+            # 幅のない範囲は広げる．対数軸では0以下にならないよう，前後に1桁ずつ広げる
+            lo, hi = (lo / 10, max(hi, lo) * 10) if is_log else (lo - 0.5, hi + 0.5)
+        min_edit.setText(format_range_bound(lo, upper=False))
+        max_edit.setText(format_range_bound(hi, upper=True))
+        check.setChecked(True)
+
+    def overlay_ranges(self, wait=False):
+        """モデルを一回のplotで重ねるために，モデル以外のデータから自動スケールの軸の範囲を求める
+
+        戻り値は {軸名: (最小, 最大)} です．モデルが無い，集計中，または範囲を正しく求められない場合
+        （ユーザー定義の式，固定した軸と自動スケールの軸の混在など）はNoneを返し，multiplotの2回描画を使います．
+        集計が終わると描き直しを要求します．waitがTrueなら（画像の保存・書き出し），集計が終わるまで待ちます．
+        """
+        if np is None: return None
+        models = [p for p in self.plots if p.get("is_model_mode", False)]
+        normals = [p for p in self.plots if not p.get("is_model_mode", False)]
+        if not models: return None
+        is_3d = self.current_mode == '3d'
+        has_y2 = not is_3d and any(p.get('axis') == 'y2' for p in self.plots)
+        fixed = {
+            "x": self.xrange_check.isChecked() and bool(self.xrange_min.text() and self.xrange_max.text()),
+            "y": self.yrange_check.isChecked() and bool(self.yrange_min.text() and self.yrange_max.text()),
+        }
+        if has_y2: fixed["y2"] = self.y2range_check.isChecked() and bool(self.y2range_min.text() and self.y2range_max.text())
+        if is_3d: fixed["z"] = self.zrange_check.isChecked() and bool(self.zrange_min.text() and self.zrange_max.text())
+        # 範囲外の点の扱いはgnuplotの細かな仕様に依存するため，固定した軸と自動スケールの軸が混在する場合は任せる
+        if any(fixed.values()) and not all(fixed.values()): return None
+        log = {"x": self.logscale_x_check.isChecked(), "y": self.logscale_y_check.isChecked(),
+               "y2": has_y2 and self.logscale_y2_check.isChecked(), "z": is_3d and self.logscale_z_check.isChecked(), "cb": False}
+        cb_fixed = self.colorbar_check.isChecked() and self.cbrange_check.isChecked() and bool(self.cbrange_min.text() and self.cbrange_max.text())
+
+        used_axes = set()
+        for p in self.plots:
+            used_axes.update(("x", "y", "z") if is_3d else ("x", "y2" if p.get("axis") == "y2" else "y"))
+        extents = {}
+        for plot_info in normals:
+            result = self.plot_extents(plot_info, log, wait)
+            if result is None: return None
+            for axis, (vmin, vmax) in result["ranges"].items():
+                lo, hi = extents.get(axis, (vmin, vmax))
+                extents[axis] = (min(lo, vmin), max(hi, vmax))
+        ranges = {}
+        for axis in ("x", "y", "y2", "z", "cb"):
+            if axis == "cb":
+                if cb_fixed or axis not in extents: continue
             else:
-                self.plot_label.setText("Failed to load image from Gnuplot.")
-        except Exception as e:
-            self.plot_label.setText(f"Runtime Error:\n{e}")
+                if axis not in used_axes or fixed.get(axis): continue
+                # モデルしか使っていない軸は，gnuplotに範囲を求めさせる
+                if axis not in extents: return None
+            ranges[axis] = extend_autoscale_range(*extents[axis], log=log[axis])
+        return ranges
+
+    def plot_extents(self, plot_info, log, wait=False):
+        """モデル以外のプロット一つについて，各軸（色はcb）に使われる値の最小・最大を集計する．集計中・集計できない場合はNone"""
+        is_3d = self.current_mode == '3d'
+        dims = 3 if is_3d else 2
+        axes = ["x", "y", "z"] if is_3d else ["x", "y2" if plot_info.get("axis") == "y2" else "y"]
+        # 追記され続けるファイルは毎回全体を集計し直すことになるため，gnuplotに範囲を求めさせる
+        # ヒストグラムの範囲は列の値ではなくビンの表で決まるため，これもgnuplotに任せる
+        if plot_info.get("tail", {}).get("enabled", False) or plot_info.get("is_histogram", False): return None
+        style_info = plot_info["style"]
+        style = style_info.get("style", "lines")
+        # impulsesは0からの線も描くため，データの範囲だけでは自動スケールと一致しない
+        if style == "impulses" and not plot_info.get("is_vector", False): return None
+        color_expr = style_info.get("color_expression", "") if style_info.get("color_from_value", False) else ""
+        if plot_info.get("is_vector", False):
+            # 矢印の先端まで範囲に含めるため，計算済みのベクトルの列から集計する
+            source = self.vector_source(plot_info)
+            if source is None: return None
+            ncols = len(source.using)
+            axis_exprs = {axis: [f"${i + 1}", f"${i + 1}+${i + 1 + dims}"] for i, axis in enumerate(axes)}
+            if ncols > 2 * dims: axis_exprs["cb"] = [f"${2 * dims + 1}"]
+            path, key_source = source.path, ("vector", source.path)
+            chunks = lambda: binary_file_chunks(path, ncols)
+        else:
+            columns = parse_using_columns(plot_info.get("using", ""))
+            if not columns or len(columns) < dims: return None
+            axis_exprs = {axis: [f"${c}"] for axis, c in zip(axes, columns)}
+            if color_expr: axis_exprs["cb"] = [color_expr]
+            elif is_3d and style == "pm3d": axis_exprs["cb"] = [f"${columns[2]}"]  # pm3dは色をzの値で決める
+            path = plot_info["path"]
+            try:
+                key_source = ("data", file_fingerprint(path))
+            except OSError:
+                return None
+            chunks = lambda: data_chunks(path)
+        log_axes = tuple(axis for axis in axis_exprs if log.get(axis))
+        key = ("extents", key_source, tuple((axis, tuple(exprs)) for axis, exprs in axis_exprs.items()), log_axes)
+        state, result = self.data_prep.lookup(key, lambda: compute_plot_extents(chunks(), axis_exprs, log_axes), wait=wait)
+        if state != "ready" or not result["rows"]: return None
+        return result
+
+    def update_tail_watch(self):
+        """ライブ表示がオンのプロットに合わせて監視するファイルを更新し，監視するファイルがあればタイマーを動かす"""
+        watched = {}
+        if np is not None:
+            for plot_info in self.plots:
+                tail = plot_info.get("tail", {})
+                if not tail.get("enabled", False): continue
+                key = (plot_info["path"], tail.get("window_rows", 0))
+                watched[key] = self.tail_buffers.get(key) or TailBuffer(*key)
+        added = watched.keys() - self.tail_buffers.keys()
+        self.tail_buffers = watched
+        if not watched:
+            self.tail_timer.stop()
+            return
+        if not self.tail_timer.isActive():
+            self.tail_timer.start(round(1000 / self.tail_fps_spinbox.value()))
+        if added: self.poll_tail_files()
+
+    def poll_tail_files(self):
+        """監視中のファイルへの追記をワーカースレッドで読み込む．前回の読み込みが終わっていなければ何もしない"""
+        if self.tail_future is not None and not self.tail_future.done(): return
+        self.tail_future = self.tail_executor.submit(poll_tail_buffers, list(self.tail_buffers.values()))
+        self.tail_future.add_done_callback(lambda f: self.tailUpdated.emit() if not f.cancelled() and f.result() else None)
+
+    def tail_source(self, plot_info):
+        """ライブ表示のプロットについて，追記分を読み込んだデータを返す
+
+        戻り値は (DataSourceまたはNone, 状態) で，ライブ表示でないプロットの状態はNoneです．
+        """
+        tail = plot_info.get("tail", {})
+        if np is None or not tail.get("enabled", False): return None, None
+        window = tail.get("window_rows", 0)
+        buffer = self.tail_buffers.get((plot_info["path"], window))
+        if buffer is None: return None, "pending"
+        polled, error, rows, ncols = buffer.snapshot()
+        if not polled: return None, "pending"
+        if error is not None: return None, "failed"
+        if not rows: return None, "ready"
+        note = f"Live: {rows:,} rows" + (f" (last {window:,})" if window else "")
+        return DataSource(buffer.out_path, binary=f'format="%{ncols}float64"', note=note, rows=rows), "ready"
+
+    def fixed_axis_range(self, axis):
+        """2Dの軸で範囲を固定していれば (最小, 最大) を返す（数値として読めない端はNone）．固定していなければNone"""
+        check, range_min, range_max = {
+            "x": (self.xrange_check, self.xrange_min, self.xrange_max),
+            "y": (self.yrange_check, self.yrange_min, self.yrange_max),
+            "y2": (self.y2range_check, self.y2range_min, self.y2range_max),
+        }[axis]
+        if not (check.isChecked() and range_min.text() and range_max.text()): return None
+        lo, hi = _parse_bound(range_min.text()), _parse_bound(range_max.text())
+        if lo is None and hi is None: return None
+        return (min(lo, hi), max(lo, hi)) if lo is not None and hi is not None else (lo, hi)  # 逆向きの軸も同じ範囲
+
+    def lod_source(self, plot_info, pixel_w, pixel_h):
+        """2Dの線・点のプロットで大きなファイルなら，ピクセル単位で間引いたデータを返す
+
+        戻り値は (DataSourceまたはNone, 状態) で，状態は "ready", "pending", "failed", None のいずれかです．
+        """
+        style_info = plot_info["style"]
+        style = style_info.get("style", "lines")
+        if np is None or self.current_mode != '2d' or plot_info.get("is_vector", False) or plot_info.get("is_histogram", False): return None, None
+        if style in ["lines", "linespoints", "steps", "impulses"]: mode = "envelope"
+        elif style in ["points", "dots"]: mode = "points"
+        else: return None, None
+        columns = parse_using_columns(plot_info.get("using", ""))
+        if not columns or len(columns) < 2: return None, None
+        if uses_row_number(style_info): return None, None
+        try:
+            fingerprint = file_fingerprint(plot_info["path"])
+        except OSError:
+            return None, None
+        if fingerprint[1] < LOD_MIN_FILE_BYTES: return None, None
+        # リサイズのたびに作り直さないよう，ピクセル数は2のべき乗に切り上げる
+        nx = 1 << max(0, pixel_w - 1).bit_length()
+        ny = (1 << max(0, pixel_h - 1).bit_length()) if mode == "points" else 1
+        log_x = self.logscale_x_check.isChecked()
+        log_y = self.logscale_y2_check.isChecked() if plot_info.get("axis") == "y2" else self.logscale_y_check.isChecked()
+        # 固定した表示範囲の外は描かれないので，範囲の中だけをピクセルに割り当てる
+        x_range = self.fixed_axis_range("x")
+        y_range = self.fixed_axis_range("y2" if plot_info.get("axis") == "y2" else "y") if mode == "points" else None
+        key = ("lod", fingerprint, columns[0], columns[1], mode, nx, ny, log_x, log_y, x_range, y_range)
+        out_path = cache_file_path("lod", key, "bin")
+        state, result = self.data_prep.lookup(key, lambda: build_lod_file(plot_info["path"], columns[0], columns[1], mode, nx, ny, log_x, log_y, out_path, x_range, y_range))
+        if state != "ready" or result["has_blocks"] or result["rows"] * 2 > result["total_rows"]:
+            return None, state
+        note = f"Preview decimated: {result['total_rows']:,} → {result['rows']:,} rows"
+        return DataSource(result["path"], binary=f'format="%{result["ncols"]}float64"', note=note, rows=result["rows"]), state
+
+    def interactive_source(self, plot_info):
+        """3Dの視点をドラッグしている間に使う，行と走査線を間引いたデータを返す（戻り値はlod_source()と同じ）"""
+        if plot_info.get("is_vector", False) or uses_row_number(plot_info["style"]): return None, None
+        path = plot_info["path"]
+        try:
+            fingerprint = file_fingerprint(path)
+        except OSError:
+            return None, None
+        if fingerprint[1] < INTERACTIVE_MIN_FILE_BYTES: return None, None
+        key = ("subsample", fingerprint, INTERACTIVE_MAX_ROWS)
+        out_path = cache_file_path("subsample", key, "dat")
+        state, result = self.data_prep.lookup(key, lambda: build_subsampled_file(path, INTERACTIVE_MAX_ROWS, out_path))
+        if state != "ready" or result["rows"] == result["total_rows"]:
+            return None, state
+        note = f"Rotating: {result['total_rows']:,} → {result['rows']:,} rows"
+        return DataSource(result["path"], note=note, rows=result["rows"], total_rows=result["total_rows"]), state
+
+    def on_preview_rendered(self, key, image, timings):
+        # 古くなった依頼の画像もキャッシュに入れておき，その設定に戻したときに使う
+        self.preview_cache.put(key, image)
+        if not self.view_dragging: self.redraw_debounce.record(sum(timings.values()))
+        if key != self.render_cache_key: return
+        self.redraw_trace.add_all(timings)
+        self.redraw_trace.info["rendered_layers"] = self.redraw_trace.info.get("rendered_layers", 0) + 1
+        self.render_layers(self.pending_layers)
+
+    def show_preview_image(self, image):
+        self.last_preview_image = image
+        self.plot_label.setToolTip(self.preview_cache.summary())
+        self.rescale_preview()
+
+    def rescale_preview(self):
+        """最後に描画した画像をラベルの大きさに合わせて表示する（gnuplotは呼ばない）
+
+        SVGのプレビュー（QSvgRenderer）はこの大きさで描き直すため常に鮮明です．
+        拡大表示中は，preview_centerを中心にpreview_zoom倍した範囲を切り出して表示します．
+        """
+        image = self.last_preview_image
+        if image is None: return
+        dpr = self.plot_label.devicePixelRatioF()
+        target_w, target_h = round(self.plot_label.width() * dpr), round(self.plot_label.height() * dpr)
+        if not isinstance(image, QImage) or self.preview_zoom != 1.0:
+            self.paint_preview(image, target_w, target_h, dpr)
+            return
+        pixmap = QPixmap.fromImage(image)
+        # ラベルの大きさで描画した画像はそのまま表示し，それ以外（リサイズ中など）だけ拡大縮小する
+        fits = (abs(pixmap.width() - target_w) <= 1 and pixmap.height() <= target_h + 1) or (abs(pixmap.height() - target_h) <= 1 and pixmap.width() <= target_w + 1)
+        if not fits and target_w > 0 and target_h > 0:
+            pixmap = pixmap.scaled(target_w, target_h, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        pixmap.setDevicePixelRatio(dpr)
+        self.plot_label.setPixmap(pixmap)
+
+    def paint_preview(self, image, target_w, target_h, dpr):
+        size = image.size() if isinstance(image, QImage) else image.defaultSize()
+        if size.width() <= 0 or size.height() <= 0 or target_w <= 0 or target_h <= 0: return
+        scale = min(target_w / size.width(), target_h / size.height())
+        fit_w, fit_h = max(1, round(size.width() * scale)), max(1, round(size.height() * scale))
+        canvas = QImage(fit_w, fit_h, QImage.Format_ARGB32_Premultiplied)
+        canvas.fill(Qt.white)
+        zoom, (cx, cy) = self.preview_zoom, self.preview_center
+        target = QRectF(fit_w / 2 - cx * fit_w * zoom, fit_h / 2 - cy * fit_h * zoom, fit_w * zoom, fit_h * zoom)
+        painter = QPainter(canvas)
+        if isinstance(image, QImage):
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawImage(target, image)
+        else:
+            image.render(painter, target)
+        painter.end()
+        pixmap = QPixmap.fromImage(canvas)
+        pixmap.setDevicePixelRatio(dpr)
+        self.plot_label.setPixmap(pixmap)
+
+    def zoom_preview(self, factor, pos):
+        """プレビューを拡大・縮小する．posはラベル上のカーソルの位置で，その下の点が動かないように中心をずらす"""
+        pixmap = self.plot_label.pixmap()
+        if pixmap is None or pixmap.isNull(): return
+        w, h = pixmap.width() / pixmap.devicePixelRatio(), pixmap.height() / pixmap.devicePixelRatio()
+        # 表示の中心からのカーソルの位置（表示の幅・高さを1とする）
+        u = (pos.x() - (self.plot_label.width() - w) / 2) / w - 0.5
+        v = (pos.y() - (self.plot_label.height() - h) / 2) / h - 0.5
+        zoom = min(32.0, max(1.0, self.preview_zoom * factor))
+        cx, cy = self.preview_center
+        px, py = cx + u / self.preview_zoom, cy + v / self.preview_zoom
+        half = 0.5 / zoom
+        self.preview_zoom = zoom
+        self.preview_center = (min(max(px - u / zoom, half), 1 - half), min(max(py - v / zoom, half), 1 - half))
+        self.rescale_preview()
+
+    def eventFilter(self, obj, event):
+        # プレビューのホイールで拡大・縮小し，ダブルクリックで元の大きさに戻す
+        if obj is self.plot_label and self.last_preview_image is not None:
+            if event.type() == QEvent.Wheel:
+                self.zoom_preview(1.25 ** (event.angleDelta().y() / 120), event.position())
+                return True
+            if event.type() == QEvent.MouseButtonDblClick:
+                self.preview_zoom, self.preview_center = 1.0, (0.5, 0.5)
+                self.rescale_preview()
+                return True
+        return super().eventFilter(obj, event)
+
+    def on_preview_failed(self, key, message):
+        if key != self.render_cache_key: return
+        self.plot_label.setText(message)
+        self.finish_trace(self.redraw_trace, error=message)
 
     def save_image(self, *args, **kwargs):
         if not self.plots:
@@ -1106,27 +4221,36 @@ class GnuplotGUIY2Axis(QMainWindow):
         file_name, selected_filter = QFileDialog.getSaveFileName(self, "Save Graph As", "", "PNG Image (*.png);;SVG Image (*.svg);;PDF Document (*.pdf)")
         if not file_name:
             return
+        fmt = "svg" if "svg" in selected_filter else "pdf" if "pdf" in selected_filter else "png"
+        try:
+            if not self.write_image(file_name, fmt):
+                QMessageBox.critical(self, "Error", "Failed to generate script.")
+                return
+            QMessageBox.information(self, "Success", f"Graph saved to {file_name}")
+        except GnuplotError as e:
+            QMessageBox.critical(self, "Gnuplot Error", f"Failed to save graph.\n\n{e}")
+        except Exception as e:
+            QMessageBox.critical(self, "Runtime Error", f"An error occurred.\n\n{e}")
+
+    def write_image(self, file_name, fmt):
+        """現在のグラフを全データで描画してfile_nameに保存する．プロットが無ければFalseを返す"""
+        trace = RenderTrace("save", format=fmt, output=file_name)
         width, height = int(self.width_input.text() or "800"), int(self.height_input.text() or "600")
         font = f'font "{self.font_combo.currentText()},{self.font_slider.value()}"'
-        if "svg" in selected_filter:
-            term_cmd = f'set terminal svg size {width},{height} {font}'
-        elif "pdf" in selected_filter:
-            term_cmd = f'set terminal pdfcairo size {width/100.0:.2f},{height/100.0:.2f} {font}'
-        else:
-            term_cmd = f'set terminal pngcairo size {width},{height} enhanced {font}'
-        script = self.generate_gnuplot_script(output_path=file_name, terminal_cmd=term_cmd)
-        if not script:
-            QMessageBox.critical(self, "Error", "Failed to generate script.")
-            return
+        term_cmd = export_terminal_cmd(fmt, width, height, font)
+        script = self.generate_gnuplot_script(output_path=file_name, terminal_cmd=term_cmd, data_sources=self.render_data_sources(), overlay_ranges=self.overlay_ranges(wait=True))
+        if not script: return False
+        trace.mark("script")
+        timings, error = {}, None
         try:
-            process = subprocess.Popen(['gnuplot'], stdin=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW)
-            _, stderr = process.communicate(script)
-            if process.returncode == 0:
-                QMessageBox.information(self, "Success", f"Graph saved to {file_name}")
-            else:
-                QMessageBox.critical(self, "Gnuplot Error", f"Failed to save graph.\n\n{stderr}")
+            self.gnuplot.run(script, timings)
         except Exception as e:
-            QMessageBox.critical(self, "Runtime Error", f"An error occurred.\n\n{e}")
+            error = str(e).strip() or type(e).__name__
+            raise
+        finally:
+            trace.add_all(timings)
+            self.finish_trace(trace, error=error)
+        return True
 
     def save_gp_file(self, *args, **kwargs):
         if not self.plots:
@@ -1212,11 +4336,15 @@ class GnuplotGUIY2Axis(QMainWindow):
             QMessageBox.critical(self, "Error", f"Failed to save C source file.\n\n{e}")
 
     def export_project(self):
-        """現在の設定からPNG, GP, Cファイルを一括でフォルダに保存する"""
+        """現在の設定からPNG, SVG, PDF, GP, Cファイルを一括でフォルダに保存する
+
+        画像はgnuplotのプールで並列に描画し，その間にGP, Cファイルを書き出します．
+        進み具合はプログレスダイアログに表示し，終わったら形式ごとの結果をまとめて表示します．
+        """
         if not self.plots:
             QMessageBox.warning(self, "Warning", "No plot data to export.")
             return
-            
+
         base_dir = QFileDialog.getExistingDirectory(self, "Select Directory to Save Project Folder")
         if not base_dir:
             return
@@ -1224,22 +4352,41 @@ class GnuplotGUIY2Axis(QMainWindow):
         project_name, ok = QInputDialog.getText(self, "Export Project", "Enter a project name (for folder and files):", text="my_plot_project")
         if not ok or not project_name:
             return
+        self.start_export(base_dir, project_name)
 
+    def start_export(self, base_dir, project_name):
+        if self.export_state is not None:
+            QMessageBox.warning(self, "Warning", "An export is already running.")
+            return
         project_path = os.path.join(base_dir, project_name)
-        
         try:
             os.makedirs(project_path, exist_ok=True)
-            
-            # --- 1. PNGを保存 ---
-            png_path = os.path.join(project_path, project_name + ".png").replace('\\', '/')
-            width, height = int(self.width_input.text() or "800"), int(self.height_input.text() or "600")
-            font = f'font "{self.font_combo.currentText()},{self.font_slider.value()}"'
-            term_cmd = f'set terminal pngcairo size {width},{height} enhanced {font}'
-            script = self.generate_gnuplot_script(output_path=png_path, terminal_cmd=term_cmd)
-            process = subprocess.Popen(['gnuplot'], stdin=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', creationflags=CREATE_NO_WINDOW)
-            _, stderr = process.communicate(script)
-            if process.returncode != 0: raise Exception(f"Gnuplot error for PNG:\n{stderr}")
+        except OSError as e:
+            QMessageBox.critical(self, "Export Error", f"An error occurred during export.\n\n{e}")
+            return
 
+        # --- 1. 画像（PNG, SVG, PDFと高解像度のPNG）の描画をプールに投げる ---
+        trace = RenderTrace("export", project=project_name)
+        width, height = int(self.width_input.text() or "800"), int(self.height_input.text() or "600")
+        font = f'font "{self.font_combo.currentText()},{self.font_slider.value()}"'
+        term_cmd = export_terminal_cmd("png", width, height, font)
+        targets = [("PNG", "png", 1.0, project_name + ".png"), ("SVG", "svg", 1.0, project_name + ".svg"), ("PDF", "pdf", 1.0, project_name + ".pdf")]
+        targets += [(f"PNG x{k:g}", "png", k, f"{project_name}@{k:g}x.png") for k in parse_export_scales(self.export_scales_input.text())]
+        data_sources, ranges = self.render_data_sources(), self.overlay_ranges(wait=True)
+        if self.export_pool is None: self.export_pool = GnuplotWorkerPool()
+        jobs, finished_at = [], []
+        for label, fmt, scale, file_name in targets:
+            out_path = os.path.join(project_path, file_name).replace('\\', '/')
+            script = self.generate_gnuplot_script(output_path=out_path, terminal_cmd=export_terminal_cmd(fmt, width, height, font, scale), data_sources=data_sources, overlay_ranges=ranges)
+            timings = {}
+            future = self.export_pool.submit(script, timings)
+            future.add_done_callback(lambda _: finished_at.append(time.perf_counter()))
+            jobs.append((label, future, timings))
+        trace.mark("script")
+        render_started = time.perf_counter()
+
+        errors = []
+        try:
             # --- 2. GPファイルを保存 ---
             gp_path = os.path.join(project_path, project_name + ".gp")
             base_script_gp = self.generate_gnuplot_script()
@@ -1273,11 +4420,50 @@ class GnuplotGUIY2Axis(QMainWindow):
                 '', '    pclose(gp);', '', f'    printf("Graph saved to {gnuplot_output_path.replace("\\\\", "/")}\\n");', '', '    return 0;', '}'
             ])
             with open(c_path, 'w', encoding='utf-8') as f: f.write("\n".join(c_code_parts))
-            
-            QMessageBox.information(self, "Export Successful", f"Project '{project_name}' was successfully exported to:\n{base_dir}")
-
         except Exception as e:
-            QMessageBox.critical(self, "Export Error", f"An error occurred during export.\n\n{e}")
+            errors.append(f"GP/C: {e}")
+        trace.mark("files")
+
+        # --- 4. 描画が終わるまでプログレスダイアログを表示する ---
+        dialog = QProgressDialog("Rendering images...", "Cancel", 0, len(jobs), self)
+        dialog.setWindowTitle("Export Project")
+        dialog.setMinimumDuration(0)
+        dialog.canceled.connect(self.cancel_export)
+        self.export_state = {"name": project_name, "base_dir": base_dir, "jobs": jobs, "errors": errors, "dialog": dialog, "trace": trace, "render_started": render_started, "finished_at": finished_at}
+        self.export_timer.start()
+
+    def cancel_export(self):
+        # まだ始まっていない描画だけを取り消し，描画中のものは終わるのを待つ
+        if self.export_state is None: return
+        for _, future, _ in self.export_state["jobs"]: future.cancel()
+
+    def poll_export(self):
+        state = self.export_state
+        if state is None:
+            self.export_timer.stop()
+            return
+        jobs = state["jobs"]
+        done = sum(future.done() for _, future, _ in jobs)
+        dialog = state["dialog"]
+        if not dialog.wasCanceled(): dialog.setValue(done)
+        if done < len(jobs): return
+        self.export_timer.stop()
+        self.export_state = None
+        dialog.canceled.disconnect(self.cancel_export)
+        dialog.close()
+        errors = list(state["errors"])
+        for label, future, _ in jobs:
+            if future.cancelled(): errors.append(f"{label}: cancelled")
+            elif future.exception() is not None: errors.append(f"{label}: {future.exception()}")
+        # "render" は投げてから全部の描画が終わるまでの時間（GP, Cファイルの書き出しと重なる）
+        trace = state["trace"]
+        trace.add("render", max(state["finished_at"], default=state["render_started"]) - state["render_started"])
+        outputs = {label: {name: round(seconds * 1000, 3) for name, seconds in timings.items()} for label, _, timings in jobs}
+        self.finish_trace(trace, outputs=outputs, error="; ".join(errors) or None)
+        if errors:
+            QMessageBox.warning(self, "Export Error", f"Project '{state['name']}' was exported to:\n{state['base_dir']}\n\nThe following outputs failed:\n" + "\n\n".join(errors))
+        else:
+            QMessageBox.information(self, "Export Successful", f"Project '{state['name']}' was successfully exported to:\n{state['base_dir']}")
 
     def collect_settings(self, *args, **kwargs):
         settings = {
@@ -1288,18 +4474,17 @@ class GnuplotGUIY2Axis(QMainWindow):
             'xaxis': {'label': self.xlabel_input.text(), 'range_check': self.xrange_check.isChecked(), 'range_min': self.xrange_min.text(), 'range_max': self.xrange_max.text(), 'tics_check': self.xtics_check.isChecked(), 'tics_xoffset': self.xtics_xoffset.text(), 'tics_yoffset': self.xtics_yoffset.text(), 'log_check': self.logscale_x_check.isChecked(), 'grid_check': self.grid_check.isChecked()},
             'yaxis': {'label': self.ylabel_input.text(), 'range_check': self.yrange_check.isChecked(), 'range_min': self.yrange_min.text(), 'range_max': self.yrange_max.text(), 'tics_check': self.ytics_check.isChecked(), 'tics_xoffset': self.ytics_xoffset.text(), 'tics_yoffset': self.ytics_yoffset.text(), 'log_check': self.logscale_y_check.isChecked()},
             'y2axis': {'label': self.y2label_input.text(), 'range_check': self.y2range_check.isChecked(), 'range_min': self.y2range_min.text(), 'range_max': self.y2range_max.text(), 'tics_check': self.y2tics_offset_check.isChecked(), 'tics_xoffset': self.y2tics_xoffset.text(), 'tics_yoffset': self.y2tics_yoffset.text(), 'log_check': self.logscale_y2_check.isChecked()},
-            'zaxis': {'label': self.zlabel_input.text(), 'range_check': self.zrange_check.isChecked(), 'range_min': self.zrange_min.text(), 'range_max': self.zrange_max.text(), 'tics_check': self.ztics_check.isChecked(), 'tics_xoffset': self.ztics_xoffset.text(), 'tics_yoffset': self.ztics_yoffset.text(), 'log_check': self.logscale_z_check.isChecked()},
-            'view3d': {'rot_x': self.view_rot_x_slider.value(), 'rot_z': self.view_rot_z_slider.value(), 'pm3d_check': self.pm3d_check.isChecked(), 'xyplane_check': self.xyplane_check.isChecked(), 'xyplane_value': self.xyplane_input.text()}, # Added xyplane
-            'output': {'width': self.width_input.text(), 'height': self.height_input.text(), 'font_name': self.font_combo.currentText(), 'font_size': self.font_slider.value()},
+            **self.collect_3d_settings(),
+            'output': {'width': self.width_input.text(), 'height': self.height_input.text(), 'font_name': self.font_combo.currentText(), 'font_size': self.font_slider.value(), 'tail_fps': self.tail_fps_spinbox.value(), 'export_scales': self.export_scales_input.text(), 'svg_preview': self.svg_preview_check.isChecked()},
             'colorbar': {'check': self.colorbar_check.isChecked(), 'label': self.cblabel_input.text(), 'format_10_power': self.cb_format_10_power_check.isChecked(), 'range_check': self.cbrange_check.isChecked(), 'range_min': self.cbrange_min.text(), 'range_max': self.cbrange_max.text(), 'size_check': self.cbsize_check.isChecked(), 'origin_x': self.cb_origin_x_spinbox.value(), 'origin_y': self.cb_origin_y_spinbox.value(), 'size_w': self.cb_size_w_spinbox.value(), 'size_h': self.cb_size_h_spinbox.value()}
         }
         return settings
 
     def apply_settings(self, settings):
         self.clear_all_plots()
-        all_widgets = self.findChildren(QWidget)
-        for widget in all_widgets: widget.blockSignals(True)
-        try:
+        if settings.get('plot_mode', 0) == 1: self.ensure_3d_panels()
+        # 値を入れる間はウィジェットのシグナルをまとめて止める（プロットの編集画面はまだ無いので数は変わらない）
+        with blocked_signals(self.findChildren(QWidget)):
             self.plot_mode_combo.setCurrentIndex(settings.get('plot_mode', 0))
             is_3d = self.plot_mode_combo.currentIndex() == 1
             self.current_mode = "3d" if is_3d else "2d"
@@ -1313,19 +4498,18 @@ class GnuplotGUIY2Axis(QMainWindow):
             s = settings.get('xaxis', {}); self.xlabel_input.setText(s.get('label', 'X-Axis')); self.xrange_check.setChecked(s.get('range_check', False)); self.xrange_min.setText(s.get('range_min', '')); self.xrange_max.setText(s.get('range_max', '')); self.xtics_check.setChecked(s.get('tics_check', False)); self.xtics_xoffset.setText(s.get('tics_xoffset', '0')); self.xtics_yoffset.setText(s.get('tics_yoffset', '-1')); self.logscale_x_check.setChecked(s.get('log_check', False)); self.grid_check.setChecked(s.get('grid_check', False))
             s = settings.get('yaxis', {}); self.ylabel_input.setText(s.get('label', 'Y-Axis')); self.yrange_check.setChecked(s.get('range_check', False)); self.yrange_min.setText(s.get('range_min', '')); self.yrange_max.setText(s.get('range_max', '')); self.ytics_check.setChecked(s.get('tics_check', False)); self.ytics_xoffset.setText(s.get('tics_xoffset', '-1')); self.ytics_yoffset.setText(s.get('tics_yoffset', '0')); self.logscale_y_check.setChecked(s.get('log_check', False))
             s = settings.get('y2axis', {}); self.y2label_input.setText(s.get('label', 'Y2-Axis')); self.y2range_check.setChecked(s.get('range_check', False)); self.y2range_min.setText(s.get('range_min', '')); self.y2range_max.setText(s.get('range_max', '')); self.y2tics_offset_check.setChecked(s.get('tics_check', False)); self.y2tics_xoffset.setText(s.get('tics_xoffset', '1')); self.y2tics_yoffset.setText(s.get('tics_yoffset', '0')); self.logscale_y2_check.setChecked(s.get('log_check', False))
-            s = settings.get('zaxis', {}); self.zlabel_input.setText(s.get('label', 'Z-Axis')); self.zrange_check.setChecked(s.get('range_check', False)); self.zrange_min.setText(s.get('range_min', '')); self.zrange_max.setText(s.get('range_max', '')); self.ztics_check.setChecked(s.get('tics_check', False)); self.ztics_xoffset.setText(s.get('tics_xoffset', '0')); self.ztics_yoffset.setText(s.get('tics_yoffset', '0')); self.logscale_z_check.setChecked(s.get('log_check', False))
-            s = settings.get('view3d', {}); self.view_rot_x_slider.setValue(s.get('rot_x', 60)); self.view_rot_z_slider.setValue(s.get('rot_z', 30)); self.pm3d_check.setChecked(s.get('pm3d_check', True)); self.xyplane_check.setChecked(s.get('xyplane_check', False)); self.xyplane_input.setText(s.get('xyplane_value', '0')); self.xyplane_input.setEnabled(self.xyplane_check.isChecked()) # Added xyplane
-            s = settings.get('output', {}); self.width_input.setText(s.get('width', '800')); self.height_input.setText(s.get('height', '600')); self.font_combo.setCurrentText(s.get('font_name', 'Times New Roman')); self.font_slider.setValue(s.get('font_size', 14))
+            self.apply_3d_settings(settings)
+            s = settings.get('output', {}); self.width_input.setText(s.get('width', '800')); self.height_input.setText(s.get('height', '600')); self.font_combo.setCurrentText(s.get('font_name', 'Times New Roman')); self.font_slider.setValue(s.get('font_size', 14)); self.tail_fps_spinbox.setValue(s.get('tail_fps', 5)); self.export_scales_input.setText(s.get('export_scales', '')); self.svg_preview_check.setChecked(s.get('svg_preview', False))
             s = settings.get('colorbar', {}); self.colorbar_check.setChecked(s.get('check', True)); self.cblabel_input.setText(s.get('label', 'Magnitude')); self.cb_format_10_power_check.setChecked(s.get('format_10_power', False)); self.cbrange_check.setChecked(s.get('range_check', False)); self.cbrange_min.setText(s.get('range_min', '')); self.cbrange_max.setText(s.get('range_max', '')); self.cbsize_check.setChecked(s.get('size_check', False)); self.cb_origin_x_spinbox.setValue(s.get('origin_x', 0.92)); self.cb_origin_y_spinbox.setValue(s.get('origin_y', 0.1)); self.cb_size_w_spinbox.setValue(s.get('size_w', 0.04)); self.cb_size_h_spinbox.setValue(s.get('size_h', 0.8)); self.toggle_colorbar_options()
-            loaded_plots = settings.get('plots', [])
-            for i, plot_info in enumerate(loaded_plots):
+            for plot_info in settings.get('plots', []):
                 self.plots.append(plot_info)
-                editor = PlotEditorWidget(plot_info, self.dashtype_map)
-                editor.plotChanged.connect(self.request_redraw)
-                editor.titleChanged.connect(lambda title, idx=i: self.plot_tabs.setTabText(idx, title))
-                self.plot_tabs.addTab(editor, plot_info["title"])
-        finally:
-            for widget in self.findChildren(QWidget): widget.blockSignals(False)
+                self.start_data_prep(plot_info)
+            self.plot_list.addItems([plot_info["title"] for plot_info in self.plots])
+            self.filter_plot_list()
+            self.plot_list.setCurrentRow(0 if self.plots else -1)
+        self.show_plot_editor(self.plot_list.currentRow())
+        self.invalidate_axis_stats()
+        self.mark_sections_dirty()  # シグナルを止めて値を変えたため，すべてのセクションを作り直す
         self.request_redraw()
 
     def save_settings(self, *args, **kwargs):
@@ -1350,17 +4534,353 @@ class GnuplotGUIY2Axis(QMainWindow):
         except Exception as e: QMessageBox.critical(self, "Error", f"Failed to load settings file.\n\n{e}")
 
     def clear_all_plots(self, *args, **kwargs):
-        self.plot_tabs.blockSignals(True)
-        while self.plot_tabs.count() > 0: self.plot_tabs.removeTab(0)
+        with blocked_signals([self.plot_list]):
+            self.plot_list.clear()
         self.plots.clear()
-        self.plot_tabs.blockSignals(False)
+        self.preview_notes.clear()
+        self.invalidate_axis_stats()
+        self.show_plot_editor(-1)
+        # 描画にかかる時間はプロジェクトごとに違うため，待ち時間は測り直す
+        self.redraw_debounce.reset()
+
+    def closeEvent(self, event):
+        self.tail_timer.stop()
+        self.tail_executor.shutdown(wait=False, cancel_futures=True)
+        self.export_timer.stop()
+        if self.export_pool is not None: self.export_pool.shutdown()
+        self.data_prep.shutdown()
+        self.column_stats.shutdown()
+        self.render_thread.stop()
+        self.gnuplot.stop()
+        super().closeEvent(event)
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        if self.plots: self.request_redraw()
+        # リサイズ中は手元の画像を拡大縮小するだけにし，止まってからラベルの大きさで描き直す
+        # SVGのプレビューは大きさによらないため描き直さない
+        self.rescale_preview()
+        if self.plots and not (QSvgRenderer is not None and isinstance(self.last_preview_image, QSvgRenderer)): self.request_redraw()
+
+def load_settings_file(path):
+    """save_settings() で保存した設定ファイルを読み込む
+
+    足りない項目は既定値で補い，相対パスのデータファイルは設定ファイルのフォルダから探すようにします．
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        settings = normalize_settings(json.load(f))
+    base_dir = os.path.dirname(os.path.abspath(path))
+    settings['plots'] = [dict(p, path=os.path.join(base_dir, p['path']).replace('\\', '/') if not os.path.isabs(p['path']) else p['path']) for p in settings['plots']]
+    return settings
+
+
+def settings_data_sources(settings):
+    """GUIを使わずに描画するとき，Grid Dataの格子とヒストグラムのビンの表を作って返す（script_from_settings()のdata_sources）
+
+    どちらのプロットも無ければNoneを返します．作った格子と表はGUIと同じキャッシュに置かれます．
+    NumPyが無い場合，ヒストグラムはgnuplotのbinsで数えさせます．
+    """
+    mode = settings_mode(settings)
+    grids = [gridding_options(p, mode) for p in settings['plots']]
+    histograms = [histogram_options(p, mode) for p in settings['plots']]
+    if not any(grids) and not any(histograms): return None
+    if load_numpy() is None:
+        if any(grids): raise ValueError("Grid Data needs NumPy.")
+        return None
+    sources = []
+    for plot_info, grid, histogram in zip(settings['plots'], grids, histograms):
+        path = plot_info["path"]
+        if grid is not None:
+            columns, resolution = grid
+            out_path = cache_file_path("grid", grid_cache_key(path, columns, resolution), "bin")
+            sources.append(grid_data_source(build_grid_file(path, columns, resolution, out_path)))
+        elif histogram is not None:
+            column, hist = histogram
+            values_meta = build_sorted_values(path, column, cache_file_path("values", histogram_values_key(path, column), "bin"))
+            out_path = cache_file_path("histogram", histogram_cache_key(path, column, hist), "bin")
+            sources.append(histogram_data_source(build_histogram_file(path, column, hist, values_meta, out_path), plot_info["style"]))
+        else:
+            sources.append(None)
+    return sources
+
+
+def settings_terminal_cmd(settings, fmt):
+    out = settings['output']
+    width, height = int(out['width'] or "800"), int(out['height'] or "600")
+    return export_terminal_cmd(fmt, width, height, f'font "{out["font_name"]},{out["font_size"]}"')
+
+
+def render_settings_files(paths, formats=("png",), output_dir=None, jobs=None, executable="gnuplot"):
+    """save_settings() で保存した設定ファイルを，GUIを起動せずに画像にする
+
+    GUIと同じscript_from_settings()でスクリプトを作り，GnuplotWorkerPoolで並列に描画します．
+    出力は output_dir（省略時は設定ファイルと同じフォルダ）の「設定ファイル名.形式」です．
+    output_dirに同じ名前の設定ファイルが集まる場合（a/report.json と b/report.json など）は，
+    sweep_output_stems() と同じく共通のフォルダからの相対パスを "_" でつないだ名前にします．
+    それでも出力が重なる場合（同じ設定ファイルを2回指定したなど）は，2つ目以降を描画せずエラーにします．
+    設定ファイル内の相対パスのデータファイルは，設定ファイルのフォルダから探します．
+    戻り値は出力ごとの結果（settings, format, output, script_seconds, render_seconds, error）のリストです．
+    """
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    if output_dir and len(set(stems)) < len(stems): stems = sweep_output_stems(paths)
+    pool = GnuplotWorkerPool(jobs, executable)
+    results, futures, written = [], [], {}
+    try:
+        for path, stem in zip(paths, stems):
+            start = time.perf_counter()
+            try:
+                settings = load_settings_file(path)
+                data_sources = settings_data_sources(settings)
+            except (OSError, ValueError) as e:
+                results.append({"settings": path, "format": "-", "output": None, "script_seconds": 0.0, "render_seconds": None, "error": str(e)})
+                continue
+            base_dir = os.path.dirname(os.path.abspath(path))
+            for fmt in formats:
+                start = time.perf_counter()
+                output = os.path.join(output_dir or base_dir, f"{stem}.{fmt}").replace('\\', '/')
+                key = os.path.normcase(os.path.abspath(output))
+                if key in written:
+                    results.append({"settings": path, "format": fmt, "output": output, "script_seconds": 0.0, "render_seconds": None,
+                                    "error": f"Output path is also written by {written[key]}."})
+                    continue
+                written[key] = path
+                script = script_from_settings(settings, output_path=output, terminal_cmd=settings_terminal_cmd(settings, fmt), data_sources=data_sources)
+                record = {"settings": path, "format": fmt, "output": output, "script_seconds": time.perf_counter() - start, "render_seconds": None, "error": None}
+                results.append(record)
+                if script is None:
+                    record["error"] = "No plots in the settings file."
+                    continue
+                futures.append((record, pool.submit(str(script))))
+        for record, future in futures:
+            try:
+                record["render_seconds"] = future.result()
+            except Exception as e:
+                record["error"] = str(e).strip() or type(e).__name__
+    finally:
+        pool.shutdown()
+    return results
+
+
+def cli_render(argv):
+    """`GuiNUPLOT.py render 設定.json ...` の処理．すべて描画できれば0を返す"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="GuiNUPLOT.py render", description="Render saved GUInuplot settings files without opening the GUI.")
+    parser.add_argument("settings", nargs="+", help="settings JSON files saved with 'Save Settings'")
+    parser.add_argument("-f", "--format", action="append", choices=["png", "svg", "pdf"], help="output format (repeatable, default: png)")
+    parser.add_argument("-o", "--output-dir", help="directory for the images (default: next to each settings file)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of gnuplot processes (default: CPU cores)")
+    parser.add_argument("--gnuplot", default="gnuplot", help="gnuplot executable")
+    args = parser.parse_args(argv)
+    if args.output_dir: os.makedirs(args.output_dir, exist_ok=True)
+    pool_size = args.jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    results = render_settings_files(args.settings, args.format or ["png"], args.output_dir, pool_size, args.gnuplot)
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if r["error"]]
+    for r in results:
+        if r["error"]:
+            print(f"  FAILED    {r['settings']} [{r['format']}]: {r['error']}")
+        else:
+            print(f"  {r['render_seconds']:7.3f} s  {r['settings']} -> {r['output']}  (script {r['script_seconds'] * 1000:.1f} ms)")
+    total_render = sum(r["render_seconds"] or 0.0 for r in results)
+    print(f"Rendered {len(results) - len(failed)}/{len(results)} outputs with {pool_size} gnuplot workers in {elapsed:.2f} s (sum of render times {total_render:.2f} s)")
+    sweep_cache_dir()
+    return 1 if failed else 0
+
+
+SWEEP_MANIFEST = ".guinuplot-sweep.json"
+
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sweep_output_stems(data_files):
+    """データファイルごとの出力名
+
+    run001/out.dat, run002/out.dat のように同じ名前のファイルも区別できるよう，
+    2つ以上のときは共通のフォルダからの相対パスを "_" でつないだ名前にします．
+    """
+    paths = [os.path.abspath(p) for p in data_files]
+    if len(paths) == 1: return [os.path.splitext(os.path.basename(paths[0]))[0]]
+    root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    return [os.path.splitext(os.path.relpath(p, root))[0].replace(os.sep, '_').replace('/', '_') for p in paths]
+
+
+def sweep_settings_file(settings_path, data_files, plot_indices=None, formats=("png",), output_dir=None, jobs=None, executable="gnuplot", force=False):
+    """1つの設定ファイルを，plotsの一部のデータファイルだけ差し替えて多数のファイルに適用し，並列に描画する
+
+    plot_indices で差し替えるプロットを選びます（省略時はモデル以外のすべてのプロット）．
+    出力は output_dir（省略時は設定ファイルと同じフォルダ）の「データファイル名.形式」です．
+    前回の結果は output_dir の SWEEP_MANIFEST に記録し，スクリプトと入力ファイルが変わらず画像も残っているものは
+    描き直しません．入力ファイルは更新時刻とサイズで比べ，更新時刻だけが変わったときは内容のハッシュで比べます．
+    戻り値は出力ごとの結果（data, format, output, status, render_seconds, error）のリストで，
+    statusは "rendered", "skipped", "failed" のいずれかです．
+    """
+    settings = load_settings_file(settings_path)
+    if plot_indices is None:
+        plot_indices = [i for i, p in enumerate(settings['plots']) if not p.get('is_model_mode')]
+    invalid = [i for i in plot_indices if not 0 <= i < len(settings['plots'])]
+    if invalid: raise ValueError(f"The settings file has only {len(settings['plots'])} plots.")
+    output_dir = os.path.abspath(output_dir or os.path.dirname(os.path.abspath(settings_path)))
+    manifest_path = os.path.join(output_dir, SWEEP_MANIFEST)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f: manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    stats, hashes = {}, {}
+
+    def stat(path):
+        if path not in stats:
+            try:
+                st = os.stat(path)
+                stats[path] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+            except OSError:
+                stats[path] = None
+        return stats[path]
+
+    def content_hash(path):
+        if path not in hashes:
+            try: hashes[path] = file_content_hash(path)
+            except OSError: hashes[path] = None
+        return hashes[path]
+
+    def unchanged(path, previous):
+        current = stat(path)
+        if current is None or previous is None or current["size"] != previous.get("size"): return False
+        return current["mtime_ns"] == previous.get("mtime_ns") or content_hash(path) == previous.get("sha1")
+
+    def input_states(paths, previous):
+        # 前回と更新時刻が同じファイルは，記録してあるハッシュをそのまま使う
+        states = {}
+        for path in paths:
+            current, old = stat(path), previous.get(path, {})
+            if current is None: return None
+            digest = old.get("sha1") if current["mtime_ns"] == old.get("mtime_ns") and current["size"] == old.get("size") else content_hash(path)
+            if digest is None: return None
+            states[path] = dict(current, sha1=digest)
+        return states
+
+    data_files = list(dict.fromkeys(os.path.abspath(p).replace('\\', '/') for p in data_files))
+    pool = GnuplotWorkerPool(jobs, executable)
+    results, pending = [], []
+    try:
+        for data_file, stem in zip(data_files, sweep_output_stems(data_files)):
+            variant = dict(settings, plots=[dict(p, path=data_file) if i in plot_indices else p for i, p in enumerate(settings['plots'])])
+            inputs = list(dict.fromkeys(p['path'] for p in variant['plots']))
+            try:
+                data_sources, source_error = settings_data_sources(variant), None
+            except (OSError, ValueError) as e:
+                data_sources, source_error = None, str(e)
+            for fmt in formats:
+                output = os.path.join(output_dir, f"{stem}.{fmt}").replace('\\', '/')
+                record = {"data": data_file, "format": fmt, "output": output, "status": "failed", "render_seconds": None, "error": source_error}
+                results.append(record)
+                if source_error: continue
+                script = script_from_settings(variant, output_path=output, terminal_cmd=settings_terminal_cmd(variant, fmt), data_sources=data_sources)
+                if script is None:
+                    record["error"] = "No plots in the settings file."
+                    continue
+                script_hash = hashlib.sha1(str(script).encode('utf-8')).hexdigest()
+                previous = manifest.get(output, {})
+                if (not force and previous.get("script") == script_hash and os.path.exists(output)
+                        and all(unchanged(path, previous.get("inputs", {}).get(path)) for path in inputs)):
+                    record["status"] = "skipped"
+                    continue
+                pending.append((record, script_hash, inputs, previous, pool.submit(str(script))))
+        # 描画を待つ間に，描き直すものの入力ファイルのハッシュを計算しておく
+        states = [input_states(inputs, previous.get("inputs", {})) for _, _, inputs, previous, _ in pending]
+        for (record, script_hash, inputs, previous, future), state in zip(pending, states):
+            manifest.pop(record["output"], None)
+            try:
+                record["render_seconds"] = future.result()
+            except Exception as e:
+                record["error"] = str(e).strip() or type(e).__name__
+                continue
+            record["status"] = "rendered"
+            if state is not None: manifest[record["output"]] = {"script": script_hash, "inputs": state}
+    finally:
+        pool.shutdown()
+    # 更新時刻だけが変わって描き直さなかった入力も，次回ハッシュを計算せずに済むよう記録し直す
+    for record in results:
+        entry = manifest.get(record["output"])
+        if record["status"] == "skipped" and entry:
+            for path, state in entry["inputs"].items():
+                if stats.get(path): state.update(stats[path])
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+    return results
+
+
+def expand_data_patterns(patterns):
+    """シェルが展開しない環境（Windowsなど）のために，"runs/*/out.dat" のようなパターンを展開する"""
+    files = []
+    for pattern in patterns:
+        if any(c in pattern for c in "*?["): files.extend(sorted(glob.glob(pattern, recursive=True)))
+        else: files.append(pattern)
+    return files
+
+
+def cli_sweep(argv):
+    """`GuiNUPLOT.py sweep 設定.json データ...` の処理．すべて描画（または省略）できれば0を返す"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="GuiNUPLOT.py sweep", description="Render one saved settings file for many data files.")
+    parser.add_argument("settings", help="settings JSON file saved with 'Save Settings'")
+    parser.add_argument("data", nargs="+", help="data files or glob patterns (e.g. 'runs/*/out.dat')")
+    parser.add_argument("-p", "--plot", type=int, action="append", help="plot number in the Current Plots list (1 = first) whose file is replaced (repeatable, default: all non-model plots)")
+    parser.add_argument("-f", "--format", action="append", choices=["png", "svg", "pdf"], help="output format (repeatable, default: png)")
+    parser.add_argument("-o", "--output-dir", help="directory for the images (default: next to the settings file)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of gnuplot processes (default: CPU cores)")
+    parser.add_argument("--force", action="store_true", help="render every variant even if its inputs are unchanged")
+    parser.add_argument("--gnuplot", default="gnuplot", help="gnuplot executable")
+    args = parser.parse_args(argv)
+    data_files = expand_data_patterns(args.data)
+    if not data_files:
+        print("No data files matched.", file=sys.stderr)
+        return 1
+    if args.output_dir: os.makedirs(args.output_dir, exist_ok=True)
+    pool_size = args.jobs or os.cpu_count() or 1
+    plot_indices = [i - 1 for i in args.plot] if args.plot else None
+    start = time.perf_counter()
+    try:
+        results = sweep_settings_file(args.settings, data_files, plot_indices, args.format or ["png"], args.output_dir, pool_size, args.gnuplot, args.force)
+    except (OSError, ValueError) as e:
+        print(f"{args.settings}: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    counts = {status: sum(r["status"] == status for r in results) for status in ("rendered", "skipped", "failed")}
+    for r in results:
+        if r["status"] == "failed":
+            print(f"  FAILED    {r['data']} [{r['format']}]: {r['error']}")
+        elif r["status"] == "rendered":
+            print(f"  {r['render_seconds']:7.3f} s  {r['data']} -> {r['output']}")
+    print(f"Rendered {counts['rendered']}, skipped {counts['skipped']} unchanged, failed {counts['failed']} of {len(results)} outputs with {pool_size} gnuplot workers in {elapsed:.2f} s")
+    sweep_cache_dir()
+    return 1 if counts["failed"] else 0
 
 if __name__ == '__main__':
+    # `python GuiNUPLOT.py render settings.json ...` と `sweep` はGUIを起動せずに画像を出力する
+    if len(sys.argv) > 1 and sys.argv[1] == "render":
+        sys.exit(cli_render(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "sweep":
+        sys.exit(cli_sweep(sys.argv[2:]))
+    # 起動にかかった時間（モジュールの読み込み，QApplication，ウィンドウの作成，最初の表示）
+    startup = RenderTrace("startup", started=STARTUP_STARTED)
+    startup.mark("imports")
     app = QApplication(sys.argv)
+    startup.mark("qapplication")
     window = GnuplotGUIY2Axis()
+    startup.mark("window")
     window.show()
+
+    def report_startup():
+        startup.mark("show")
+        window.finish_trace(startup)
+        # 環境変数 GUINUPLOT_STARTUP_REPORT を設定すると，標準エラーにも出力する
+        if os.environ.get("GUINUPLOT_STARTUP_REPORT"): print(startup.status_text(), file=sys.stderr)
+    QTimer.singleShot(0, report_startup)
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""GUInuplotのベンチマーク
+
+合成データ（2Dの線・散布図，3Dのpm3d，2D/3Dのベクトル場）を生成し，次の処理の時間を計ります．
+
+    script         generate_gnuplot_script()（セクションのキャッシュを捨ててから）
+    first_redraw   apply_settings() から最初のプレビューが表示されるまで（データの前処理を含む）
+    redraw         プレビュー画像のキャッシュを捨ててからの再描画（スクリプト，gnuplot，画像の読み込み，拡大縮小）
+    save_png/svg/pdf  Save Graph As と同じ全データでの保存
+    export_project    Export Project（PNG, SVG, PDF, GP, C）
+    apply_settings    多数のプロットを含む設定の読み込み
+
+結果はJSONで保存し，--compare で前回の結果と比べられます．Qtはoffscreenで動かします．
+データの生成にはnumpyが必要です．
+
+    python benchmark.py -o bench.json
+    python benchmark.py --sizes 1e3,1e5,1e7 --cases line2d,pm3d -o new.json --compare bench.json
+"""
+import os
+import sys
+import argparse
+import json
+import math
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CASES = ["line2d", "scatter2d", "pm3d", "vector2d", "vector3d"]
+FULL_SIZES = [10**3, 10**4, 10**5, 10**6, 10**7, 10**8]
+CHUNK_ROWS = 1_000_000
+
+
+# --- 合成データ ---
+
+def _write_rows(f, *columns):
+    np.savetxt(f, np.column_stack(columns), fmt="%.6g")
+
+
+def generate_line2d(f, rows):
+    for start in range(0, rows, CHUNK_ROWS):
+        x = np.arange(start, min(rows, start + CHUNK_ROWS), dtype=float)
+        _write_rows(f, x, np.sin(x * 1e-3) + 0.1 * np.sin(x * 0.37))
+
+
+def generate_scatter2d(f, rows):
+    # 乱数の代わりに黄金比で散らし，毎回同じファイルになるようにする
+    for start in range(0, rows, CHUNK_ROWS):
+        i = np.arange(start, min(rows, start + CHUNK_ROWS), dtype=float)
+        _write_rows(f, (i * 0.6180339887) % 1.0, (i * 0.7548776662) % 1.0)
+
+
+def generate_pm3d(f, rows):
+    # 走査線の間に空行を入れた格子データ（約rows行）
+    side = max(2, math.isqrt(rows))
+    x = np.arange(side, dtype=float)
+    for j in range(side):
+        _write_rows(f, x, np.full(side, float(j)), np.sin(x * 0.05) * math.cos(j * 0.05))
+        f.write(b"\n")
+
+
+def generate_vector2d(f, rows):
+    side = max(2, math.isqrt(rows))
+    x = np.arange(side, dtype=float)
+    for j in range(side):
+        _write_rows(f, x, np.full(side, float(j)), np.full(side, side / 2 - j), x - side / 2)
+
+
+def generate_vector3d(f, rows):
+    side = max(2, round(rows ** (1 / 3)))
+    x = np.arange(side, dtype=float)
+    for k in range(side):
+        for j in range(side):
+            _write_rows(f, x, np.full(side, float(j)), np.full(side, float(k)), np.full(side, side / 2 - j), x - side / 2, np.full(side, 0.1 * (k - side / 2)))
+
+
+GENERATORS = {"line2d": generate_line2d, "scatter2d": generate_scatter2d, "pm3d": generate_pm3d, "vector2d": generate_vector2d, "vector3d": generate_vector3d}
+
+
+def data_file(data_dir, case, rows):
+    """合成データのファイルを返す．同じ名前のファイルがあれば作り直さない"""
+    path = os.path.join(data_dir, f"{case}_{rows}.dat")
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f: GENERATORS[case](f, rows)
+        os.replace(tmp_path, path)
+    return path
+
+
+def plot_info(case, path):
+    """add_plot() と同じ形のプロット設定を作る"""
+    is_3d = case in ("pm3d", "vector3d")
+    using = {"line2d": "1:2", "scatter2d": "1:2", "pm3d": "1:2:3", "vector2d": "1:2:3:4", "vector3d": "1:2:3:4:5:6"}[case]
+    is_vector = case.startswith("vector")
+    style = {"line2d": "lines", "scatter2d": "points", "pm3d": "pm3d"}.get(case, "lines")
+    color_expression = {"vector2d": "sqrt($3**2+$4**2)", "vector3d": "sqrt($4**2+$5**2+$6**2)"}.get(case, "")
+    return {
+        "path": path.replace("\\", "/"), "using": using, "is_vector": is_vector, "is_3d_mode": is_3d, "is_model_mode": False,
+        "style": {
+            "style": style, "color": "black", "linestyle": "Solid", "linewidth": 1.0,
+            "pointtype": 1, "pointsize": 1.0, "color_from_value": is_vector, "color_expression": color_expression,
+            "vector_options": {"nohead": False, "head_style": "Default", "head_size": "0.1,15,60", "length_scale": 1.0, "normalize": False}
+        },
+        "axis": None if is_3d else "y1", "title": f"{case} u {using}",
+    }
+
+
+def settings_for(case, paths):
+    return {"plot_mode": 1 if case in ("pm3d", "vector3d") else 0, "plots": [plot_info(case, p) for p in paths]}
+
+
+# --- 計測 ---
+
+class Bench:
+    def __init__(self, app, window, timeout):
+        self.app, self.w, self.timeout = app, window, timeout
+        self.failed = None
+        # 古くなった依頼の失敗も届くため，今の表示に必要な画像のものだけを失敗とする
+        window.render_thread.failed.connect(lambda key, message: setattr(self, "failed", message) if key == window.render_cache_key else None)
+
+    def pump_until(self, done):
+        """イベントを処理しながらdone()を待つ．待っている再描画はタイマーを待たずにすぐ実行する"""
+        deadline = time.perf_counter() + self.timeout
+        while not done():
+            if self.failed: raise RuntimeError(self.failed)
+            if time.perf_counter() > deadline: raise TimeoutError(f"timed out after {self.timeout} s")
+            if self.w.update_timer.isActive():
+                self.w.update_timer.stop()
+                self.w.redraw_plot()
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def wait_for_image(self, previous):
+        self.failed = None
+        self.pump_until(lambda: self.w.last_preview_image is not None and self.w.last_preview_image is not previous)
+
+
+def measure(results, case, rows, metric, func, repeat):
+    samples, error = [], None
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    except Exception as e:
+        error = str(e).strip() or type(e).__name__
+    record = {"case": case, "rows": rows, "metric": metric, "samples": samples,
+              "min": min(samples) if samples else None, "median": statistics.median(samples) if samples else None, "error": error}
+    results.append(record)
+    status = f"FAILED: {error}" if error else f"median {record['median'] * 1000:10.2f} ms  min {record['min'] * 1000:10.2f} ms"
+    print(f"  {case:10s} {rows:>11,d}  {metric:15s} {status}", flush=True)
+    return record
+
+
+def bench_case(bench, results, case, rows, data_dir, out_dir, repeat):
+    w = bench.w
+    path = data_file(data_dir, case, rows)
+
+    def first_redraw():
+        w.apply_settings(settings_for(case, [path]))
+        bench.wait_for_image(None)
+
+    def script():
+        w.mark_sections_dirty()
+        w.generate_gnuplot_script()
+
+    def redraw():
+        previous = w.last_preview_image
+        w.preview_cache.clear()
+        w.mark_sections_dirty()
+        w.redraw_plot()
+        bench.wait_for_image(previous)
+
+    def save(fmt):
+        def run():
+            if not w.write_image(os.path.join(out_dir, f"{case}_{rows}.{fmt}").replace("\\", "/"), fmt):
+                raise RuntimeError("no script")
+        return run
+
+    def export():
+        w.start_export(out_dir, f"{case}_{rows}")
+        bench.pump_until(lambda: w.export_state is None)
+
+    w.last_preview_image = None
+    if measure(results, case, rows, "first_redraw", first_redraw, 1)["error"]: return
+    measure(results, case, rows, "script", script, repeat)
+    measure(results, case, rows, "redraw", redraw, repeat)
+    for fmt in ("png", "svg", "pdf"):
+        measure(results, case, rows, f"save_{fmt}", save(fmt), repeat)
+    measure(results, case, rows, "export_project", export, repeat)
+
+
+def bench_apply_settings(bench, results, counts, data_dir, repeat):
+    path = data_file(data_dir, "line2d", 10**3)
+    for count in counts:
+        settings = settings_for("line2d", [path] * count)
+        measure(results, "many_plots", count, "apply_settings", lambda: bench.w.apply_settings(settings), repeat)
+
+
+# --- 実行環境 ---
+
+def command_output(args, cwd=None):
+    try:
+        out = subprocess.run(args, capture_output=True, text=True, timeout=10, cwd=cwd)
+        return (out.stdout or out.stderr).strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_info():
+    from PySide6 import __version__ as pyside_version
+    here = os.path.dirname(os.path.abspath(__file__))
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": command_output(["git", "rev-parse", "--short", "HEAD"], cwd=here),
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "pyside6": pyside_version, "numpy": np.__version__ if np is not None else None,
+        "gnuplot": command_output(["gnuplot", "--version"]), "qt_platform": os.environ.get("QT_QPA_PLATFORM"),
+    }
+
+
+def compare(results, baseline_path):
+    """前回の結果と中央値を比べて表示する（比が1より大きければ遅くなった）"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["case"], r["rows"], r["metric"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path} (new / old median):")
+    for r in results:
+        old = baseline.get((r["case"], r["rows"], r["metric"]))
+        if not old or not old.get("median") or r["median"] is None: continue
+        ratio = r["median"] / old["median"]
+        print(f"  {r['case']:10s} {r['rows']:>11,d}  {r['metric']:15s} {old['median'] * 1000:10.2f} -> {r['median'] * 1000:10.2f} ms  x{ratio:.2f}")
+
+
+def parse_sizes(text):
+    return [int(float(v)) for v in text.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GUInuplot script generation, rendering and export.")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma separated cases ({', '.join(CASES)})")
+    parser.add_argument("--sizes", type=parse_sizes, default=[10**3, 10**4, 10**5], help="comma separated row counts (default: 1e3,1e4,1e5)")
+    parser.add_argument("--full", action="store_true", help="use every size from 1e3 to 1e8 rows")
+    parser.add_argument("--plot-counts", type=parse_sizes, default=[10, 50, 200], help="plot counts for apply_settings (default: 10,50,200)")
+    parser.add_argument("--repeat", type=int, default=3, help="samples per measurement (default: 3)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for one render (default: 600)")
+    parser.add_argument("--data-dir", help="directory for the generated data, reused between runs (default: a temporary directory)")
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="print the ratio to the medians in an earlier JSON result")
+    args = parser.parse_args(argv)
+    if np is None: parser.error("numpy is required to generate the benchmark data")
+    cases = [c for c in args.cases.split(",") if c]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown: parser.error(f"unknown cases: {', '.join(unknown)}")
+    sizes = FULL_SIZES if args.full else args.sizes
+
+    work_dir = tempfile.mkdtemp(prefix="guinuplot-bench-")
+    # 前回の実行で作ったbinaryサイドカーなどを使わないよう，キャッシュは毎回空のフォルダにする
+    os.environ["GUINUPLOT_CACHE_DIR"] = os.path.join(work_dir, "cache")
+    data_dir = args.data_dir or os.path.join(work_dir, "data")
+    out_dir = os.path.join(work_dir, "out")
+    os.makedirs(data_dir, exist_ok=True); os.makedirs(out_dir, exist_ok=True)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import GuiNUPLOT
+    # GUIは起動後にNumPyを読み込むため，計測の前に読み込んで間引きなどの前処理を確実に有効にする
+    GuiNUPLOT.load_numpy()
+    from PySide6.QtWidgets import QApplication, QMessageBox
+    # 保存やエクスポートの完了ダイアログで止まらないようにする
+    for name in ("information", "warning", "critical"):
+        setattr(QMessageBox, name, staticmethod(lambda *a, **k: QMessageBox.Ok))
+    app = QApplication.instance() or QApplication([])
+    window = GuiNUPLOT.GnuplotGUIY2Axis()
+    window.resize(1400, 900)
+    window.show()
+    app.processEvents()
+    bench = Bench(app, window, args.timeout)
+
+    results = []
+    try:
+        for case in cases:
+            for rows in sizes:
+                bench_case(bench, results, case, rows, data_dir, out_dir, args.repeat)
+        bench_apply_settings(bench, results, args.plot_counts, data_dir, args.repeat)
+    finally:
+        window.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"environment": environment_info(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, indent=1)
+        print(f"\nResults written to {args.output}")
+    if args.compare: compare(results, args.compare)
+    return 1 if any(r["error"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# GUIを表示せずにテストし，前処理のキャッシュは一時フォルダに置く（GuiNUPLOTの読み込み前に設定する）
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("GUINUPLOT_CACHE_DIR", tempfile.mkdtemp(prefix="guinuplot-test-cache-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import GuiNUPLOT  # noqa: E402
+
+
+@pytest.fixture
+def np():
+    numpy = GuiNUPLOT.load_numpy()
+    if numpy is None: pytest.skip("NumPy is not installed.")
+    return numpy
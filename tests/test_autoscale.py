@@ -0,0 +1,60 @@
+import pytest
+
+from GuiNUPLOT import compute_plot_extents, extend_autoscale_range, quantize_normal_tics
+
+
+@pytest.mark.parametrize("span, step", [(9.4, 1.0), (15.9, 2.0), (1000.0, 200.0), (867.0, 100.0), (0.1, 0.02), (2.0, 0.5), (3.8e-3, 5e-4)])
+def test_quantize_normal_tics(span, step):
+    assert quantize_normal_tics(span) == pytest.approx(step)
+
+
+@pytest.mark.parametrize("vmin, vmax, expected", [
+    (0.3, 9.7, (0.0, 10.0)),
+    (0.0, 1000.0, (0.0, 1000.0)),
+    (-3.7, 12.2, (-4.0, 14.0)),
+    (-870.0, -3.0, (-900.0, 0.0)),
+    (-1.2e-3, 2.6e-3, (-1.5e-3, 3e-3)),
+])
+def test_linear_range_extends_to_tics(vmin, vmax, expected):
+    assert extend_autoscale_range(vmin, vmax) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("vmin, vmax, expected", [
+    (3.0, 870.0, (1.0, 1000.0)),
+    (0.02, 0.5, (0.01, 1.0)),
+    (1.0, 1e12, (1.0, 1e12)),
+])
+def test_log_range_extends_to_decades(vmin, vmax, expected):
+    assert extend_autoscale_range(vmin, vmax, log=True) == pytest.approx(expected)
+
+
+def test_zero_span_is_widened_like_gnuplot():
+    # gnuplotは幅のない範囲を，0なら±1，それ以外は±1%広げてから目盛りまで広げる
+    assert extend_autoscale_range(0.0, 0.0) == pytest.approx((-1.0, 1.0))
+    assert extend_autoscale_range(5.0, 5.0) == pytest.approx((4.95, 5.05))
+    assert extend_autoscale_range(-5.0, -5.0) == pytest.approx((-5.05, -4.95))
+    lo, hi = extend_autoscale_range(0.0, 0.0, log=True)
+    assert 0 < lo < 1 <= hi
+
+
+def test_plot_extents_skip_rows_gnuplot_does_not_plot(np):
+    data = np.array([[1.0, 2.0], [2.0, np.nan], [3.0, -4.0], [0.5, 8.0]])
+    chunks = [data[:2], data[2:]]
+    extents = compute_plot_extents(iter(chunks), {"x": ["$1"], "y": ["$2"]})
+    assert extents == {"rows": 3, "ranges": {"x": [0.5, 3.0], "y": [-4.0, 8.0]}}
+    # 対数軸では0以下の値の行を数えない
+    extents = compute_plot_extents(iter(chunks), {"x": ["$1"], "y": ["$2"]}, log_axes=("y",))
+    assert extents == {"rows": 2, "ranges": {"x": [0.5, 1.0], "y": [2.0, 8.0]}}
+
+
+def test_plot_extents_cover_every_expression_of_an_axis(np):
+    # ベクトルの始点と終点（$1+$3）の両方が範囲に入る
+    data = np.array([[0.0, 0.0, 2.0, -1.0], [1.0, 1.0, -3.0, 0.5]])
+    extents = compute_plot_extents(iter([data]), {"x": ["$1", "$1+$3"], "y": ["$2", "$2+$4"]})
+    assert extents["ranges"] == {"x": [-2.0, 2.0], "y": [-1.0, 1.5]}
+    assert extend_autoscale_range(*extents["ranges"]["x"]) == pytest.approx((-2.0, 2.0))
+
+
+def test_plot_extents_reject_unsupported_expressions(np):
+    with pytest.raises(ValueError):
+        compute_plot_extents(iter([np.zeros((1, 2))]), {"x": ["$1"], "y": ["myfunc($2)"]})
@@ -0,0 +1,242 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import GuiNUPLOT
+from GuiNUPLOT import (HISTOGRAM_DEFAULTS, DataPrepCache, QuantileSketch, TailBuffer, build_grid_file, build_lod_file,
+                       compute_lod_rows, histogram_edges, poll_tail_buffers, render_settings_files, sniff_data_file, sweep_output_stems)
+
+
+def chunked(np, data, rows):
+    return lambda: iter([data[i:i + rows] for i in range(0, len(data), rows)])
+
+
+def test_lod_envelope_keeps_extremes_per_pixel(np):
+    x = np.arange(10000.0)
+    data = np.column_stack([x, np.sin(x / 100.0), x * 2])
+    rows, total = compute_lod_rows(chunked(np, data, 3000), 1, 2, "envelope", 16)
+    assert total == 10000 and len(rows) <= 32 and rows.shape[1] == 3
+    assert np.all(np.diff(rows[:, 0]) > 0)  # 元の順序のまま
+    assert rows[:, 1].max() == data[:, 1].max() and rows[:, 1].min() == data[:, 1].min()
+
+
+def test_lod_points_keeps_one_row_per_cell(np):
+    rng = np.random.default_rng(0)
+    data = rng.random((5000, 2))
+    rows, total = compute_lod_rows(chunked(np, data, 1000), 1, 2, "points", 4, 4)
+    assert total == 5000 and len(rows) == 16
+
+
+def test_lod_uses_only_the_fixed_range(np):
+    x = np.arange(1000.0)
+    data = np.column_stack([x, x % 10])
+    rows, _ = compute_lod_rows(chunked(np, data, 300), 1, 2, "envelope", 8, x_range=(100.5, 200.5))
+    # 範囲の両端のすぐ外の行（100と201）だけを残して線が切れないようにする
+    assert rows[:, 0].min() == 100 and rows[:, 0].max() == 201
+    rows, _ = compute_lod_rows(chunked(np, data, 300), 1, 2, "points", 8, 8, x_range=(100, 200), y_range=(5, None))
+    assert rows[:, 0].min() >= 100 and rows[:, 0].max() <= 200 and rows[:, 1].min() >= 5
+    rows, _ = compute_lod_rows(chunked(np, data, 300), 1, 2, "envelope", 8, log_x=True, x_range=(10, 100))
+    assert rows[:, 0].min() == 9 and rows[:, 0].max() == 101
+
+
+def test_lod_file_is_skipped_for_blocks(np, tmp_path):
+    path = tmp_path / "blocks.dat"
+    path.write_text("1 1\n2 2\n\n\n3 3\n4 4\n")
+    assert build_lod_file(str(path), 1, 2, "envelope", 4, 1, False, False, str(tmp_path / "lod.bin")) == {"has_blocks": True}
+
+
+def test_sniff_data_file(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text("# run 1\n# generated\ntime,value,error\n0,1.5,0.1\n1,2.5,0.2\n")
+    assert sniff_data_file(str(path)) == {"columns": 3, "delimiter": ",", "header": ["time", "value", "error"], "comment_lines": 2}
+    path = tmp_path / "b.dat"
+    path.write_text("# x y\n1 2\n3 4\n")
+    assert sniff_data_file(str(path)) == {"columns": 2, "delimiter": None, "header": ["x", "y"], "comment_lines": 1}
+    empty = tmp_path / "empty.dat"
+    empty.write_text("")
+    assert sniff_data_file(str(empty)) is None
+
+
+def test_histogram_edges(np):
+    options = dict(HISTOGRAM_DEFAULTS, bins=4)
+    assert histogram_edges(options, 0.0, 8.0).tolist() == [0, 2, 4, 6, 8]
+    assert histogram_edges(dict(options, bin_width=3.0), 0.0, 8.0).tolist() == [0, 3, 6, 9]
+    assert histogram_edges(dict(options, range_min="-4", range_max=""), 0.0, 4.0).tolist() == [-4, -2, 0, 2, 4]
+    assert histogram_edges(options, 5.0, 5.0).tolist() == [4.5, 4.75, 5.0, 5.25, 5.5]
+    with pytest.raises(ValueError):
+        histogram_edges(dict(options, range_min="3", range_max="1"), 0.0, 4.0)
+
+
+def test_quantile_sketch_is_close_to_exact(np):
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=200000)
+    sketch = QuantileSketch(size=256)
+    for i in range(0, len(values), 1000): sketch.add(values[i:i + 1000])
+    qs = [0.01, 0.5, 0.99]
+    exact = np.quantile(values, qs)
+    ranks = np.searchsorted(np.sort(values), sketch.quantiles(qs)) / len(values)
+    assert np.abs(ranks - qs).max() < 0.01, (sketch.quantiles(qs), exact)
+    assert QuantileSketch().quantiles([0.5]) is None
+
+
+def test_tail_buffer_reads_appended_rows(np, tmp_path):
+    path = tmp_path / "live.dat"
+    path.write_text("0 0\n1 1\n2 ")
+    buffer = TailBuffer(str(path))
+    assert buffer.poll() and buffer.rows == 2  # 書き込み途中の行は持ち越す
+    with open(path, 'a') as f: f.write("2\n# comment\n3 3\n")
+    assert buffer.poll() and buffer.rows == 4
+    assert not buffer.poll()
+    assert np.fromfile(buffer.out_path).reshape(-1, 2)[:, 1].tolist() == [0, 1, 2, 3]
+    path.write_text("9 9\n")  # 短くなったファイルは先頭から読み直す
+    assert buffer.poll() and buffer.rows == 1
+
+
+def test_tail_buffer_window_keeps_last_rows(np, tmp_path):
+    path = tmp_path / "live.dat"
+    path.write_text("".join(f"{i} {i}\n" for i in range(10)))
+    buffer = TailBuffer(str(path), window_rows=4)
+    assert buffer.poll()
+    with open(path, 'a') as f: f.write("10 10\n11 11\n")
+    assert buffer.poll()
+    assert np.fromfile(buffer.out_path).reshape(-1, 2)[:, 0].tolist() == [8, 9, 10, 11]
+
+
+def test_tail_buffer_ring_grows_with_the_data(np, tmp_path):
+    path = tmp_path / "live.dat"
+    path.write_text("".join(f"{i} {i}\n" for i in range(10)))
+    buffer = TailBuffer(str(path), window_rows=100_000_000)
+    assert buffer.poll()
+    assert len(buffer.ring) == TailBuffer.RING_MIN_ROWS  # 窓の大きさ分は最初に確保しない
+    with open(path, 'a') as f: f.write("".join(f"{i} {i}\n" for i in range(10, 3 * TailBuffer.RING_MIN_ROWS)))
+    assert buffer.poll()
+    assert len(buffer.ring) == 3 * TailBuffer.RING_MIN_ROWS
+    with open(path, 'a') as f: f.write("-1 -1\n")
+    assert buffer.poll()
+    assert len(buffer.ring) == 6 * TailBuffer.RING_MIN_ROWS  # 足りなくなるたびに倍にする
+    assert np.fromfile(buffer.out_path).reshape(-1, 2)[:, 0].tolist() == list(range(3 * TailBuffer.RING_MIN_ROWS)) + [-1]
+
+
+def test_tail_buffer_snapshot_changes_only_when_published(np, tmp_path):
+    path = tmp_path / "live.dat"
+    path.write_text("0 0\n1 1\n")
+    buffer = TailBuffer(str(path), window_rows=4)
+    assert buffer.snapshot() == (False, None, 0, None)
+    assert poll_tail_buffers([buffer])
+    assert buffer.snapshot() == (True, None, 2, 2)
+    with open(path, 'a') as f: f.write("2 2\n")
+    assert buffer.poll()
+    assert buffer.snapshot() == (True, None, 2, 2)  # GUIからは，読み込みを終えて反映するまで前回の結果が見える
+    assert buffer.publish() is False and buffer.snapshot() == (True, None, 3, 2)
+
+
+def test_sweep_output_stems(tmp_path):
+    assert sweep_output_stems([str(tmp_path / "run" / "out.dat")]) == ["out"]
+    paths = [str(tmp_path / "runs" / name / "out.dat") for name in ("a", "b")]
+    assert sweep_output_stems(paths) == ["a_out", "b_out"]
+    assert sweep_output_stems([str(tmp_path / "x.dat"), str(tmp_path / "sub" / "y.dat")]) == ["x", "sub_y"]
+
+
+@pytest.mark.parametrize("x_outer", [True, False])
+def test_grid_file_keeps_regular_grids(np, tmp_path, x_outer):
+    x, y = np.meshgrid(np.arange(5.0), np.arange(3.0) * 0.5, indexing='ij' if x_outer else 'xy')
+    z = x + 10 * y
+    path = tmp_path / "grid.dat"
+    np.savetxt(path, np.column_stack([x.ravel(), y.ravel(), z.ravel()]))
+    meta = build_grid_file(str(path), [1, 2, 3], 50, str(tmp_path / "grid.bin"))
+    assert meta["regular"] and (meta["nx"], meta["ny"], meta["points"]) == (5, 3, 15)
+    matrix = np.fromfile(meta["path"], dtype=np.float32).reshape(4, 6)
+    assert matrix[0, 1:].tolist() == [0, 1, 2, 3, 4] and matrix[1:, 0].tolist() == [0, 0.5, 1]
+    assert np.allclose(matrix[1:, 1:], matrix[0, 1:][None, :] + 10 * matrix[1:, 0][:, None])
+
+
+def test_grid_file_averages_scattered_points(np, tmp_path):
+    path = tmp_path / "scattered.dat"
+    np.savetxt(path, [[0, 0, 1], [0.1, 0.1, 3], [1, 1, 10], [0.9, 0.2, 7]])
+    meta = build_grid_file(str(path), [1, 2, 3], 2, str(tmp_path / "grid.bin"))
+    assert not meta["regular"] and meta["points"] == 4
+    grid = np.fromfile(meta["path"], dtype=np.float32).reshape(3, 3)[1:, 1:]
+    assert grid[0, 0] == 2 and grid[0, 1] == 7 and np.isnan(grid[1, 0]) and grid[1, 1] == 10
+
+
+def test_sweep_cache_dir_removes_least_recently_used(monkeypatch, tmp_path):
+    monkeypatch.setattr(GuiNUPLOT, "CACHE_DIR", str(tmp_path))
+    now = time.time()
+    for age, name in enumerate(["lod_new.bin", "grid_old.bin", "grid_old.bin.json", "sidecar_older.bin", "values_busy.bin.tmp"]):
+        path = tmp_path / name
+        path.write_bytes(b"x" * 100)
+        used = now if name.endswith(".tmp") else now - 1000 * (age + 1 if "older" not in name else 10)
+        os.utime(path, (used, used))
+    assert GuiNUPLOT.sweep_cache_dir(max_bytes=250) == (3, 300)
+    assert sorted(os.listdir(tmp_path)) == ["lod_new.bin", "values_busy.bin.tmp"]
+
+
+def write_cache_files(tmp_path, files):
+    """{名前: (バイト数, 何秒前に使ったか)} のファイルをキャッシュのフォルダに作る"""
+    now = time.time()
+    for name, (size, age) in files.items():
+        path = tmp_path / name
+        path.write_bytes(b"x" * size)
+        os.utime(path, (now - age, now - age))
+
+
+def test_sweep_cache_dir_keeps_the_newest_group_even_above_the_cap(monkeypatch, tmp_path):
+    monkeypatch.setattr(GuiNUPLOT, "CACHE_DIR", str(tmp_path))
+    write_cache_files(tmp_path, {"sidecar_big.bin": (1000, 10), "sidecar_big.json": (10, 10), "lod_old.bin": (100, 1000)})
+    assert GuiNUPLOT.sweep_cache_dir(max_bytes=500) == (1, 100)
+    assert sorted(os.listdir(tmp_path)) == ["sidecar_big.bin", "sidecar_big.json"]
+    assert GuiNUPLOT.sweep_cache_dir(max_bytes=500) == (0, 0)
+
+
+def test_sweep_cache_dir_keeps_files_used_by_this_process(monkeypatch, tmp_path):
+    monkeypatch.setattr(GuiNUPLOT, "CACHE_DIR", str(tmp_path))
+    used = GuiNUPLOT.cache_file_path("grid", ("test", str(tmp_path)), "bin")
+    write_cache_files(tmp_path, {os.path.basename(used): (100, 3000), os.path.basename(used) + ".json": (10, 3000),
+                                 "values_kept.bin": (100, 2000), "lod_old.bin": (100, 1000), "lod_new.bin": (100, 0)})
+    assert GuiNUPLOT.sweep_cache_dir(max_bytes=0, keep=[str(tmp_path / "values_kept.bin")]) == (1, 100)
+    assert "lod_old.bin" not in os.listdir(tmp_path) and len(os.listdir(tmp_path)) == 4
+
+
+def test_cache_max_bytes_can_be_set_from_the_environment():
+    assert GuiNUPLOT.CACHE_DIR_MAX_BYTES > 2.4e9  # 既定は1億行×3列のサイドカーが入る大きさ
+    env = dict(os.environ, GUINUPLOT_CACHE_MAX_BYTES="5e9")
+    code = "import GuiNUPLOT; print(GuiNUPLOT.CACHE_DIR_MAX_BYTES)"
+    output = subprocess.run([sys.executable, "-c", code], env=env, cwd=os.path.dirname(GuiNUPLOT.__file__), capture_output=True, text=True, check=True)
+    assert output.stdout.split()[-1] == "5000000000"
+
+
+def test_data_prep_cache_can_wait_for_pending_results():
+    started = threading.Event()
+    release = threading.Event()
+
+    def builder():
+        started.set()
+        release.wait(5)
+        return 42
+
+    cache = DataPrepCache()
+    assert cache.lookup("key", builder) == ("pending", None)
+    started.wait(5)
+    threading.Timer(0.05, release.set).start()
+    assert cache.lookup("key", builder, wait=True) == ("ready", 42)
+    state, error = cache.lookup("bad", lambda: 1 / 0, wait=True)
+    assert state == "failed" and isinstance(error, ZeroDivisionError)
+    cache.shutdown()
+
+
+def test_render_settings_files_keeps_outputs_of_same_named_settings_apart(tmp_path):
+    paths = []
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        path = tmp_path / name / "report.json"
+        path.write_text('{"plots": []}', encoding="utf-8")
+        paths.append(str(path))
+    out = str(tmp_path / "out").replace(os.sep, "/")
+    results = render_settings_files(paths + paths[:1], output_dir=out, jobs=1, executable=str(tmp_path / "no-gnuplot"))
+    assert [r["output"] for r in results] == [f"{out}/a_report.png", f"{out}/b_report.png", f"{out}/a_report.png"]
+    assert "also written by" in results[2]["error"]
+    assert [r["output"] for r in render_settings_files(paths[:1], output_dir=out, jobs=1)] == [f"{out}/report.png"]
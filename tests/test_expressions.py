@@ -0,0 +1,52 @@
+import pytest
+
+from GuiNUPLOT import compile_gnuplot_expression
+
+
+def evaluate(np, expr, rows):
+    func = compile_gnuplot_expression(expr)
+    assert func is not None, expr
+    return func(np.array(rows, dtype=np.float64))
+
+
+@pytest.mark.parametrize("expr, expected", [
+    ("1/2", 0.0),           # 整数どうしの割り算は切り捨て
+    ("(1+2)/3", 1.0),
+    ("-7/2", -3.0),         # 0の方向に切り捨て
+    ("1.0/2", 0.5),
+    ("1/2.", 0.5),
+    ("2**10", 1024.0),
+    ("2*pi", 6.283185307179586),
+])
+def test_constants_follow_gnuplot(np, expr, expected):
+    assert evaluate(np, expr, [[0.0], [0.0]]) == pytest.approx([expected, expected])
+
+
+def test_columns_are_real_numbers(np):
+    # データの列は実数なので，$3/2 は切り捨てない
+    assert evaluate(np, "$3/2", [[0, 0, 3], [0, 0, 5]]) == pytest.approx([1.5, 2.5])
+    assert evaluate(np, "column(3)/2", [[0, 0, 3]]) == pytest.approx([1.5])
+
+
+def test_unary_minus_binds_looser_than_power(np):
+    assert evaluate(np, "-$1**2", [[3.0], [-2.0]]) == pytest.approx([-9.0, -4.0])
+    assert evaluate(np, "2.0**3**2", [[0.0]]) == pytest.approx([512.0])
+
+
+def test_division_by_zero_is_undefined(np):
+    values = evaluate(np, "$1/$2", [[1.0, 0.0], [1.0, 2.0]])
+    assert np.isnan(values[0]) and values[1] == 0.5
+    assert np.isnan(evaluate(np, "1/0", [[0.0]])).all()
+
+
+def test_integer_functions_divide_as_integers(np):
+    assert evaluate(np, "floor($1)/2", [[3.7], [-3.2]]) == pytest.approx([1.0, -2.0])
+    assert evaluate(np, "sqrt($1**2+$2**2)", [[3.0, 4.0]]) == pytest.approx([5.0])
+
+
+@pytest.mark.parametrize("expr", [
+    "", "$1 > 0 ? $1 : 0", "$1 > 0", "strlen($1)", "__import__('os')", "$1.real", "column(0)",
+    "column($1)", "sqrt($1, $2)", "f(x)", "$1[0]", "2**-1", "lambda: 1", "'a'", "True", "$1 ^ 2",
+])
+def test_unsupported_expressions_return_none(expr):
+    assert compile_gnuplot_expression(expr) is None
@@ -0,0 +1,49 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from GuiNUPLOT import GnuplotWorker, RenderCancelled
+
+# 標準入力のprintを標準エラーに返し，"pause N" で眠るだけのgnuplotの代わり
+FAKE_GNUPLOT = r'''
+import re, sys, time
+for line in sys.stdin:
+    line = line.strip()
+    if line.startswith("print"):
+        sys.stderr.write(re.search(r'"(.*)"', line).group(1) + "\n")
+        sys.stderr.flush()
+    elif line.startswith("pause"):
+        time.sleep(float(line.split()[1]))
+'''
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="The fake gnuplot is a POSIX script.")
+
+
+@pytest.fixture
+def worker(tmp_path):
+    path = tmp_path / "gnuplot"
+    path.write_text(f"#!{sys.executable}\n{FAKE_GNUPLOT}")
+    path.chmod(0o755)
+    worker = GnuplotWorker(str(path))
+    yield worker
+    worker.stop()
+
+
+def test_kill_after_the_frame_keeps_the_process(worker):
+    worker.run("set print")
+    worker.kill()  # 描画が終わった後の中断の要求は，次の描画に持ち越さない
+    worker.run("set print")
+    assert worker.restart_count == 0
+
+
+def test_kill_cancels_the_running_frame(worker):
+    threading.Timer(0.2, worker.kill).start()
+    start = time.perf_counter()
+    with pytest.raises(RenderCancelled):
+        worker.run("pause 5")
+    assert time.perf_counter() - start < 4
+    worker.run("set print")
+    assert worker.restart_count == 1
@@ -0,0 +1,140 @@
+import pytest
+
+from GuiNUPLOT import (DataSource, histogram_data_source, normalize_settings, script_from_settings,
+                       settings_data_sources)
+
+
+def plot(path, using="1:2", **options):
+    style = {"style": "lines", "color": "black", "linestyle": "Solid", "linewidth": 1.0, "pointtype": 1, "pointsize": 1.0,
+             "color_from_value": False, "color_expression": "",
+             "vector_options": {"nohead": False, "head_style": "Default", "head_size": "0.1,15,60", "length_scale": 1.0, "normalize": False}}
+    style.update(options.pop("style", {}))
+    info = {"path": path, "using": using, "is_vector": False, "is_3d_mode": False, "is_model_mode": False,
+            "axis": "y1", "title": f"{path} u {using}", "style": style}
+    info.update(options)
+    return info
+
+
+def settings(plots, mode=0, **sections):
+    s = normalize_settings({"plot_mode": mode, "plots": plots})
+    for name, values in sections.items(): s[name].update(values)
+    return s
+
+
+def plot_line(script):
+    return [line for line in str(script).splitlines() if line.startswith(("plot ", "splot "))]
+
+
+def test_no_plots_gives_no_script():
+    assert script_from_settings(settings([])) is None
+
+
+def test_2d_lines_and_points_on_two_axes():
+    s = settings([plot("a.dat"), plot("b.dat", "1:3", axis="y2", style={"style": "points", "pointtype": 7})],
+                 xaxis={"range_check": True, "range_min": "0", "range_max": "10", "log_check": True},
+                 y2axis={"label": "Right"})
+    text = str(script_from_settings(s, output_path="out.png"))
+    assert 'set terminal pngcairo size 800,600 enhanced font "Times New Roman,14"' in text
+    assert 'set output "out.png"' in text
+    assert "set xrange [0:10]" in text and "set logscale x\n" in text
+    assert 'set y2label "Right"' in text and "set y2tics" in text
+    [line] = plot_line(text)
+    assert line.startswith('plot "a.dat" using ($1):($2) axes x1y1 with lines dashtype 1 linewidth 1.0 linecolor rgb "black"')
+    assert '"b.dat" using ($1):($3) axes x1y2 with points pointtype 7 pointsize 1.0' in text
+
+
+def test_3d_pm3d_with_color_expression():
+    s = settings([plot("s.dat", "1:2:3", axis=None, style={"style": "pm3d", "color_from_value": True, "color_expression": "$3*2"})],
+                 mode=1, view3d={"rot_x": 45, "rot_z": 120})
+    text = str(script_from_settings(s))
+    assert "set view 45,120" in text and "set pm3d explicit" in text
+    assert 'splot "s.dat" using ($1):($2):($3):($3*2) with pm3d lc palette title' in text
+    assert "axes" not in plot_line(text)[0]
+
+
+def test_2d_vectors_are_normalized_and_scaled():
+    vector_options = {"nohead": False, "head_style": "Filled", "head_size": "", "length_scale": 2.0, "normalize": True}
+    s = settings([plot("v.dat", "1:2:3:4", is_vector=True, style={"color_from_value": True, "color_expression": "sqrt($3**2+$4**2)",
+                                                                 "vector_options": vector_options})])
+    [line] = plot_line(script_from_settings(s))
+    magnitude = "((sqrt($3**2+$4**2)) == 0 ? 1 : (sqrt($3**2+$4**2)))"
+    assert f"((($3) / {magnitude}) * 2.0)" in line and f"((($4) / {magnitude}) * 2.0)" in line
+    assert "with vectors head filled dashtype 1 linewidth 1.0 lc palette" in line
+
+
+def test_model_uses_two_pass_multiplot_without_overlay_ranges():
+    s = settings([plot("data.dat"), plot("model.dat", is_model_mode=True)])
+    text = str(script_from_settings(s))
+    assert "set multiplot" in text and "set xrange [GPVAL_X_MIN:GPVAL_X_MAX]" in text and "unset multiplot" in text
+    assert len(plot_line(text)) == 2
+
+
+def test_model_is_overlaid_in_one_plot_with_overlay_ranges():
+    s = settings([plot("data.dat"), plot("model.dat", is_model_mode=True)])
+    text = str(script_from_settings(s, overlay_ranges={"x": (0.0, 10.0), "y": (-1.0, 1.0)}))
+    assert "set multiplot" not in text
+    assert "set xrange [0:10]" in text and "set yrange [-1:1]" in text
+    assert len(plot_line(text)) == 1
+    assert '"model.dat" using ($1):($2) axes x1y1 with lines dashtype 1 linewidth 1.0 linecolor rgb "black" notitle' in text
+
+
+def test_data_sources_replace_the_file_and_using():
+    s = settings([plot("big.dat")])
+    source = DataSource("cache/lod.bin", binary='format="%2float64"')
+    [line] = plot_line(script_from_settings(s, data_sources=[source]))
+    assert line.startswith('plot "cache/lod.bin" binary format="%2float64" using ($1):($2)')
+
+
+def test_histogram_without_bin_table_uses_gnuplot_bins():
+    hist = {"bins": 20, "bin_width": 0.0, "range_min": "", "range_max": "", "normalize": "probability"}
+    s = settings([plot("h.dat", "2", is_histogram=True, histogram=hist, style={"style": "boxes"})])
+    text = str(script_from_settings(s))
+    assert 'stats "h.dat" using ($2) name "HIST0" nooutput' in text
+    assert '"h.dat" using ($2):(1.0/HIST0_records) bins=20 axes x1y1 with boxes' in plot_line(text)[0]
+
+
+def test_histogram_and_grid_use_precomputed_tables(np, tmp_path):
+    values = tmp_path / "values.dat"
+    np.savetxt(values, np.column_stack([np.arange(100.0), np.arange(100.0) % 7]))
+    grid = tmp_path / "grid.dat"
+    x, y = np.meshgrid(np.arange(4.0), np.arange(3.0))
+    np.savetxt(grid, np.column_stack([x.ravel(), y.ravel(), (x * y).ravel()]))
+
+    hist = {"bins": 7, "bin_width": 0.0, "range_min": "", "range_max": "", "normalize": "count"}
+    s = settings([plot(str(values), "2", is_histogram=True, histogram=hist, style={"style": "boxes"})])
+    [source] = settings_data_sources(s)
+    assert source.using == ["1", "2", "3"] and "7 bins" in source.note
+    [line] = plot_line(script_from_settings(s, data_sources=[source]))
+    assert 'binary format="%3float64" using 1:2:3 axes x1y1 with boxes' in line
+    table = np.fromfile(source.path).reshape(-1, 3)
+    assert table[:, 1].tolist() == [15, 15, 14, 14, 14, 14, 14]
+
+    s = settings([plot(str(grid), "1:2:3", axis=None, gridding={"enabled": True, "resolution": 10}, style={"style": "pm3d"})], mode=1)
+    [source] = settings_data_sources(s)
+    assert source.binary == "matrix" and source.note.startswith("Regular grid 4×3")
+    [line] = plot_line(script_from_settings(s, data_sources=[source]))
+    assert line.startswith(f'splot "{source.path}" binary matrix using 1:2:3 with pm3d')
+
+
+def test_histogram_data_source_uses_two_columns_except_for_boxes():
+    meta = {"path": "h.bin", "values": 10, "bins": 3}
+    assert histogram_data_source(meta, {"style": "boxes"}).using == ["1", "2", "3"]
+    assert histogram_data_source(meta, {"style": "steps"}).using == ["1", "2"]
+
+
+def test_section_cache_is_reused():
+    cache = {}
+    s = settings([plot("a.dat")], general={"title_check": True, "title_input": "First"})
+    assert 'set title "First"' in str(script_from_settings(s, section_cache=cache))
+    s['general']['title_input'] = "Second"
+    # 設定が変わったときにキャッシュを消すのは呼び出し側
+    assert 'set title "First"' in str(script_from_settings(s, section_cache=cache))
+    cache.clear()
+    assert 'set title "Second"' in str(script_from_settings(s, section_cache=cache))
+
+
+@pytest.mark.parametrize("mode", [0, 1])
+def test_script_sections_are_named(mode):
+    s = settings([plot("a.dat", "1:2:3", axis=None if mode else "y1")], mode=mode)
+    names = [name for name, _ in script_from_settings(s).sections]
+    assert names[:2] == ["terminal", "style"] and names[-1] == "plot"
@@ -0,0 +1,72 @@
+import pytest
+
+from GuiNUPLOT import SCRIPT_SECTIONS, GnuplotScript, normalize_settings
+
+
+def all_options_settings():
+    """すべてのセクションが何かを出力するよう，項目をすべて有効にした設定"""
+    s = normalize_settings({})
+    s['general'].update(title_check=True, title_input='Title')
+    for axis in ('xaxis', 'yaxis', 'y2axis', 'zaxis'):
+        s[axis].update(range_check=True, range_min='1', range_max='2', tics_check=True, log_check=True)
+    s['xaxis']['grid_check'] = True
+    s['legend'].update(key_pos='top left', key_maxrows=2, key_maxcols=3)
+    s['colorbar'].update(size_check=True, range_check=True, range_min='0', range_max='1', format_10_power=True)
+    s['view3d'].update(xyplane_check=True)
+    return s
+
+
+def command_targets(text):
+    """set/unsetするものの名前（"set xrange [...]" -> "xrange"，"set format cb ..." -> "format cb"）"""
+    targets = set()
+    for line in text.splitlines():
+        words = line.split()
+        if len(words) < 2 or words[0] not in ("set", "unset"): continue
+        targets.add(" ".join(words[1:3]) if words[1] == "format" else words[1])
+    return targets
+
+
+def section_outputs(name):
+    builder = SCRIPT_SECTIONS[name]
+    for settings in (all_options_settings(), normalize_settings({})):
+        for mode in ('2d', '3d'):
+            for decor in (True, False):
+                for has_y2 in (True, False):
+                    yield builder(settings, mode, decor, has_y2)
+
+
+@pytest.mark.parametrize("name", sorted(SCRIPT_SECTIONS))
+def test_reset_covers_everything_the_section_sets(name):
+    # 差分で送るとき，前回のセクションで設定したものはすべてリセットで既定値に戻っている必要がある
+    set_targets = set().union(*(command_targets(text) for text in section_outputs(name)))
+    if not set_targets: return
+    assert name in GnuplotScript.SECTION_RESETS, name
+    missing = set_targets - command_targets(GnuplotScript.SECTION_RESETS[name])
+    assert not missing, f"{name}: {sorted(missing)}"
+
+
+def script(sections):
+    return GnuplotScript([("terminal", "set terminal pngcairo\n"), *sections, ("plot", "plot x\n")])
+
+
+def test_delta_sends_reset_before_each_changed_section():
+    for name, builder in SCRIPT_SECTIONS.items():
+        before = all_options_settings()
+        for mode in ('2d', '3d'):
+            old = script([(n, b(before, mode, True, True)) for n, b in SCRIPT_SECTIONS.items()])
+            new = script([(n, b(normalize_settings({}), mode, True, True) if n == name else b(before, mode, True, True))
+                          for n, b in SCRIPT_SECTIONS.items()])
+            delta = new.delta_from(old)
+            changed = dict(old.sections)[name] != dict(new.sections)[name]
+            expected = (GnuplotScript.SECTION_RESETS.get(name, "") + dict(new.sections)[name]) if changed else ""
+            assert delta == expected + "replot\n", (name, mode)
+
+
+def test_delta_is_none_when_terminal_or_layout_changes():
+    base = script([("title", "")])
+    assert script([("title", "")]).delta_from(None) is None
+    assert GnuplotScript([("terminal", "set terminal svg\n"), ("title", ""), ("plot", "plot x\n")]).delta_from(base) is None
+    assert script([("title", ""), ("grid", "")]).delta_from(base) is None
+    assert script([("title", "")]).delta_from(base) == "replot\n"
+    changed_plot = GnuplotScript([("terminal", "set terminal pngcairo\n"), ("title", ""), ("plot", "plot x**2\n")])
+    assert changed_plot.delta_from(base) == "plot x**2\n"